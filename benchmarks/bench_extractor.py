@@ -0,0 +1,71 @@
+"""
+Compares the rows/sec of the FinInstrm field extraction strategies on a synthetic
+DLTINS file.
+
+Usage: python benchmarks/bench_extractor.py [--records N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from deta.benchmark.synthetic import write_synthetic_xml
+from deta.xml_handler.extractor import (
+    NAMESPACES,
+    FieldExtractor,
+    iter_fin_instrm,
+    lxml_etree,
+)
+
+
+def legacy_extract(elem) -> dict:
+    """
+    Per-record namespaced find/findtext calls, as convert_to_csv did originally.
+    """
+    ns = NAMESPACES
+    gnl = elem.find(".//a:FinInstrmGnlAttrbts", ns)
+    row = {
+        f"FinInstrmGnlAttrbts.{field}": (
+            gnl.findtext(f"a:{field}", default="", namespaces=ns)
+            if gnl is not None
+            else ""
+        )
+        for field in ("Id", "FullNm", "ClssfctnTp", "CmmdtyDerivInd", "NtnlCcy")
+    }
+    row["Issr"] = elem.findtext(".//a:Issr", default="", namespaces=ns)
+    return row
+
+
+def run(path: str, backend: str, extract) -> float:
+    start = time.perf_counter()
+    rows = 0
+    for elem in iter_fin_instrm(path, backend):
+        extract(elem)
+        rows += 1
+    return rows / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.xml")
+        write_synthetic_xml(path, args.records)
+        print(f"{args.records} records, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        cases = [
+            ("findtext (stdlib)", "stdlib", legacy_extract),
+            ("FieldExtractor (stdlib)", "stdlib", FieldExtractor().extract),
+        ]
+        if lxml_etree is not None:
+            cases.append(("FieldExtractor (lxml)", "lxml", FieldExtractor().extract))
+
+        for name, backend, extract in cases:
+            print(f"{name:<26} {run(path, backend, extract):>12,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
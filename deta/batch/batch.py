@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from deta.csv_handler.csv_handler import CSVHandler
+from deta.discovery.discovery import DateLike, FirdsIndexCrawler
+from deta.downloader.downloader import Downloader
+from deta.metrics.metrics import Metrics
+from deta.xml_handler.streaming import StreamingConverter
+from deta.xml_handler.xml_handler import XMLHandler
+
+logger = logging.getLogger(__name__)
+
+
+class BatchProcessor:
+    """
+    Processes every FIRDS file published in a date range, each one end to end in
+    a worker process: download, conversion to CSV and derived columns.
+
+    Every file gets its own output "<output_dir>/<file name>.csv", so files
+    processed concurrently never write to the same path, and the outputs can be
+    merged into one CSV in publication order at the end.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        workers: Optional[int] = None,
+        streaming: bool = False,
+        chunksize: Optional[int] = None,
+        crawler: Optional[FirdsIndexCrawler] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        """
+        Initiates an instance of the BatchProcessor class.
+
+        Args:
+            output_dir: directory of the per-file outputs, of the downloaded
+                archives under "archives/" and of the "batch.json" summary
+            workers: number of worker processes, defaults to the number of CPUs
+            streaming: whether each file is converted while it is downloaded, see
+                StreamingConverter
+            chunksize: number of rows per chunk when adding the derived columns,
+                or None to load every converted file at once, see CSVHandler
+            crawler: crawler listing the files, a default one is created if not
+                given
+            metrics: registry the stages of every worker are merged into, a
+                private one is created if not given
+        """
+        self.output_dir = output_dir
+        self.workers = max(workers or os.cpu_count() or 1, 1)
+        self.streaming = streaming
+        self.chunksize = chunksize
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.crawler = (
+            crawler if crawler is not None else FirdsIndexCrawler(metrics=self.metrics)
+        )
+        logger.debug(
+            f"BatchProcessor initialized with output_dir={output_dir} "
+            f"and workers={self.workers}"
+        )
+
+    def run(
+        self,
+        start_date: DateLike,
+        end_date: DateLike,
+        file_types: Iterable[str] = ("DLTINS",),
+        merge_path: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Discovers and processes the files published between two dates.
+
+        A failing file does not stop the others; its error is reported in its
+        result instead, and its output is left out of the merged file.
+
+        Args:
+            start_date: first publication date, included
+            end_date: last publication date, included
+            file_types: file types to process, e.g. "DLTINS" or "FULINS"
+            merge_path: path of a CSV concatenating every per-file output, or None
+                to keep the per-file outputs only
+
+        Returns:
+            One result per file, in publication order, with the file_name,
+            download_link, publication_date, output_path, rows and seconds of the
+            file, or its error.
+        """
+        files = self.crawler.crawl(start_date, end_date, file_types=file_types)
+        if not files:
+            logger.warning(f"No files published between {start_date} and {end_date}")
+            return []
+
+        stems = _unique_stems(files)
+        workers = min(self.workers, len(files))
+        logger.info(f"Processing {len(files)} files on {workers} workers")
+        results: Dict[int, Dict] = {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    process_file,
+                    file,
+                    stem,
+                    self.output_dir,
+                    self.streaming,
+                    self.chunksize,
+                ): i
+                for i, (file, stem) in enumerate(zip(files, stems))
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to process {files[i]['download_link']}: {e}")
+                    result = {**files[i], "error": str(e)}
+                self.metrics.merge(
+                    result.pop("stages", {}), result.pop("peak_rss_bytes", None)
+                )
+                results[i] = result
+
+        ordered = [results[i] for i in range(len(files))]
+        failures = [result for result in ordered if "error" in result]
+        logger.info(
+            f"Processed {len(ordered) - len(failures)} of {len(ordered)} files "
+            f"({len(failures)} failed)"
+        )
+        if merge_path is not None:
+            merge_outputs(
+                [result["output_path"] for result in ordered if "error" not in result],
+                merge_path,
+            )
+        self._write_summary(ordered, merge_path)
+        return ordered
+
+    def _write_summary(self, results: List[Dict], merge_path: Optional[str]) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, "batch.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"files": results, "merged": merge_path}, f, indent=2)
+        logger.info(f"Batch summary written to: {path}")
+
+
+def process_file(
+    file: Dict[str, str],
+    stem: str,
+    output_dir: str,
+    streaming: bool = False,
+    chunksize: Optional[int] = None,
+) -> Dict:
+    """
+    Downloads one file, converts it to "<output_dir>/<stem>.csv" and adds the
+    derived columns to it.
+
+    Runs in a worker process of BatchProcessor.run, with its own Metrics whose
+    stages are returned to be merged in the registry of the batch.
+
+    Returns:
+        The file, with its output_path, rows and seconds, and the "stages" and
+        "peak_rss_bytes" of the metrics of the worker.
+    """
+    metrics = Metrics()
+    start = time.perf_counter()
+    url = file["download_link"]
+    zip_path = os.path.join(output_dir, "archives", f"{stem}.zip")
+    csv_path = os.path.join(output_dir, f"{stem}.csv")
+
+    downloader = Downloader(metrics=metrics)
+    if streaming:
+        converter = StreamingConverter(downloader=downloader, metrics=metrics)
+        converter.convert_url(url, csv_path, zip_path=zip_path)
+        rows = converter.stats["kept"]
+    else:
+        downloader.download_from_url(url, zip_path)
+        handler = XMLHandler(zip_path, metrics=metrics)
+        handler.convert_zip_to_csv(zip_path, csv_path)
+        rows = handler.stats["kept"]
+
+    csv_handler = CSVHandler(csv_path, chunksize=chunksize, metrics=metrics)
+    csv_handler.add_a_count_column()
+    csv_handler.add_contains_a_column()
+    csv_handler.write_csv()
+
+    seconds = time.perf_counter() - start
+    logger.info(f"Processed {url} into {csv_path} in {seconds:.2f}s")
+    report = metrics.to_dict()
+    return {
+        **file,
+        "output_path": csv_path,
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "stages": report["stages"],
+        "peak_rss_bytes": report["peak_rss_bytes"],
+    }
+
+
+def merge_outputs(paths: List[str], merge_path: str) -> str:
+    """
+    Concatenates CSV files with the same columns, keeping the header of the first
+    one only. The merged file is written next to its final path and renamed once
+    complete.
+
+    Args:
+        paths: paths of the CSV files, in output order
+        merge_path: path of the merged CSV file
+
+    Returns:
+        The path of the merged file.
+    """
+    os.makedirs(os.path.dirname(merge_path) or ".", exist_ok=True)
+    tmp_path = f"{merge_path}.tmp"
+    with open(tmp_path, "wb") as output:
+        for i, path in enumerate(paths):
+            with open(path, "rb") as part:
+                header = part.readline()
+                if i == 0:
+                    output.write(header)
+                shutil.copyfileobj(part, output)
+    os.replace(tmp_path, merge_path)
+    logger.info(f"Merged {len(paths)} files into: {merge_path}")
+    return merge_path
+
+
+def _unique_stems(files: List[Dict[str, str]]) -> List[str]:
+    """
+    Names the outputs of the files after their file names, or after their
+    download links, adding a suffix to the names seen before.
+    """
+    stems: List[str] = []
+    seen: Dict[str, int] = {}
+    for file in files:
+        name = file.get("file_name") or os.path.basename(
+            urlparse(file["download_link"]).path
+        )
+        stem = os.path.splitext(name)[0] or "file"
+        seen[stem] = seen.get(stem, 0) + 1
+        stems.append(stem if seen[stem] == 1 else f"{stem}_{seen[stem]}")
+    return stems
@@ -0,0 +1,253 @@
+import argparse
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from deta.benchmark.synthetic import write_synthetic_xml, write_synthetic_zip
+from deta.metrics.metrics import peak_rss_bytes
+
+logger = logging.getLogger(__name__)
+RECORDS = 10_000
+
+
+def run_benchmarks(
+    records: int = RECORDS,
+    cases: Optional[List[str]] = None,
+    workdir: Optional[str] = None,
+    seed: int = 0,
+) -> dict:
+    """
+    Generates a synthetic DLTINS file and times every benchmark case against it.
+
+    Each case runs in a fresh process, so that its peak memory is not hidden by
+    the one of a previous case.
+
+    Args:
+        records: number of FinInstrm elements in the synthetic file
+        cases: names of the cases to run, defaults to every case of CASES
+        workdir: directory for the generated and converted files, a temporary
+            directory removed at the end is used if not given
+        seed: seed of the synthetic data generator
+
+    Returns:
+        The report, a JSON serializable dict with the environment the benchmarks
+        ran in and one result per case with its duration, throughput and peak
+        resident memory.
+
+    Raises:
+        ValueError: If a case is unknown.
+    """
+    cases = list(CASES) if cases is None else cases
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        raise ValueError(f"Unknown benchmark cases: {', '.join(unknown)}")
+
+    tmp_dir = None
+    if workdir is None:
+        workdir = tmp_dir = tempfile.mkdtemp(prefix="deta-bench-")
+    try:
+        xml_path = write_synthetic_xml(
+            os.path.join(workdir, "DLTINS_synthetic.xml"), records, seed
+        )
+        zip_path = write_synthetic_zip(
+            os.path.join(workdir, "DLTINS_synthetic.zip"), records, seed=seed
+        )
+        data: Dict[str, Any] = {"records": records, "xml": xml_path, "zip": zip_path}
+        sizes: Dict[str, int] = {
+            "xml_bytes": os.path.getsize(xml_path),
+            "zip_bytes": os.path.getsize(zip_path),
+        }
+        context = multiprocessing.get_context("spawn")
+        results: List[dict] = []
+        for name in cases:
+            with context.Pool(processes=1) as pool:
+                result = pool.apply(_run_case, (name, data, workdir))
+            logger.info(
+                f"{name}: {result['throughput']:,.0f} {result['unit']}/sec, "
+                f"peak memory {result['peak_memory_bytes']} bytes"
+            )
+            results.append(result)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "version": _version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "records": records,
+        **sizes,
+        "results": results,
+    }
+
+
+def _run_case(name: str, data: Dict, workdir: str) -> dict:
+    """
+    Runs one benchmark case, in a worker process of run_benchmarks.
+
+    Returns:
+        The result of the case with its name, timings and peak memory.
+    """
+    items, unit, seconds = CASES[name](data, workdir)
+    return {
+        "case": name,
+        "items": items,
+        "unit": unit,
+        "seconds": round(seconds, 6),
+        "throughput": items / max(seconds, 1e-9),
+        "peak_memory_bytes": peak_rss_bytes(),
+    }
+
+
+def _version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("deta")
+    except Exception:
+        return "unknown"
+
+
+@contextmanager
+def _serve(directory: str) -> Iterator[str]:
+    """
+    Serves the files of a directory over HTTP on a local port, and yields the base
+    url of the server.
+    """
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _bench_download(data: Dict, workdir: str):
+    from deta.downloader.downloader import Downloader
+
+    with _serve(os.path.dirname(data["zip"])) as base_url:
+        url = f"{base_url}/{os.path.basename(data['zip'])}"
+        path = os.path.join(workdir, "download", "downloaded.zip")
+        start = time.perf_counter()
+        Downloader(retries=1).download_from_url(url, path, resume=False)
+        seconds = time.perf_counter() - start
+    return os.path.getsize(path), "bytes", seconds
+
+
+def _bench_extract_from_zip(data: Dict, workdir: str):
+    from deta.xml_handler.xml_handler import XMLHandler
+
+    start = time.perf_counter()
+    path = XMLHandler(data["zip"]).extract_from_zip(
+        data["zip"], os.path.join(workdir, "extracted")
+    )
+    seconds = time.perf_counter() - start
+    return os.path.getsize(path), "bytes", seconds
+
+
+def _bench_convert_to_csv(data: Dict, workdir: str):
+    from deta.xml_handler.xml_handler import XMLHandler
+
+    start = time.perf_counter()
+    XMLHandler(data["xml"]).convert_to_csv(os.path.join(workdir, "converted.csv"))
+    return data["records"], "records", time.perf_counter() - start
+
+
+def _bench_convert_zip_to_csv(data: Dict, workdir: str):
+    from deta.xml_handler.xml_handler import XMLHandler
+
+    start = time.perf_counter()
+    XMLHandler(data["zip"]).convert_zip_to_csv(
+        data["zip"], os.path.join(workdir, "converted_zip.csv")
+    )
+    return data["records"], "records", time.perf_counter() - start
+
+
+def _bench_csv_transforms(data: Dict, workdir: str):
+    from deta.csv_handler.csv_handler import CSVHandler
+    from deta.xml_handler.xml_handler import XMLHandler
+
+    csv_path = os.path.join(workdir, "transforms.csv")
+    XMLHandler(data["xml"]).convert_to_csv(csv_path)
+
+    start = time.perf_counter()
+    handler = CSVHandler(csv_path)
+    handler.add_a_count_column()
+    handler.add_contains_a_column()
+    handler.write_csv()
+    return data["records"], "records", time.perf_counter() - start
+
+
+def _bench_stream_url_to_csv(data: Dict, workdir: str):
+    from deta.downloader.downloader import Downloader
+    from deta.xml_handler.streaming import StreamingConverter
+
+    with _serve(os.path.dirname(data["zip"])) as base_url:
+        url = f"{base_url}/{os.path.basename(data['zip'])}"
+        start = time.perf_counter()
+        StreamingConverter(downloader=Downloader(retries=1)).convert_url(
+            url, os.path.join(workdir, "streamed.csv")
+        )
+        seconds = time.perf_counter() - start
+    return data["records"], "records", seconds
+
+
+CASES: Dict[str, Callable] = {
+    "download": _bench_download,
+    "extract_from_zip": _bench_extract_from_zip,
+    "convert_to_csv": _bench_convert_to_csv,
+    "convert_zip_to_csv": _bench_convert_zip_to_csv,
+    "csv_transforms": _bench_csv_transforms,
+    "stream_url_to_csv": _bench_stream_url_to_csv,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Times the DETA pipeline stages on synthetic FIRDS data."
+    )
+    parser.add_argument("--records", type=int, default=RECORDS)
+    parser.add_argument(
+        "--cases",
+        default=",".join(CASES),
+        help=f"comma separated cases to run, among {', '.join(CASES)}",
+    )
+    parser.add_argument("--output", help="JSON file to write, stdout by default")
+    parser.add_argument("--workdir", help="directory kept with the generated files")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        args.records, args.cases.split(","), workdir=args.workdir, seed=args.seed
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import logging
+import os
+import random
+import zipfile
+from typing import IO, Optional
+
+from deta.xml_handler.extractor import NAMESPACES
+
+logger = logging.getLogger(__name__)
+RECORDS_PER_WRITE = 1_000
+
+CLASSIFICATIONS = ["ESVUFR", "DBFTFR", "DBVTFB", "FFICSX", "OPECCS", "JFTXFP", "SRCCSP"]
+CURRENCIES = ["EUR", "EUR", "EUR", "USD", "GBP", "CHF", "SEK", "JPY"]
+# Issuers repeat across instruments, as a few issuers publish most of them.
+ISSUERS = 2_000
+VENUES = ["XPAR", "XMUN", "XFRA", "XETR", "XLON", "MTAA", "BMTF", "TRQX"]
+WORDS = [
+    "Alpha", "Banca", "Capital", "Delta", "Energia", "Finance", "Global",
+    "Holding", "Industria", "Mandatory", "Nordic", "Obligation", "Rate",
+    "Santander", "Total", "Warrant", "Zero", "Coupon", "Call", "Put",
+]  # fmt: skip
+RECORD_TYPES = ["NewRcrd", "ModfdRcrd", "ModfdRcrd", "TermntdRcrd"]
+
+HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    f'<BizData xmlns="{NAMESPACES["h"]}">'
+    '<Hdr><AppHdr xmlns="urn:iso:std:iso:20022:tech:xsd:head.001.001.01">'
+    "<Fr><OrgId><Id><OrgId><Othr><Id>EU</Id></Othr></OrgId></Id></OrgId></Fr>"
+    "<MsgDefIdr>auth.036.001.02</MsgDefIdr><CreDt>2021-01-19T06:00:00Z</CreDt>"
+    "</AppHdr></Hdr>"
+    f'<Pyld><Document xmlns="{NAMESPACES["a"]}"><FinInstrmRptgRefDataDltaRpt>'
+    "<RptHdr><RptgNtty><NCA>FR</NCA></RptgNtty>"
+    "<RptgPrd><FrDtToDt><FrDt>2021-01-18</FrDt><ToDt>2021-01-18</ToDt></FrDtToDt>"
+    "</RptgPrd></RptHdr>"
+)
+FOOTER = "</FinInstrmRptgRefDataDltaRpt></Document></Pyld></BizData>\n"
+
+
+def synthetic_record(i: int, rng: random.Random) -> str:
+    """
+    Builds one FinInstrm element shaped like those of a DLTINS report.
+
+    Args:
+        i: index of the record, used to build unique identifiers
+        rng: random generator drawing the other values
+
+    Returns:
+        The XML of the element.
+    """
+    record_type = rng.choice(RECORD_TYPES)
+    classification = rng.choice(CLASSIFICATIONS)
+    name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+    debt = ""
+    if classification.startswith("DB"):
+        debt = (
+            "<DebtInstrmAttrbts>"
+            f'<TtlIssdNmnlAmt Ccy="EUR">{rng.randint(1, 5000) * 1000}</TtlIssdNmnlAmt>'
+            f"<MtrtyDt>20{rng.randint(22, 50)}-0{rng.randint(1, 9)}-15</MtrtyDt>"
+            '<NmnlValPerUnit Ccy="EUR">1000</NmnlValPerUnit>'
+            f"<IntrstRate><Fxd>{rng.randint(0, 800) / 100}</Fxd></IntrstRate>"
+            "</DebtInstrmAttrbts>"
+        )
+    return (
+        f"<FinInstrm><{record_type}><FinInstrmGnlAttrbts>"
+        f"<Id>XS{i:010d}</Id><FullNm>{name} {i}</FullNm>"
+        f"<ShrtNm>{name[:20]}/{i}</ShrtNm><ClssfctnTp>{classification}</ClssfctnTp>"
+        f"<NtnlCcy>{rng.choice(CURRENCIES)}</NtnlCcy>"
+        f"<CmmdtyDerivInd>{'true' if rng.random() < 0.05 else 'false'}</CmmdtyDerivInd>"
+        f"</FinInstrmGnlAttrbts><Issr>549300{rng.randrange(ISSUERS):014X}</Issr>"
+        f"<TradgVnRltdAttrbts><Id>{rng.choice(VENUES)}</Id><IssrReq>false</IssrReq>"
+        "<FrstTradDt>2021-01-18T00:00:00Z</FrstTradDt></TradgVnRltdAttrbts>"
+        f"{debt}"
+        "<TechAttrbts><RlvntCmptntAuthrty>FR</RlvntCmptntAuthrty>"
+        "<PblctnPrd><FrDt>2021-01-19</FrDt></PblctnPrd>"
+        "<RlvntTradgVn>XPAR</RlvntTradgVn></TechAttrbts>"
+        f"</{record_type}></FinInstrm>"
+    )
+
+
+def write_synthetic_stream(f: IO[bytes], records: int, seed: int = 0) -> None:
+    """
+    Writes a synthetic DLTINS document to a binary file object.
+
+    Records are written in batches of RECORDS_PER_WRITE, so memory usage does not
+    depend on the number of records.
+
+    Args:
+        f: binary file object to write to
+        records: number of FinInstrm elements in the document
+        seed: seed of the random generator, the same seed gives the same document
+    """
+    rng = random.Random(seed)
+    f.write(HEADER.encode("utf-8"))
+    for start in range(0, records, RECORDS_PER_WRITE):
+        batch = range(start, min(start + RECORDS_PER_WRITE, records))
+        f.write("".join(synthetic_record(i, rng) for i in batch).encode("utf-8"))
+    f.write(FOOTER.encode("utf-8"))
+
+
+def write_synthetic_xml(path: str, records: int, seed: int = 0) -> str:
+    """
+    Writes a synthetic DLTINS XML file.
+
+    Args:
+        path: path of the XML file to write
+        records: number of FinInstrm elements in the file
+        seed: seed of the random generator
+
+    Returns:
+        The path of the written file.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        write_synthetic_stream(f, records, seed)
+    logger.info(f"Synthetic XML with {records} records written to: {path}")
+    return path
+
+
+def write_synthetic_zip(
+    path: str, records: int, member: Optional[str] = None, seed: int = 0
+) -> str:
+    """
+    Writes a ZIP archive holding a synthetic DLTINS XML file, as published by ESMA.
+
+    The XML is compressed while it is generated, without an intermediate file.
+
+    Args:
+        path: path of the ZIP file to write
+        records: number of FinInstrm elements in the XML file
+        member: name of the XML file inside the archive, defaults to the name of
+            the archive with a ".xml" extension
+        seed: seed of the random generator
+
+    Returns:
+        The path of the written file.
+    """
+    if member is None:
+        member = os.path.splitext(os.path.basename(path))[0] + ".xml"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zipf:
+        with zipf.open(member, "w", force_zip64=True) as f:
+            write_synthetic_stream(f, records, seed)
+    logger.info(f"Synthetic ZIP with {records} records written to: {path}")
+    return path
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+MAX_SIZE = 5 * 1024**3
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class DownloadCache:
+    """
+    Content-addressed on-disk cache of downloaded files, keyed by URL.
+
+    Files are stored once per SHA-256 under "objects/", and an "index.json" file
+    maps every URL to the hash of its content along with the ETag and
+    Last-Modified validators returned by the server.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = MAX_SIZE):
+        """
+        Initiates an instance of the DownloadCache class.
+
+        Args:
+            cache_dir: directory where the cached files and the index are stored
+            max_size: maximum number of bytes kept in the cache before the least
+                recently used entries are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        self._entries: Dict[str, dict] = self._load_index()
+        logger.debug(
+            f"DownloadCache initialized with cache_dir={cache_dir} "
+            f"and max_size={max_size}"
+        )
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """
+        Builds the headers revalidating the cached copy of a URL.
+
+        Args:
+            url: url about to be downloaded
+
+        Returns:
+            If-None-Match and/or If-Modified-Since headers, or an empty dict when
+            the URL is not cached.
+        """
+        entry = self._lookup(url)
+        if entry is None:
+            return {}
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def restore(self, url: str, path: str) -> Optional[str]:
+        """
+        Copies the cached content of a URL to the given path.
+
+        Args:
+            url: url whose content is cached
+            path: path to store the file
+
+        Returns:
+            The path the file was stored at, or None if the URL is no longer
+            cached, e.g. because its entry was evicted after it was revalidated.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            entry["last_access"] = time.time()
+            self._save_index()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.cache"
+        try:
+            shutil.copyfile(self._object_path(entry["sha256"]), tmp_path)
+        except FileNotFoundError:
+            logger.warning(f"Cached file for {url} is missing")
+            return None
+        os.replace(tmp_path, path)
+        logger.info(f"Restored {url} from cache to: {path}")
+        return path
+
+    def store(
+        self,
+        url: str,
+        path: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> str:
+        """
+        Adds a downloaded file to the cache and evicts old entries if needed.
+
+        Args:
+            url: url the file was downloaded from
+            path: path of the downloaded file
+            etag: ETag header returned by the server
+            last_modified: Last-Modified header returned by the server
+
+        Returns:
+            The SHA-256 of the file content.
+        """
+        digest = file_sha256(path)
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, object_path)
+
+        with self._lock:
+            self._entries[url] = {
+                "sha256": digest,
+                "size": os.path.getsize(object_path),
+                "etag": etag,
+                "last_modified": last_modified,
+                "last_access": time.time(),
+            }
+            self._evict(keep=url)
+            self._save_index()
+
+        logger.info(f"Cached {url} as {digest}")
+        return digest
+
+    def size(self) -> int:
+        """
+        Returns the number of bytes taken by the cached files.
+        """
+        with self._lock:
+            return self._total_size()
+
+    def _lookup(self, url: str) -> Optional[dict]:
+        """
+        Returns the entry of a URL, dropping it if its file has disappeared.
+
+        Args:
+            url: url to look up
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            if not os.path.exists(self._object_path(entry["sha256"])):
+                logger.warning(f"Cached file for {url} is missing, dropping entry")
+                del self._entries[url]
+                self._save_index()
+                return None
+            return dict(entry)
+
+    def _evict(self, keep: str) -> None:
+        """
+        Removes least recently used entries until the cache fits in max_size.
+
+        Args:
+            keep: url that must not be evicted
+        """
+        by_access = sorted(
+            (url for url in self._entries if url != keep),
+            key=lambda url: self._entries[url]["last_access"],
+        )
+        for url in by_access:
+            if self._total_size() <= self.max_size:
+                break
+            digest = self._entries.pop(url)["sha256"]
+            if not any(e["sha256"] == digest for e in self._entries.values()):
+                os.remove(self._object_path(digest))
+            logger.info(f"Evicted {url} from cache")
+
+    def _total_size(self) -> int:
+        """
+        Sums the size of every distinct cached file.
+        """
+        sizes = {e["sha256"]: e["size"] for e in self._entries.values()}
+        return sum(sizes.values())
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "objects", digest[:2], digest)
+
+    def _load_index(self) -> Dict[str, dict]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Ignoring corrupted cache index {self.index_path}: {e}")
+            return {}
+
+    def _save_index(self) -> None:
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+
+def file_sha256(path: str) -> str:
+    """
+    Returns the SHA-256 of the content of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
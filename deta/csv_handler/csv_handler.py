@@ -1,80 +1,267 @@
+import io
 import os
-import pandas as pd
+import shutil
+import tempfile
 import logging
-import fsspec
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+from deta.metrics.metrics import Metrics, Stage
+from deta.writers.compression import SUFFIXES, infer_compression, open_compressed
+from deta.writers.partitioned import MAX_OPEN_FILES, PartitionedWriter
+from deta.xml_handler.extractor import LOW_CARDINALITY_COLUMNS
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+PART_SIZE = 64 * 1024 * 1024
+UPLOAD_CONCURRENCY = 4
+# CmmdtyDerivInd is left to the inference of pandas, which reads it as a bool,
+# so that it is still written back as True/False.
+CATEGORY_DTYPES: Dict[str, str] = {
+    column: "category"
+    for column in LOW_CARDINALITY_COLUMNS
+    if column != "FinInstrmGnlAttrbts.CmmdtyDerivInd"
+}
+
+
+def is_parquet(path: str) -> bool:
+    """
+    Tells whether a path points to a Parquet file, based on its extension.
+    """
+    return path.lower().endswith(PARQUET_EXTENSIONS)
+
+
+def output_format(path: str) -> Tuple[bool, Optional[str]]:
+    """
+    Tells how a destination is written, based on its extension: whether as
+    Parquet, and otherwise with which CSV compression, "gzip", "zstd" or None.
+    """
+    if is_parquet(path):
+        return True, None
+    return False, infer_compression(path)
+
+
+@contextmanager
+def _open_csv(source) -> Iterator:
+    """
+    Yields a source pandas can read CSV from: the decompressed content of a path
+    ending with ".gz" or ".zst", or the source itself otherwise.
+    """
+    if not isinstance(source, str) or infer_compression(source) is None:
+        yield source
+        return
+    with open_compressed(source) as f:
+        yield f
 
 
 class CSVHandler:
-    def __init__(self, file_path: str):
+    def __init__(
+        self,
+        file_path: str,
+        columns: Optional[List[str]] = None,
+        chunksize: Optional[int] = None,
+        metrics: Optional[Metrics] = None,
+        dtypes: Optional[Dict[str, str]] = None,
+    ):
         """
         Initializes the CSVHandler with a file path.
+
+        By default the whole file is loaded in self.df. When chunksize is given,
+        the handler works out of core instead: self.df stays None, derived columns
+        are recorded, and the file is streamed chunksize rows at a time, with the
+        derived columns added to each chunk, whenever it is written or uploaded.
         Args:
-            file_path: Path to the CSV file to be handled.
+            file_path: Path to the CSV or Parquet file to be handled.
+            columns: Columns to load. Defaults to every column.
+            chunksize: Number of rows per chunk in out-of-core mode.
+            metrics: Registry recording the "load", "transform", "write" and
+                "upload" stages, a private one is created if not given.
+            dtypes: Dtypes of the columns, declared when the file is read.
+                Defaults to CATEGORY_DTYPES, loading the low-cardinality columns as
+                categories, which stores each distinct value once. Columns missing
+                from the file are ignored.
         """
         self.file_path = file_path
-        self.df = self.read_csv(file_path)
-        logging.debug(f"CSVHandler initialized with file_path={file_path}")
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.chunksize = chunksize
+        self.dtypes = dtypes if dtypes is not None else CATEGORY_DTYPES
+        self._load_columns = columns
+        self._derivations: List[dict] = []
+        self.df: Optional["pd.DataFrame"] = None
+        if chunksize is None:
+            self.df = self.read_csv(file_path, columns=columns)
+        else:
+            self._source_columns = self._read_columns(file_path, columns)
+        logging.debug(
+            f"CSVHandler initialized with file_path={file_path} "
+            f"and chunksize={chunksize}"
+        )
 
-    def read_csv(self, csv_path) -> pd.DataFrame:
+    def read_csv(self, csv_path, columns: Optional[List[str]] = None) -> "pd.DataFrame":
         """
         Reads a CSV file and returns a DataFrame.
+        Parquet files, recognized by their extension, are read as well, and CSV
+        files ending with ".gz" or ".zst" are decompressed while they are read.
         Args:
-            csv_path: Path to the CSV file.
+            csv_path: Path to the CSV or Parquet file.
+            columns: Columns to load. Defaults to every column.
         """
-        try:
-            df = pd.read_csv(csv_path)
-            logger.info(f"Successfully read CSV file: {csv_path}")
-            return df
-        except Exception as e:
-            raise ValueError(f"Error reading CSV file: {e}")
+        import pandas as pd
+
+        with self.metrics.stage("load") as stage:
+            try:
+                if is_parquet(csv_path):
+                    df = self._apply_dtypes(pd.read_parquet(csv_path, columns=columns))
+                else:
+                    with _open_csv(csv_path) as source:
+                        df = pd.read_csv(source, usecols=columns, dtype=self.dtypes)
+                stage.add("rows", len(df))
+                if isinstance(csv_path, str):
+                    stage.add("bytes_in", os.path.getsize(csv_path))
+                logger.info(f"Successfully read CSV file: {csv_path}")
+                return df
+            except Exception as e:
+                raise ValueError(f"Error reading CSV file: {e}")
+
+    def iter_chunks(self) -> Iterator["pd.DataFrame"]:
+        """
+        Iterates over the data with the derived columns added.
+
+        In out-of-core mode, the file is read chunksize rows at a time. Otherwise
+        the whole DataFrame is yielded once.
+        """
+        from deta.csv_handler.derivations import derive_columns
+
+        if self.df is not None:
+            yield self.df
+            return
+
+        chunks: Iterator["pd.DataFrame"]
+        if is_parquet(self.file_path):
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(self.file_path)
+            chunks = (
+                self._apply_dtypes(batch.to_pandas())
+                for batch in parquet_file.iter_batches(
+                    batch_size=self.chunksize, columns=self._load_columns
+                )
+            )
+        else:
+            chunks = self._read_csv_chunks()
+
+        for chunk in chunks:
+            yield derive_columns(chunk, self._derivations)
+
+    def _read_csv_chunks(self) -> Iterator["pd.DataFrame"]:
+        import pandas as pd
+
+        with _open_csv(self.file_path) as source:
+            yield from pd.read_csv(
+                source,
+                usecols=self._load_columns,
+                dtype=self.dtypes,
+                chunksize=self.chunksize,
+            )
+
+    def column_names(self) -> List[str]:
+        """
+        Returns the names of the columns, including the derived ones.
+        """
+        if self.df is not None:
+            return list(self.df.columns)
+        derived = [d["name"] for d in self._derivations]
+        return list(dict.fromkeys(self._source_columns + derived))
 
     def write_csv(self) -> None:
         """
-        Writes a DataFrame to a CSV file.
+        Writes the DataFrame back to the handled file, as Parquet if its extension
+        says so and as CSV otherwise, compressed if it ends with ".gz" or ".zst".
+        In out-of-core mode, the chunks are streamed to a temporary file which then
+        replaces the handled one.
+        """
+        with self.metrics.stage("write") as stage:
+            try:
+                if self.df is not None:
+                    self._write_df(self.file_path)
+                else:
+                    tmp_path = f"{self.file_path}.tmp"
+                    parquet, compression = output_format(self.file_path)
+                    self._write_df(tmp_path, parquet=parquet, compression=compression)
+                    os.replace(tmp_path, self.file_path)
+                    self._source_columns = self.column_names()
+                    self._derivations = []
+                self._count_output(stage, self.file_path)
+                logger.info(
+                    f"Successfully wrote DataFrame to CSV file: {self.file_path}"
+                )
+            except Exception as e:
+                raise ValueError(f"Error writing to CSV file: {e}")
+
+    def add_derived_columns(self, derivations: List[dict]) -> Optional["pd.DataFrame"]:
+        """
+        Adds several derived columns to the DataFrame in one call, each computed
+        with vectorized operations instead of per-row Python calls.
+        In out-of-core mode, the derivations are checked and recorded, to be
+        applied to every chunk, and None is returned.
+
         Args:
-            df: DataFrame to be written to the CSV file.
+            derivations: Derivations to evaluate in order, see
+                deta.csv_handler.derivations.derive_columns.
+
+        Raises:
+            ValueError: If a derivation is invalid or its source column is missing.
         """
-        try:
-            self.df.to_csv(self.file_path, index=False)
-            logger.info(f"Successfully wrote DataFrame to CSV file: {self.file_path}")
-        except Exception as e:
-            raise ValueError(f"Error writing to CSV file: {e}")
+        import pandas as pd
+
+        from deta.csv_handler.derivations import derive_columns
+
+        with self.metrics.stage("transform") as stage:
+            if self.df is not None:
+                self.df = derive_columns(self.df, derivations)
+                stage.add("rows", len(self.df))
+            else:
+                derive_columns(pd.DataFrame(columns=self.column_names()), derivations)
+                self._derivations.extend(derivations)
+            stage.add("columns", len(derivations))
+            logger.info(f"Added derived columns: {[d['name'] for d in derivations]}")
+            return self.df
 
-    def add_a_count_column(self) -> pd.DataFrame:
+    def add_a_count_column(self) -> Optional["pd.DataFrame"]:
         """
         Adds a new column 'a_count' to the DataFrame, which counts the number of times
         the lowercase character 'a' appears in the 'FinInstrmGnlAttrbts.FullNm' column.
         """
         try:
-            if "FinInstrmGnlAttrbts.FullNm" not in self.df.columns:
+            if "FinInstrmGnlAttrbts.FullNm" not in self.column_names():
                 raise ValueError(
                     "Column 'FinInstrmGnlAttrbts.FullNm' not found in the CSV."
                 )
 
-            self.df["a_count"] = self.df["FinInstrmGnlAttrbts.FullNm"].apply(
-                lambda x: str(x).count("a") if pd.notna(x) else 0
-            )
-            return self.df
+            from deta.csv_handler.derivations import A_COUNT
+
+            return self.add_derived_columns([A_COUNT])
 
         except Exception as e:
             raise ValueError(f"Error adding 'a_count' column: {e}") from e
 
-    def add_contains_a_column(self) -> pd.DataFrame:
+    def add_contains_a_column(self) -> Optional["pd.DataFrame"]:
         """
         Adds a 'contains_a' column to the DataFrame based on 'a_count'.
         If a_count > 0, contains_a is 'YES'; otherwise, 'NO'.
         """
         try:
-            if "a_count" not in self.df.columns:
+            if "a_count" not in self.column_names():
                 raise ValueError(
                     "'a_count' column is missing. Run add_a_count_column first."
                 )
 
-            self.df["contains_a"] = self.df["a_count"].apply(
-                lambda x: "YES" if x > 0 else "NO"
-            )
+            from deta.csv_handler.derivations import CONTAINS_A
+
+            self.add_derived_columns([CONTAINS_A])
             logger.info("Added 'contains_a' column based on 'a_count'.")
             return self.df
         except Exception as e:
@@ -83,6 +270,9 @@ class CSVHandler:
     def upload_file(self, destination_type: str, destination_path: str) -> None:
         """
         Uploads the CSV to a specified destination: local, S3, or Azure blob.
+        Destination paths with a Parquet extension are written as Parquet, and
+        the ones ending with ".gz" or ".zst" as CSV compressed with gzip or zstd
+        while it is uploaded.
 
         Args:
             destination_type: One of "local", "s3", or "blob"
@@ -91,27 +281,339 @@ class CSVHandler:
         Raises:
             ValueError: If upload fails or destination_type is invalid.
         """
-        try:
-            if destination_type == "local":
-                os.makedirs(os.path.dirname(destination_path), exist_ok=True)
-                self.df.to_csv(destination_path, index=False)
-                logger.info(f"CSV saved locally at: {destination_path}")
+        with self.metrics.stage("upload") as stage:
+            try:
+                if destination_type == "local":
+                    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+                    self._write_df(destination_path)
+                    self._count_output(stage, destination_path)
+                    logger.info(f"CSV saved locally at: {destination_path}")
+
+                elif destination_type in {"s3", "blob"}:
+                    import fsspec
+
+                    protocol = "s3" if destination_type == "s3" else "az"
+                    url = f"{protocol}://{destination_path}"
+                    fs, _, paths = fsspec.get_fs_token_paths(url)
+
+                    parquet, compression = output_format(url)
+                    binary = parquet or compression is not None
+                    with fs.open(url, "wb" if binary else "w") as f:
+                        self._write_df(f, parquet=parquet, compression=compression)
+                    self._count_output(stage)
+
+                    logger.info(f"CSV uploaded to {destination_type.upper()} at: {url}")
+
+                else:
+                    raise ValueError(
+                        f"Unsupported destination type: {destination_type}"
+                    )
+
+            except Exception as e:
+                logger.error(
+                    f"Failed to upload CSV to {destination_type.upper()} at {destination_path}: {e}"
+                )
+                raise ValueError(f"Upload error: {e}") from e
 
-            elif destination_type in {"s3", "blob"}:
-                protocol = "s3" if destination_type == "s3" else "az"
-                url = f"{protocol}://{destination_path}"
-                fs, _, paths = fsspec.get_fs_token_paths(url)
+    def publish(
+        self,
+        destinations: List[str],
+        part_size: int = PART_SIZE,
+        max_concurrency: int = UPLOAD_CONCURRENCY,
+    ) -> Dict[str, str]:
+        """
+        Publishes the data to several destinations at once.
+
+        The data is serialized once per output format to a local temporary file,
+        which is then copied to every destination in parallel. Local paths are
+        copied directly; fsspec URLs such as "s3://bucket/file.csv" or
+        "az://container/file.csv" are uploaded with put_file, as multipart (S3) or
+        block (Azure) uploads. Destinations with a Parquet extension get Parquet,
+        and the ones ending with ".gz" or ".zst" get compressed CSV.
+
+        Args:
+            destinations: Local paths or fsspec URLs to publish to.
+            part_size: Size in bytes of each part of an S3 multipart upload.
+            max_concurrency: Number of parts or blocks of one file uploaded at the
+                same time.
+
+        Returns:
+            Mapping of each destination to the path it was written to.
+
+        Raises:
+            ValueError: If serializing fails or any destination fails, after every
+                other destination has been attempted.
+        """
+        with self.metrics.stage("upload") as stage:
+            destinations = list(dict.fromkeys(destinations))
+            tmp_dir = tempfile.mkdtemp(prefix="deta-publish-")
+            try:
+                formats = {d: output_format(d) for d in destinations}
+                serialized: Dict[Tuple[bool, Optional[str]], str] = {}
+                for parquet, compression in dict.fromkeys(formats.values()):
+                    name = "data.parquet" if parquet else "data.csv"
+                    if compression is not None:
+                        name += SUFFIXES[compression]
+                    local_path = os.path.join(tmp_dir, name)
+                    self._write_df(local_path, parquet=parquet, compression=compression)
+                    serialized[parquet, compression] = local_path
+
+                results: Dict[str, str] = {}
+                failures: Dict[str, Exception] = {}
+                with ThreadPoolExecutor(
+                    max_workers=max(len(destinations), 1)
+                ) as executor:
+                    futures = {
+                        destination: executor.submit(
+                            self._copy_to_destination,
+                            serialized[formats[destination]],
+                            destination,
+                            part_size,
+                            max_concurrency,
+                        )
+                        for destination in destinations
+                    }
+                    for destination, future in futures.items():
+                        try:
+                            results[destination] = future.result()
+                            self._count_output(stage, serialized[formats[destination]])
+                        except Exception as e:
+                            logger.error(f"Failed to publish to {destination}: {e}")
+                            failures[destination] = e
+
+                if failures:
+                    raise ValueError(
+                        f"Publish failed for {sorted(failures)}: "
+                        + "; ".join(f"{d}: {e}" for d, e in failures.items())
+                    )
+                logger.info(
+                    f"Published {self.file_path} to {len(results)} destinations"
+                )
+                return results
+
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def upload_partitioned(
+        self,
+        destination: str,
+        partitions: Optional[List[dict]] = None,
+        max_open_files: int = MAX_OPEN_FILES,
+        compression: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Writes the data as a Hive-partitioned CSV dataset, one "name=value/"
+        directory level per partition key, e.g. "currency=EUR/cfi_class=E/", so
+        that readers can prune the partitions a query does not need.
+
+        The data is streamed chunk by chunk in out-of-core mode, each chunk split
+        by partition and appended to the part files, see PartitionedWriter.
+
+        Args:
+            destination: Root directory of the dataset, a local path or an fsspec
+                URL such as "s3://bucket/instruments".
+            partitions: Partition keys, defaults to the currency and the CFI
+                category.
+            max_open_files: Number of part files kept open at the same time.
+            compression: Compression of the part files, "gzip", "zstd" or None.
+
+        Returns:
+            The paths of the written part files.
+
+        Raises:
+            ValueError: If a partition is invalid or writing fails.
+        """
+        with self.metrics.stage("upload") as stage:
+            try:
+                with PartitionedWriter(
+                    destination,
+                    self.column_names(),
+                    partitions=partitions,
+                    max_open_files=max_open_files,
+                    compression=compression,
+                ) as writer:
+                    for chunk in self.iter_chunks():
+                        writer.write_frame(chunk)
+                stage.add("files", len(writer.files))
+                stage.add("rows", writer.rows_written)
+                stage.add("bytes_out", writer.bytes_written)
+                logger.info(
+                    f"Partitioned dataset written to {destination} "
+                    f"in {len(writer.files)} files"
+                )
+                return writer.files
+            except Exception as e:
+                logger.error(f"Failed to write partitioned dataset {destination}: {e}")
+                raise ValueError(f"Upload error: {e}") from e
+
+    def _count_output(self, stage: Stage, path: Optional[str] = None) -> None:
+        """
+        Adds a written file to a stage, with its size when path is given.
+        """
+        stage.add("files")
+        if self.df is not None:
+            stage.add("rows", len(self.df))
+        if path is not None:
+            stage.add("bytes_out", os.path.getsize(path))
+
+    @staticmethod
+    def _copy_to_destination(
+        local_path: str, destination: str, part_size: int, max_concurrency: int
+    ) -> str:
+        """
+        Copies a serialized file to a local path or uploads it to an fsspec URL.
 
-                with fs.open(url, "w") as f:
-                    self.df.to_csv(f, index=False)
+        Returns:
+            The path written to.
+        """
+        import fsspec
+
+        fs, _, paths = fsspec.get_fs_token_paths(destination)
+        protocols = fs.protocol if isinstance(fs.protocol, tuple) else (fs.protocol,)
+
+        if "file" in protocols:
+            os.makedirs(os.path.dirname(paths[0]) or ".", exist_ok=True)
+            shutil.copyfile(local_path, paths[0])
+            logger.info(f"Copied to: {paths[0]}")
+            return paths[0]
+
+        options: dict = {}
+        if "s3" in protocols:
+            options = {"chunksize": part_size, "max_concurrency": max_concurrency}
+        elif "az" in protocols or "abfs" in protocols:
+            options = {"max_concurrency": max_concurrency}
 
-                logger.info(f"CSV uploaded to {destination_type.upper()} at: {url}")
+        fs.put_file(local_path, paths[0], **options)
+        logger.info(f"Uploaded to: {destination}")
+        return destination
+
+    @staticmethod
+    def _read_columns(file_path: str, columns: Optional[List[str]]) -> List[str]:
+        """
+        Reads the column names of a file without loading its rows.
+        """
+        try:
+            if is_parquet(file_path):
+                import pyarrow.parquet as pq
 
+                names = pq.read_schema(file_path).names
             else:
-                raise ValueError(f"Unsupported destination type: {destination_type}")
+                import pandas as pd
 
+                with _open_csv(file_path) as source:
+                    names = list(pd.read_csv(source, nrows=0).columns)
         except Exception as e:
-            logger.error(
-                f"Failed to upload CSV to {destination_type.upper()} at {destination_path}: {e}"
+            raise ValueError(f"Error reading CSV file: {e}")
+
+        if columns is None:
+            return names
+        missing = [column for column in columns if column not in names]
+        if missing:
+            raise ValueError(f"Error reading CSV file: columns {missing} not found")
+        return [column for column in names if column in columns]
+
+    def _apply_dtypes(self, df: "pd.DataFrame") -> "pd.DataFrame":
+        """
+        Casts the columns of a DataFrame read from Parquet to the declared dtypes.
+        """
+        for column, dtype in self.dtypes.items():
+            if column in df.columns and df[column].dtype != dtype:
+                df[column] = df[column].astype(dtype)
+        return df
+
+    def _write_df(
+        self,
+        target,
+        parquet: Optional[bool] = None,
+        compression: Optional[str] = "infer",
+    ) -> None:
+        """
+        Writes the DataFrame, or the stream of chunks in out-of-core mode, as CSV
+        or Parquet.
+
+        Args:
+            target: Path or file object to write to.
+            parquet: Whether to write Parquet. Defaults to guessing from the
+                extension of target when it is a path.
+            compression: Compression of the CSV, "gzip", "zstd" or None, or
+                "infer" to guess it from the extension of target when it is a
+                path. Compressed CSV is written to binary file objects.
+        """
+        if parquet is None:
+            parquet = isinstance(target, str) and is_parquet(target)
+        if compression == "infer":
+            compression = (
+                infer_compression(target)
+                if isinstance(target, str) and not parquet
+                else None
             )
-            raise ValueError(f"Upload error: {e}") from e
+
+        if parquet:
+            if self.df is not None:
+                self.df.to_parquet(target, index=False)
+            else:
+                self._write_parquet_chunks(target)
+        elif compression is not None:
+            # Blocks are compressed on background threads while the next rows
+            # are formatted, see ParallelCompressedWriter.
+            raw = open_compressed(target, "wb", compression=compression)
+            with io.TextIOWrapper(raw, encoding="utf-8", newline="") as f:
+                self._write_csv(f)
+        elif isinstance(target, str) and self.df is None:
+            with open(target, "w", encoding="utf-8", newline="") as f:
+                self._write_csv(f)
+        else:
+            self._write_csv(target)
+
+    def _write_csv(self, f) -> None:
+        if self.df is not None:
+            self.df.to_csv(f, index=False)
+        else:
+            self._write_csv_chunks(f)
+
+    def _write_csv_chunks(self, f) -> None:
+        import pandas as pd
+
+        header = True
+        for chunk in self.iter_chunks():
+            chunk.to_csv(f, header=header, index=False)
+            header = False
+        if header:
+            pd.DataFrame(columns=self.column_names()).to_csv(f, index=False)
+
+    def _write_parquet_chunks(self, target) -> None:
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in self.iter_chunks():
+                if writer is None:
+                    schema = pa.Table.from_pandas(chunk, preserve_index=False).schema
+                    # The categories of every chunk differ, so categorical columns
+                    # get a dictionary type any chunk fits in.
+                    schema = pa.schema(
+                        [
+                            (
+                                pa.field(
+                                    field.name, pa.dictionary(pa.int32(), pa.string())
+                                )
+                                if pa.types.is_dictionary(field.type)
+                                else field
+                            )
+                            for field in schema
+                        ],
+                        metadata=schema.metadata,
+                    )
+                    writer = pq.ParquetWriter(target, schema)
+                writer.write_table(
+                    pa.Table.from_pandas(
+                        chunk, schema=writer.schema, preserve_index=False
+                    )
+                )
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            pd.DataFrame(columns=self.column_names()).to_parquet(target, index=False)
@@ -0,0 +1,112 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List
+
+OPERATIONS = ("count", "contains", "length", "flag")
+
+A_COUNT = {
+    "name": "a_count",
+    "op": "count",
+    "source": "FinInstrmGnlAttrbts.FullNm",
+    "pattern": "a",
+}
+CONTAINS_A = {
+    "name": "contains_a",
+    "op": "flag",
+    "source": "a_count",
+    "threshold": 0,
+    "values": ("YES", "NO"),
+}
+
+
+def derive_columns(df: pd.DataFrame, derivations: List[dict]) -> pd.DataFrame:
+    """
+    Adds derived columns to a DataFrame using vectorized pandas/numpy operations.
+
+    Derivations are evaluated in order, so a derivation can use a column added by
+    a previous one. Each derivation is a dict with the keys:
+        name: name of the column to add
+        op: one of
+            "count": occurrences of the literal "pattern" in the text of "source",
+                0 for missing values
+            "contains": whether the text of "source" contains the literal
+                "pattern", False for missing values
+            "length": number of characters in "source", 0 for missing values
+            "flag": values[0] where "source" > "threshold" (default 0), else
+                values[1]; values defaults to ("YES", "NO")
+        source: name of the column the derivation is computed from
+
+    Args:
+        df: DataFrame to add the columns to, modified in place
+        derivations: derivations to evaluate
+
+    Returns:
+        The DataFrame with the derived columns.
+
+    Raises:
+        ValueError: If a derivation is malformed or its source column is missing.
+    """
+    for derivation in derivations:
+        name = derivation.get("name")
+        op = derivation.get("op")
+        source = derivation.get("source")
+        if not name or op not in OPERATIONS or not source:
+            raise ValueError(f"Invalid derivation: {derivation}")
+        if source not in df.columns:
+            raise ValueError(f"Column '{source}' not found for derivation '{name}'.")
+
+        df[name] = _OPERATIONS[op](df[source], derivation)
+    return df
+
+
+def _as_text(series: pd.Series) -> pd.Series:
+    """
+    Returns the values of a column as strings, keeping missing values as NA.
+    """
+    if isinstance(series.dtype, pd.StringDtype):
+        return series
+    return series.astype("string")
+
+
+def _text_op(series: pd.Series, func: Callable, missing) -> pd.Series:
+    """
+    Applies a string operation to a column, with missing values replaced by
+    missing. A categorical column is evaluated once per category instead of once
+    per row, and the results are spread to the rows through the category codes.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        results = func(_as_text(pd.Series(series.cat.categories))).fillna(missing)
+        # Missing values have the code -1, which picks the appended last value.
+        values = np.append(results.to_numpy(), missing)
+        return pd.Series(values[series.cat.codes.to_numpy()], index=series.index)
+    return func(_as_text(series)).fillna(missing)
+
+
+def _count(series: pd.Series, derivation: dict) -> pd.Series:
+    pattern = re.escape(derivation["pattern"])
+    return _text_op(series, lambda text: text.str.count(pattern), 0).astype("int64")
+
+
+def _contains(series: pd.Series, derivation: dict) -> pd.Series:
+    pattern = derivation["pattern"]
+    return _text_op(
+        series, lambda text: text.str.contains(pattern, regex=False), False
+    ).astype(bool)
+
+
+def _length(series: pd.Series, derivation: dict) -> pd.Series:
+    return _text_op(series, lambda text: text.str.len(), 0).astype("int64")
+
+
+def _flag(series: pd.Series, derivation: dict) -> np.ndarray:
+    true_value, false_value = derivation.get("values", ("YES", "NO"))
+    return np.where(series > derivation.get("threshold", 0), true_value, false_value)
+
+
+_OPERATIONS: Dict[str, Callable] = {
+    "count": _count,
+    "contains": _contains,
+    "length": _length,
+    "flag": _flag,
+}
@@ -0,0 +1,277 @@
+import logging
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from deta.metrics.metrics import Metrics
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+SOLR_URL = "https://registers.esma.europa.eu/solr/esma_registers_firds_files/select"
+PAGE_SIZE = 100
+MAX_WORKERS = 4
+SLEEP_TIME = 2
+FILE_FIELDS = ("file_name", "file_type", "download_link", "publication_date")
+
+DateLike = Union[str, date, datetime]
+
+
+class FirdsIndexCrawler:
+    """
+    Discovers the FIRDS files published in a date range by paging through the ESMA
+    Solr index.
+
+    The first page tells how many documents match the query, the remaining pages
+    are then requested concurrently. Each page is parsed while it is streamed from
+    the server, so its documents are never held as a whole in memory.
+    """
+
+    def __init__(
+        self,
+        url: str = SOLR_URL,
+        rows: int = PAGE_SIZE,
+        max_workers: int = MAX_WORKERS,
+        retries: int = 3,
+        timeout: int = 10,
+        session: Optional["requests.Session"] = None,
+        metrics: Optional[Metrics] = None,
+    ):
+        """
+        Initiates an instance of the FirdsIndexCrawler class.
+
+        Args:
+            url: url of the Solr select endpoint
+            rows: number of documents requested per page
+            max_workers: number of pages requested at the same time
+            retries: number of attempts made for each page
+            timeout: number of seconds to wait for a page before retrying
+            session: session used for the requests, one with a connection pool of
+                max_workers connections is created on first use if not given
+            metrics: registry recording the "discover" stage, a private one is
+                created if not given
+        """
+        if rows < 1:
+            raise ValueError(f"rows must be a positive integer, got {rows}")
+        self.url = url
+        self.rows = rows
+        self.max_workers = max_workers
+        self.retries = retries
+        self.timeout = timeout
+        self._session = session
+        self._session_lock = threading.Lock()
+        self.metrics = metrics if metrics is not None else Metrics()
+        logger.debug(
+            f"FirdsIndexCrawler initialized with url={url}, rows={rows} "
+            f"and max_workers={max_workers}"
+        )
+
+    @property
+    def session(self) -> "requests.Session":
+        """
+        Session used for the requests, created on first use so that requests is
+        only imported once the index is crawled.
+        """
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._build_session(self.max_workers)
+            return self._session
+
+    @staticmethod
+    def _build_session(pool_size: int) -> "requests.Session":
+        """
+        Creates a session whose connection pool is shared by every page request.
+
+        Args:
+            pool_size: maximum number of connections kept open per host
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def crawl(
+        self,
+        start_date: DateLike,
+        end_date: DateLike,
+        file_types: Iterable[str] = ("DLTINS",),
+        index_order: bool = False,
+    ) -> List[Dict[str, str]]:
+        """
+        Lists the files of the given types published between two dates.
+
+        Args:
+            start_date: first publication date, included
+            end_date: last publication date, included; a date without a time
+                covers the whole day
+            file_types: file types to keep, e.g. "DLTINS" or "FULINS"
+            index_order: whether to keep the files in the default order of the
+                Solr index, the one of the original single-page query, instead of
+                sorting them
+
+        Returns:
+            One dict per distinct download link, with the file_name, file_type,
+            download_link and publication_date of the file, sorted by publication
+            date and file name unless index_order is set.
+
+        Raises:
+            requests.RequestException: If a page still fails after all retries.
+        """
+        with self.metrics.stage("discover") as stage:
+            file_types = tuple(file_types)
+            params = self._query_params(start_date, end_date, file_types, index_order)
+
+            total, files = self._fetch_page(params, 0)
+            starts = range(self.rows, total, self.rows)
+            logger.info(
+                f"Solr index has {total} matching documents, "
+                f"fetching {len(starts) + 1} pages of {self.rows}"
+            )
+
+            if starts:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    pages = executor.map(
+                        lambda start: self._fetch_page(params, start), starts
+                    )
+                    for _, page_files in pages:
+                        files.extend(page_files)
+            stage.add("pages", len(starts) + 1)
+
+            index: Dict[str, Dict[str, str]] = {}
+            for file in files:
+                if file["file_type"] in file_types and file["download_link"]:
+                    index.setdefault(file["download_link"], file)
+
+            result = list(index.values())
+            if not index_order:
+                result.sort(key=lambda f: (f["publication_date"], f["file_name"]))
+            stage.add("files", len(result))
+            logger.info(
+                f"Discovered {len(result)} files of types {', '.join(file_types)}"
+            )
+            return result
+
+    def _query_params(
+        self,
+        start_date: DateLike,
+        end_date: DateLike,
+        file_types: Tuple[str, ...],
+        index_order: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Builds the Solr query parameters shared by every page.
+
+        Args:
+            start_date: first publication date, included
+            end_date: last publication date, included
+            file_types: file types to keep
+            index_order: whether to page through the documents in the default
+                order of the index instead of sorting them
+        """
+        filters = [
+            f"publication_date:[{_solr_date(start_date)} TO "
+            f"{_solr_date(end_date, end_of_day=True)}]"
+        ]
+        if file_types:
+            filters.append(f"file_type:({' OR '.join(file_types)})")
+        params: Dict[str, Any] = {"q": "*", "fq": filters, "wt": "xml"}
+        if not index_order:
+            params["sort"] = "publication_date asc,file_name asc"
+        params["rows"] = self.rows
+        return params
+
+    def _fetch_page(
+        self, params: Dict[str, Any], start: int
+    ) -> Tuple[int, List[Dict[str, str]]]:
+        """
+        Requests one page of the index, retrying on failure.
+
+        Args:
+            params: query parameters built by _query_params
+            start: offset of the first document of the page
+
+        Returns:
+            A tuple with the number of documents matching the query and the files
+            listed in the page.
+        """
+        import requests
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self.session.get(
+                    self.url,
+                    params={**params, "start": start},
+                    timeout=self.timeout,
+                    stream=True,
+                )
+                try:
+                    response.raise_for_status()
+                    response.raw.decode_content = True
+                    return self._parse_page(response.raw)
+                finally:
+                    response.close()
+            except (requests.RequestException, ET.ParseError) as e:
+                logger.warning(
+                    f"Attempt {attempt} to fetch page starting at {start} failed: {e}"
+                )
+                if attempt >= self.retries:
+                    logger.error(f"All {self.retries} attempts failed for page {start}")
+                    raise
+                time.sleep(SLEEP_TIME)
+
+    @staticmethod
+    def _parse_page(stream) -> Tuple[int, List[Dict[str, str]]]:
+        """
+        Parses a Solr XML response incrementally.
+
+        Args:
+            stream: binary file object with the response body
+
+        Returns:
+            A tuple with the numFound of the response and its documents, each
+            reduced to FILE_FIELDS.
+        """
+        total = 0
+        files: List[Dict[str, str]] = []
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                if elem.tag == "result" and elem.get("name") == "response":
+                    total = int(elem.get("numFound", 0))
+                continue
+            if elem.tag == "doc":
+                fields = {child.get("name"): child.text or "" for child in elem}
+                files.append({name: fields.get(name, "") for name in FILE_FIELDS})
+                elem.clear()
+        return total, files
+
+
+def _solr_date(value: DateLike, end_of_day: bool = False) -> str:
+    """
+    Formats a date as a Solr UTC timestamp.
+
+    Args:
+        value: date, datetime, or ISO 8601 string
+        end_of_day: whether a value without a time stands for the last second of
+            its day rather than the first one
+    """
+    if isinstance(value, str):
+        if len(value) == len("YYYY-MM-DD"):
+            value = date.fromisoformat(value)
+        else:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if not isinstance(value, datetime):
+        time_of_day = "23:59:59" if end_of_day else "00:00:00"
+        return f"{value.isoformat()}T{time_of_day}Z"
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
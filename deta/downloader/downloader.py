@@ -1,10 +1,31 @@
-import requests
+from deta.cache.cache import DownloadCache
+from deta.metrics.metrics import Metrics
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
 import logging
 import os
+import re
+import threading
 import time
 
+if TYPE_CHECKING:
+    import requests
+
 logger = logging.getLogger(__name__)
 SLEEP_TIME = 2
+CHUNK_SIZE = 1024 * 1024
+POOL_SIZE = 10
+
+
+def __getattr__(name: str):
+    # IncompleteDownloadError subclasses requests.RequestException, so it lives in
+    # deta.downloader.errors and is only imported, along with requests, when used.
+    if name == "IncompleteDownloadError":
+        from deta.downloader.errors import IncompleteDownloadError
+
+        return IncompleteDownloadError
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Downloader:
@@ -12,43 +33,468 @@ class Downloader:
     Handles Downloads and Storing data from HTTP URL's, with all needed management.
     """
 
-    def __init__(self, retries: int = 3, timeout: int = 10):
+    def __init__(
+        self,
+        retries: int = 3,
+        timeout: int = 10,
+        chunk_size: int = CHUNK_SIZE,
+        pool_size: int = POOL_SIZE,
+        cache: Optional[DownloadCache] = None,
+        metrics: Optional[Metrics] = None,
+    ):
         """
         Initiates an instance of the Downloader class.
 
         Args:
             retries: number of retries the download request should be done in case of failure
             timeout: number of seconds to wait before aborting the request and start a new one
+            chunk_size: number of bytes read from the response and written to disk at a time
+            pool_size: number of keep-alive connections kept open per host
+            cache: cache used to revalidate previously downloaded URLs instead of
+                downloading them again
+            metrics: registry recording the "download" stage, a private one is
+                created if not given
         """
         self.retries = retries
         self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.pool_size = pool_size
+        self._session: Optional["requests.Session"] = None
+        self._session_lock = threading.Lock()
+        self.cache = cache
+        self.metrics = metrics if metrics is not None else Metrics()
         logger.debug(
-            f"Downloader initialized with retries={retries} and timeout={timeout}"
+            f"Downloader initialized with retries={retries}, timeout={timeout}, "
+            f"chunk_size={chunk_size} and pool_size={pool_size}"
         )
 
-    def download_from_url(self, url: str, path: str):
+    @property
+    def session(self) -> "requests.Session":
+        """
+        Session whose connection pool is shared by every download, created on
+        first use so that requests is only imported once something is downloaded.
+        """
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._build_session(self.pool_size)
+            return self._session
+
+    @staticmethod
+    def _build_session(pool_size: int) -> "requests.Session":
+        """
+        Creates a session whose connection pool is shared by every download.
+
+        Args:
+            pool_size: maximum number of connections kept open per host
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def download_from_url(self, url: str, path: str, resume: bool = True):
         """
         Downloads a file from the given URL and stores it at the specified path.
+
+        The response body is streamed to a "<path>.part" file in chunks of chunk_size
+        bytes, so memory usage does not depend on the file size. The partial file is
+        only renamed to the final path once its size matches the one announced by the
+        server. If an attempt fails midway, the partial file is kept and the next
+        attempt asks the server for the missing bytes only, using an HTTP Range
+        request.
+
+        When a cache is configured, a URL that was downloaded before is revalidated
+        with a conditional request, and a 304 Not Modified answer restores the file
+        from the cache without transferring it again. If the cached copy is gone by
+        then, the URL is requested again without the conditional headers.
+
         Args:
             url: url to download from
             path: path to store the downloaded file
+            resume: whether to continue from an existing partial file, including one
+                left behind by a previous call
         """
-        for attempt in range(1, self.retries + 1):
-            try:
-                logger.info(f"Attempt {attempt}: Downloading from {url}")
-                response = requests.get(url, timeout=self.timeout)
-                response.raise_for_status()
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                with open(path, "wb") as f:
-                    f.write(response.content)
-                logger.info(f"Successfully downloaded and saved file to: {path}")
-                return path
-            except requests.RequestException as e:
-                logger.warning(f"Download attempt {attempt} failed: {e}")
-                if attempt < self.retries:
-                    time.sleep(SLEEP_TIME)
-                else:
-                    logger.error(
-                        f"All {self.retries} download attempts failed for {url}"
+        import requests
+
+        part_path = f"{path}.part"
+        if not resume:
+            self._discard_part(part_path)
+
+        with self.metrics.stage("download") as stage:
+            for attempt in range(1, self.retries + 1):
+                try:
+                    logger.info(f"Attempt {attempt}: Downloading from {url}")
+                    start = time.perf_counter()
+                    size, response = self._fetch_to_part(url, part_path)
+                    stage.add("bytes_in", size)
+                    if self.cache is not None and response.status_code == 304:
+                        logger.info(f"{url} was not modified since it was cached")
+                        restored = self.cache.restore(url, path)
+                        if restored is not None:
+                            stage.add("cache_hits")
+                            return restored
+                        logger.info(f"{url} left the cache, downloading it again")
+                        size, response = self._fetch_to_part(
+                            url, part_path, revalidate=False
+                        )
+                        stage.add("bytes_in", size)
+
+                    os.replace(part_path, path)
+                    self._discard_part(part_path)
+                    if self.cache is not None:
+                        self.cache.store(
+                            url,
+                            path,
+                            etag=response.headers.get("ETag"),
+                            last_modified=response.headers.get("Last-Modified"),
+                        )
+                    elapsed = max(time.perf_counter() - start, 1e-9)
+                    logger.info(
+                        f"Successfully downloaded and saved file to: {path} "
+                        f"({size} bytes in {elapsed:.2f}s, "
+                        f"{size / elapsed:.0f} bytes/sec)"
+                    )
+                    stage.add("files")
+                    return path
+                except requests.RequestException as e:
+                    logger.warning(f"Download attempt {attempt} failed: {e}")
+                    if attempt < self.retries:
+                        stage.add("retries")
+                        time.sleep(SLEEP_TIME)
+                    else:
+                        logger.error(
+                            f"All {self.retries} download attempts failed for {url}"
+                        )
+                        raise
+
+    def stream(self, url: str) -> Iterator[bytes]:
+        """
+        Yields the body of the given URL in chunks of chunk_size bytes, as they are
+        received, without storing it.
+
+        If a transfer fails midway, the next attempt asks the server for the
+        missing bytes only, using an HTTP Range request, so every byte is yielded
+        exactly once. When the server ignores the range and sends the whole file
+        again, the bytes already yielded are skipped.
+
+        Args:
+            url: url to download from
+
+        Yields:
+            Chunks of the response body, in order.
+
+        Raises:
+            requests.RequestException: If every attempt failed.
+        """
+        import requests
+
+        from deta.downloader.errors import IncompleteDownloadError
+
+        offset = 0
+        with self.metrics.stage("download") as stage:
+            for attempt in range(1, self.retries + 1):
+                try:
+                    logger.info(f"Attempt {attempt}: Streaming from {url}")
+                    headers: Dict[str, str] = {}
+                    if offset:
+                        headers = {
+                            "Range": f"bytes={offset}-",
+                            "Accept-Encoding": "identity",
+                        }
+                    response = self.session.get(
+                        url, timeout=self.timeout, stream=True, headers=headers
                     )
-                    raise
+                    try:
+                        response.raise_for_status()
+                        expected = self._expected_size(response, offset)
+                        skip = offset if response.status_code != 206 else 0
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            if skip:
+                                chunk, skip = chunk[skip:], max(skip - len(chunk), 0)
+                            if chunk:
+                                offset += len(chunk)
+                                stage.add("bytes_in", len(chunk))
+                                yield chunk
+                    finally:
+                        response.close()
+
+                    if expected is not None and offset != expected:
+                        raise IncompleteDownloadError(
+                            f"Streamed {offset} bytes from {url}, expected {expected}"
+                        )
+                    logger.info(f"Successfully streamed {offset} bytes from {url}")
+                    stage.add("files")
+                    return
+                except requests.RequestException as e:
+                    logger.warning(f"Stream attempt {attempt} failed: {e}")
+                    if attempt < self.retries:
+                        stage.add("retries")
+                        time.sleep(SLEEP_TIME)
+                    else:
+                        logger.error(
+                            f"All {self.retries} stream attempts failed for {url}"
+                        )
+                        raise
+
+    def _fetch_to_part(
+        self, url: str, part_path: str, revalidate: bool = True
+    ) -> Tuple[int, "requests.Response"]:
+        """
+        Performs one transfer attempt into the partial file.
+
+        The ETag or Last-Modified validator of the response that started the
+        partial file is kept next to it, in "<part_path>.validator", and sent as
+        If-Range when resuming, so that a server whose file changed since answers
+        with the whole new file, which replaces the partial one, instead of the
+        missing bytes of a different file.
+
+        Args:
+            url: url to download from
+            part_path: path of the partial file, appended to when it already exists
+            revalidate: whether to send the conditional headers of the cache
+
+        Returns:
+            A tuple with the number of bytes transferred by this attempt and the
+            closed response, whose status is 304 when the cached copy is current.
+
+        Raises:
+            IncompleteDownloadError: If the partial file does not match the size
+                announced by the server once the response is exhausted.
+        """
+        from deta.downloader.errors import IncompleteDownloadError
+
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers: Dict[str, str] = {}
+        if offset:
+            headers = {"Range": f"bytes={offset}-", "Accept-Encoding": "identity"}
+            validator = self._read_validator(part_path)
+            if validator:
+                headers["If-Range"] = validator
+        elif self.cache is not None and revalidate:
+            headers = self.cache.conditional_headers(url)
+
+        response = self.session.get(
+            url, timeout=self.timeout, stream=True, headers=headers
+        )
+        try:
+            if headers and not offset and response.status_code == 304:
+                return 0, response
+            if offset and response.status_code == 416:
+                self._discard_part(part_path)
+                raise IncompleteDownloadError(
+                    f"Server rejected range starting at byte {offset}, "
+                    "discarding partial file"
+                )
+            response.raise_for_status()
+            os.makedirs(os.path.dirname(part_path) or ".", exist_ok=True)
+
+            try:
+                expected = self._expected_size(response, offset)
+            except IncompleteDownloadError:
+                self._discard_part(part_path)
+                raise
+            if response.status_code == 206:
+                logger.info(f"Resuming download of {url} from byte {offset}")
+            else:
+                if offset:
+                    logger.info(f"{url} changed or cannot resume, restarting")
+                offset = 0
+                self._save_validator(part_path, response)
+
+            with open(part_path, "ab" if offset else "wb") as f:
+                written = self._write_stream(response, f)
+        finally:
+            response.close()
+
+        size = offset + written
+        if expected is not None and size != expected:
+            if size > expected:
+                self._discard_part(part_path)
+            raise IncompleteDownloadError(
+                f"Downloaded {size} bytes from {url}, expected {expected}"
+            )
+        return written, response
+
+    @staticmethod
+    def _read_validator(part_path: str) -> Optional[str]:
+        """
+        Returns the validator saved along with a partial file, if any.
+        """
+        try:
+            with open(f"{part_path}.validator", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _save_validator(part_path: str, response: "requests.Response") -> None:
+        """
+        Saves the validator of the response starting a partial file. A weak ETag
+        cannot be used in If-Range, so Last-Modified is kept instead.
+        """
+        etag = response.headers.get("ETag")
+        validator = etag if etag and not etag.startswith("W/") else None
+        validator = validator or response.headers.get("Last-Modified")
+        validator_path = f"{part_path}.validator"
+        if validator:
+            os.makedirs(os.path.dirname(validator_path) or ".", exist_ok=True)
+            with open(validator_path, "w", encoding="utf-8") as f:
+                f.write(validator)
+        elif os.path.exists(validator_path):
+            os.remove(validator_path)
+
+    @staticmethod
+    def _discard_part(part_path: str) -> None:
+        """
+        Removes a partial file and its validator.
+        """
+        for stale in (part_path, f"{part_path}.validator"):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    @staticmethod
+    def _expected_size(response: "requests.Response", offset: int) -> Optional[int]:
+        """
+        Reads the total size of the file from the response headers.
+
+        Args:
+            response: response to the download request
+            offset: byte the download was asked to resume from
+
+        Returns:
+            The expected size in bytes, or None when the server does not announce it
+            or the body is content-encoded.
+
+        Raises:
+            IncompleteDownloadError: If a partial response does not start at offset.
+        """
+        from deta.downloader.errors import IncompleteDownloadError
+
+        if response.headers.get("Content-Encoding"):
+            return None
+
+        if response.status_code == 206:
+            content_range = response.headers.get("Content-Range", "")
+            match = re.fullmatch(r"bytes (\d+)-\d+/(\d+|\*)", content_range.strip())
+            if not match or int(match.group(1)) != offset:
+                raise IncompleteDownloadError(
+                    f"Unexpected Content-Range {content_range!r} for offset {offset}"
+                )
+            return None if match.group(2) == "*" else int(match.group(2))
+
+        content_length = response.headers.get("Content-Length")
+        return int(content_length) if content_length is not None else None
+
+    def download_many(
+        self, urls: Iterable[str], dest_dir: str, max_workers: int = 4
+    ) -> Tuple[Dict[str, str], Dict[str, Exception]]:
+        """
+        Downloads several URLs concurrently into a directory.
+
+        Every download reuses the connection pool of this instance, so keep
+        pool_size at least as large as max_workers. A failing URL does not stop the
+        others; its exception is returned instead.
+
+        Args:
+            urls: urls to download from
+            dest_dir: directory to store the downloaded files, named after the url
+            max_workers: number of downloads running at the same time
+
+        Returns:
+            A tuple (results, failures) mapping each successful url to the path of
+            the stored file, and each failed url to the exception it raised, e.g.
+            a ValueError for a url without a file name.
+
+        Raises:
+            ValueError: If two urls would be stored at the same path.
+        """
+        targets = list(dict.fromkeys(urls))
+        self._check_distinct_paths(targets, dest_dir)
+        results: Dict[str, str] = {}
+        failures: Dict[str, Exception] = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._download_to_dir, url, dest_dir): url
+                for url in targets
+            }
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    results[url] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to download {url}: {e}")
+                    failures[url] = e
+
+        logger.info(
+            f"Downloaded {len(results)} of {len(targets)} files to {dest_dir} "
+            f"({len(failures)} failed)"
+        )
+        return results, failures
+
+    def _download_to_dir(self, url: str, dest_dir: str) -> str:
+        """
+        Downloads a url into dest_dir, named after the url.
+
+        Raises:
+            ValueError: If no file name can be inferred from the url.
+        """
+        return self.download_from_url(url, self._path_for_url(url, dest_dir))
+
+    @classmethod
+    def _check_distinct_paths(cls, urls: List[str], dest_dir: str) -> None:
+        """
+        Makes sure no two urls are stored at the same path, as their downloads
+        would write to the same partial file at the same time. Urls without a file
+        name are left to fail on their own.
+
+        Raises:
+            ValueError: If two urls share a file name.
+        """
+        owners: Dict[str, str] = {}
+        for url in urls:
+            try:
+                path = cls._path_for_url(url, dest_dir)
+            except ValueError:
+                continue
+            if path in owners:
+                raise ValueError(
+                    f"{owners[path]} and {url} would both be stored at {path}"
+                )
+            owners[path] = url
+
+    @staticmethod
+    def _path_for_url(url: str, dest_dir: str) -> str:
+        """
+        Builds the local path of a url's file inside dest_dir.
+
+        Args:
+            url: url to download from
+            dest_dir: directory to store the downloaded file
+        """
+        file_name = os.path.basename(urlparse(url).path)
+        if not file_name:
+            raise ValueError(f"Cannot infer a file name from url: {url}")
+        return os.path.join(dest_dir, file_name)
+
+    def _write_stream(self, response: "requests.Response", f) -> int:
+        """
+        Writes the body of a streamed response to an open binary file.
+
+        Args:
+            response: response obtained with stream=True
+            f: binary file object to write to
+
+        Returns:
+            Number of bytes written.
+        """
+        size = 0
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            if chunk:
+                f.write(chunk)
+                size += len(chunk)
+        return size
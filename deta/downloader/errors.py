@@ -0,0 +1,7 @@
+import requests
+
+
+class IncompleteDownloadError(requests.RequestException):
+    """
+    Raised when a transfer ends before the whole file has been received.
+    """
@@ -1,52 +1,266 @@
+from deta.batch.batch import BatchProcessor
+from deta.cache.cache import DownloadCache
+from deta.discovery.discovery import FirdsIndexCrawler
 from deta.downloader.downloader import Downloader
+from deta.metrics.metrics import Metrics
+from deta.pipeline.pipeline import Pipeline
+from deta.store.store import InstrumentStore
+from deta.xml_handler.extractor import COLUMNS, DELTA_SCHEMA
+from deta.xml_handler.streaming import StreamingConverter
 from deta.xml_handler.xml_handler import XMLHandler
 from deta.csv_handler.csv_handler import CSVHandler
+from datetime import date
+from typing import List, Optional
+import argparse
 import logging
+import os
+import sys
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+MANIFEST_PATH = "data/manifest.json"
+STORE_PATH = "data/instruments.sqlite"
+BATCH_DIR = "data/batch"
+START_DATE = "2021-01-17"
+END_DATE = "2021-01-19"
 
-def main() -> None:
 
-    first_url = "https://registers.esma.europa.eu/solr/esma_registers_firds_files/select?q=*&fq=publication_date:%5B2021-01-17T00:00:00Z+TO+2021-01-19T23:59:59Z%5D&wt=xml&indent=true&start=0&rows=100"
-    first_file_path = "data/first_url.xml"
-    downloader = Downloader(retries=3, timeout=10)
-    try:
-        first_downloaded_path = downloader.download_from_url(first_url, first_file_path)
-        logging.info(f"First file downloaded to: {first_downloaded_path}")
-        handler = XMLHandler(first_file_path)
-        xml_str = handler.read_xml()
+def build_pipeline(
+    metrics: Metrics, manifest_path: str = MANIFEST_PATH, streaming: bool = False
+) -> Pipeline:
+    """
+    Builds the end-to-end pipeline: discover the DLTINS files, download the second
+    one in the order of the Solr index, as the original single-page query did,
+    convert it to CSV, apply it to the instrument store, add the derived columns
+    and upload the result.
+
+    With streaming, the download and convert stages are replaced by a single stream
+    stage converting the file while it is downloaded, see StreamingConverter.
+    """
+    crawler = FirdsIndexCrawler(metrics=metrics)
+    downloader = Downloader(
+        retries=3,
+        timeout=10,
+        cache=DownloadCache("data/.download_cache"),
+        metrics=metrics,
+    )
+
+    def discover(context: dict) -> dict:
+        files = crawler.crawl(
+            context["start_date"],
+            context["end_date"],
+            file_types=["DLTINS"],
+            index_order=True,
+        )
+        if len(files) < 2:
+            raise ValueError(
+                f"Only {len(files)} DLTINS links found, index 1 is out of range."
+            )
+        logging.info(f"Found DLTINS download link: {files[1]['download_link']}")
+        return {"url": files[1]["download_link"]}
 
-        second_url = handler.parse_xml(xml_str, index=1)
+    def download(context: dict) -> dict:
+        path = downloader.download_from_url(context["url"], "data/second_url.zip")
+        return {"zip_path": path}
 
-        second_file_path = "data/second_url.zip"
-        second_downloaded_path = downloader.download_from_url(
-            second_url, second_file_path
+    def convert(context: dict) -> dict:
+        handler = XMLHandler(context["zip_path"], schema=DELTA_SCHEMA, metrics=metrics)
+        csv_path = handler.convert_zip_to_csv(
+            context["zip_path"], output_csv_path="data/converted/converted.csv"
         )
+        return {"csv_path": csv_path}
 
-        extracted_xml_path = handler.extract_from_zip(
-            second_downloaded_path, extract_to="data/extracted_xml"
+    def stream(context: dict) -> dict:
+        converter = StreamingConverter(
+            downloader=downloader, schema=DELTA_SCHEMA, metrics=metrics
         )
-        second_handler = XMLHandler(extracted_xml_path)
-        csv_path = second_handler.convert_to_csv(
-            output_csv_path="data/extracted_xml/converted.csv"
+        csv_path = converter.convert_url(
+            context["url"],
+            "data/converted/converted.csv",
+            zip_path="data/second_url.zip",
         )
+        return {"zip_path": "data/second_url.zip", "csv_path": csv_path}
 
-        csv_handler = CSVHandler(csv_path)
+    def store(context: dict) -> dict:
+        with InstrumentStore(STORE_PATH, metrics=metrics) as instruments:
+            applied = instruments.apply_delta(context["csv_path"])
+            return {"instruments_applied": applied, "instruments": instruments.count()}
+
+    def transform(context: dict) -> dict:
+        # The record type only serves the store, the output keeps COLUMNS.
+        csv_handler = CSVHandler(context["csv_path"], columns=COLUMNS, metrics=metrics)
         csv_handler.add_a_count_column()
         csv_handler.add_contains_a_column()
-        csv_handler.write_csv()
+        transformed_path = "data/transformed/transformed.csv"
+        csv_handler.upload_file(
+            destination_type="local", destination_path=transformed_path
+        )
+        return {"transformed_path": transformed_path}
 
+    def upload(context: dict) -> dict:
+        csv_handler = CSVHandler(context["transformed_path"], metrics=metrics)
         csv_handler.upload_file(
-            destination_type="local", destination_path="data/final/final.csv"
+            destination_type="local", destination_path=context["destination"]
         )
         # csv_handler.upload_file(destination_type="s3", destination_path="mock-bucket/final.csv")
         # csv_handler.upload_file(destination_type="blob", destination_path="container/path/final.csv")
+        return {"final_path": context["destination"]}
+
+    pipeline = Pipeline(manifest_path).add_stage(
+        "discover", discover, inputs=["start_date", "end_date"]
+    )
+    if streaming:
+        pipeline.add_stage(
+            "stream", stream, inputs=["url"], outputs=["zip_path", "csv_path"]
+        )
+    else:
+        pipeline.add_stage(
+            "download", download, inputs=["url"], outputs=["zip_path"]
+        ).add_stage("convert", convert, inputs=["zip_path"], outputs=["csv_path"])
+    return (
+        pipeline.add_stage("store", store, inputs=["csv_path"])
+        .add_stage(
+            "transform",
+            transform,
+            inputs=["csv_path"],
+            outputs=["transformed_path"],
+        )
+        .add_stage(
+            "upload",
+            upload,
+            inputs=["transformed_path", "destination"],
+            outputs=["final_path"],
+        )
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command line entry point.
+
+    Without a command, runs the pipeline of build_pipeline on the second DLTINS
+    file published in the date range. The batch command processes every file of
+    the given types published in the date range instead, see BatchProcessor.
+
+    Returns:
+        The exit status, 1 if the pipeline or any file of the batch failed.
+    """
+    parser = argparse.ArgumentParser(description="Runs the DETA pipeline.")
+    parser.add_argument(
+        "--start-date",
+        type=_iso_date,
+        default=START_DATE,
+        help="first publication date, YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "--end-date",
+        type=_iso_date,
+        default=END_DATE,
+        help="last publication date, YYYY-MM-DD",
+    )
+    parser.add_argument("--resume-from", help="name of the stage to resume from")
+    parser.add_argument(
+        "--force", action="store_true", help="run every stage, even unchanged ones"
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="convert the file while it is downloaded",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    batch = subparsers.add_parser(
+        "batch", help="process every file published in the date range"
+    )
+    batch.add_argument("--start-date", type=_iso_date, required=True)
+    batch.add_argument("--end-date", type=_iso_date, required=True)
+    batch.add_argument(
+        "--file-type",
+        action="append",
+        dest="file_types",
+        help="type of the files to process, repeatable (default: DLTINS)",
+    )
+    batch.add_argument(
+        "--output-dir", default=BATCH_DIR, help="directory of the per-file outputs"
+    )
+    batch.add_argument(
+        "--workers",
+        type=int,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    batch.add_argument("--merge", metavar="PATH", help="CSV merging every output")
+    batch.add_argument(
+        "--chunksize", type=int, help="rows per chunk when adding derived columns"
+    )
+    batch.add_argument(
+        "--streaming",
+        action="store_true",
+        default=argparse.SUPPRESS,
+        help="convert each file while it is downloaded",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "batch":
+        return _run_batch(args)
+
+    metrics = Metrics()
+    try:
+        build_pipeline(metrics, streaming=args.streaming).run(
+            {
+                "start_date": args.start_date,
+                "end_date": args.end_date,
+                "destination": "data/final/final.csv",
+            },
+            resume_from=args.resume_from,
+            force=args.force,
+        )
+        return 0
+    except Exception as e:
+        logging.error(f"Pipeline failed: {e}")
+        return 1
+    finally:
+        metrics.write_json("data/metrics/run.json")
+        metrics.write_prometheus("data/metrics/deta.prom")
+
+
+def _run_batch(args: argparse.Namespace) -> int:
+    metrics = Metrics()
+    processor = BatchProcessor(
+        args.output_dir,
+        workers=args.workers,
+        streaming=args.streaming,
+        chunksize=args.chunksize,
+        metrics=metrics,
+    )
+    try:
+        results = processor.run(
+            args.start_date,
+            args.end_date,
+            file_types=args.file_types or ["DLTINS"],
+            merge_path=args.merge,
+        )
+        return 1 if any("error" in result for result in results) else 0
     except Exception as e:
-        logging.error(f"Failed to download file: {e}")
+        logging.error(f"Batch failed: {e}")
+        return 1
+    finally:
+        metrics.write_json(os.path.join(args.output_dir, "metrics", "run.json"))
+        metrics.write_prometheus(os.path.join(args.output_dir, "metrics", "deta.prom"))
+
+
+def _iso_date(value: str) -> str:
+    """
+    Checks that a command line argument is a YYYY-MM-DD date.
+    """
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid date: {value!r}, expected YYYY-MM-DD"
+        )
+    return value
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,279 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+PROMETHEUS_PREFIX = "deta"
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """
+    Returns the peak resident memory of the current process in bytes, or None
+    when it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Stage:
+    """
+    Counters of one run of a pipeline stage, handed out by Metrics.stage.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counters: Dict[str, float] = {}
+
+    def add(self, counter: str, value: float = 1) -> None:
+        """
+        Increments a counter of the stage, e.g. "bytes_in", "rows" or "retries".
+
+        Args:
+            counter: name of the counter
+            value: amount added to the counter
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+
+class Metrics:
+    """
+    Collects per-stage metrics of a pipeline run: wall time, number of calls,
+    growth of the peak resident memory, and counters such as bytes in/out, rows
+    processed or retries.
+
+    The peak resident memory of a process only ever grows, so a stage is not
+    given the peak itself, which would be the one of the most memory hungry
+    stage run before it, but how much the peak rose while the stage ran. The
+    peak of the process is reported once for the whole run.
+
+    Runs of a stage with the same name are aggregated, so a registry shared by
+    several threads or handlers reports one line per stage. The metrics can be
+    exported as a JSON run report or as a Prometheus textfile.
+    """
+
+    def __init__(self, run_id: Optional[str] = None):
+        """
+        Initiates an instance of the Metrics class.
+
+        Args:
+            run_id: identifier of the run in the exported reports, defaults to the
+                UTC start time of the run
+        """
+        self.started_at = datetime.now(timezone.utc)
+        self.run_id = run_id or self.started_at.strftime("%Y%m%dT%H%M%SZ")
+        self.stages: Dict[str, dict] = {}
+        self._peak_rss_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Stage]:
+        """
+        Measures a block of code as one run of a stage.
+
+        The counters added to the yielded Stage are recorded along with the wall
+        time of the block, even when it raises, in which case the "errors" counter
+        of the stage is incremented.
+
+        Args:
+            name: name of the stage, e.g. "download" or "parse"
+
+        Yields:
+            The Stage to add the counters of this run to.
+        """
+        current = Stage(name)
+        peak_before = peak_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield current
+        except BaseException:
+            current.add("errors")
+            raise
+        finally:
+            self._record(current, time.perf_counter() - start, peak_before)
+
+    def _record(
+        self, current: Stage, seconds: float, peak_before: Optional[int]
+    ) -> None:
+        peak = peak_rss_bytes()
+        with self._lock:
+            entry = self.stages.setdefault(current.name, _empty_entry())
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            if peak is not None and peak_before is not None:
+                entry["peak_rss_growth_bytes"] = max(
+                    entry["peak_rss_growth_bytes"] or 0, peak - peak_before
+                )
+            for counter, value in current.counters.items():
+                entry["counters"][counter] = entry["counters"].get(counter, 0) + value
+        logger.debug(
+            f"Stage {current.name} took {seconds:.3f}s with {current.counters}"
+        )
+
+    def merge(
+        self, stages: Dict[str, dict], peak_rss_bytes: Optional[int] = None
+    ) -> None:
+        """
+        Adds the stages of another registry, e.g. one filled in a worker process,
+        to this one. Calls, seconds and counters are summed, and the highest peak
+        memory growth is kept.
+
+        Args:
+            stages: the "stages" of the report of the other registry, see to_dict
+            peak_rss_bytes: the peak resident memory of the process of the other
+                registry, reported as the one of the run when it is the highest
+        """
+        with self._lock:
+            if peak_rss_bytes is not None:
+                self._peak_rss_bytes = max(self._peak_rss_bytes or 0, peak_rss_bytes)
+            for name, other in stages.items():
+                entry = self.stages.setdefault(name, _empty_entry())
+                entry["calls"] += other["calls"]
+                entry["seconds"] += other["seconds"]
+                if other["peak_rss_growth_bytes"] is not None:
+                    entry["peak_rss_growth_bytes"] = max(
+                        entry["peak_rss_growth_bytes"] or 0,
+                        other["peak_rss_growth_bytes"],
+                    )
+                for counter, value in other["counters"].items():
+                    entry["counters"][counter] = (
+                        entry["counters"].get(counter, 0) + value
+                    )
+
+    def to_dict(self) -> dict:
+        """
+        Returns the run report, a JSON serializable dict. Its peak_rss_bytes is
+        the peak resident memory of the process, or of the merged worker
+        processes when higher.
+        """
+        peak = peak_rss_bytes()
+        with self._lock:
+            stages = {
+                name: dict(entry, counters=dict(entry["counters"]))
+                for name, entry in self.stages.items()
+            }
+            if self._peak_rss_bytes is not None:
+                peak = max(peak or 0, self._peak_rss_bytes)
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": (
+                datetime.now(timezone.utc) - self.started_at
+            ).total_seconds(),
+            "peak_rss_bytes": peak,
+            "stages": stages,
+        }
+
+    def write_json(self, path: str) -> str:
+        """
+        Writes the run report as JSON.
+
+        Args:
+            path: path of the JSON file
+
+        Returns:
+            The path of the written file.
+        """
+        _write_atomic(path, json.dumps(self.to_dict(), indent=2) + "\n")
+        logger.info(f"Run report written to: {path}")
+        return path
+
+    def to_prometheus(self) -> str:
+        """
+        Formats the metrics in the Prometheus text exposition format.
+
+        Every metric is a gauge labelled with the stage, as the values describe
+        the last run rather than totals over the lifetime of a process.
+        """
+        report = self.to_dict()
+        series: Dict[str, list] = {
+            "stage_duration_seconds": [],
+            "stage_calls": [],
+            "stage_peak_rss_growth_bytes": [],
+        }
+        for name, entry in sorted(report["stages"].items()):
+            series["stage_duration_seconds"].append((name, entry["seconds"]))
+            series["stage_calls"].append((name, entry["calls"]))
+            if entry["peak_rss_growth_bytes"] is not None:
+                series["stage_peak_rss_growth_bytes"].append(
+                    (name, entry["peak_rss_growth_bytes"])
+                )
+            for counter, value in sorted(entry["counters"].items()):
+                series.setdefault(f"stage_{counter}", []).append((name, value))
+
+        lines = []
+        for metric, samples in series.items():
+            full_name = f"{PROMETHEUS_PREFIX}_{metric}"
+            lines.append(f"# TYPE {full_name} gauge")
+            for stage, value in samples:
+                lines.append(f'{full_name}{{stage="{stage}"}} {_format(value)}')
+        if report["peak_rss_bytes"] is not None:
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_process_peak_rss_bytes gauge")
+            lines.append(
+                f"{PROMETHEUS_PREFIX}_process_peak_rss_bytes "
+                f"{report['peak_rss_bytes']}"
+            )
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_run_wall_seconds gauge")
+        lines.append(
+            f"{PROMETHEUS_PREFIX}_run_wall_seconds {_format(report['wall_seconds'])}"
+        )
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_run_start_timestamp_seconds gauge")
+        lines.append(
+            f"{PROMETHEUS_PREFIX}_run_start_timestamp_seconds "
+            f"{self.started_at.timestamp():.3f}"
+        )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> str:
+        """
+        Writes the metrics as a Prometheus textfile, e.g. for the textfile
+        collector of the node exporter. The file is replaced atomically so that
+        the collector never reads a partial file.
+
+        Args:
+            path: path of the textfile, usually ending with ".prom"
+
+        Returns:
+            The path of the written file.
+        """
+        _write_atomic(path, self.to_prometheus())
+        logger.info(f"Prometheus metrics written to: {path}")
+        return path
+
+
+def _empty_entry() -> dict:
+    return {
+        "calls": 0,
+        "seconds": 0.0,
+        "peak_rss_growth_bytes": None,
+        "counters": {},
+    }
+
+
+def _format(value: float) -> str:
+    """
+    Formats a sample value without losing the precision of large counters.
+    """
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _write_atomic(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
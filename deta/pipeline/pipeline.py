@@ -0,0 +1,213 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from deta.cache.cache import file_sha256
+
+logger = logging.getLogger(__name__)
+
+StageFunction = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+class PipelineStage:
+    """
+    A named step of a Pipeline, with the context values it depends on and the
+    files it produces.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: StageFunction,
+        inputs: Iterable[str] = (),
+        outputs: Iterable[str] = (),
+        cache: bool = True,
+    ):
+        """
+        Initiates an instance of the PipelineStage class.
+
+        Args:
+            name: unique name of the stage
+            func: function receiving the pipeline context and returning a dict of
+                JSON serializable results, added to the context
+            inputs: keys of the context the stage depends on. Values pointing to
+                existing files are fingerprinted by their content.
+            outputs: keys of the results holding paths of files produced by the
+                stage, whose content hashes are recorded in the manifest
+            cache: whether the stage may be skipped when its inputs did not change
+        """
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.cache = cache
+
+
+class Pipeline:
+    """
+    Runs stages in order and records a manifest of their results and outputs, so
+    that a re-run skips the stages whose inputs did not change.
+
+    A stage is skipped when the fingerprint of its inputs matches the one in the
+    manifest and every output file still has the recorded content hash; its
+    recorded results are then put back in the context. The manifest is saved
+    after every completed stage, so a failure only loses the failing stage.
+    """
+
+    def __init__(self, manifest_path: str):
+        """
+        Initiates an instance of the Pipeline class and loads its manifest.
+
+        Args:
+            manifest_path: path of the JSON manifest, created on the first run
+        """
+        self.manifest_path = manifest_path
+        self.stages: List[PipelineStage] = []
+        self.manifest: Dict[str, dict] = self._load_manifest()
+        logger.debug(f"Pipeline initialized with manifest_path={manifest_path}")
+
+    def add_stage(
+        self,
+        name: str,
+        func: StageFunction,
+        inputs: Iterable[str] = (),
+        outputs: Iterable[str] = (),
+        cache: bool = True,
+    ) -> "Pipeline":
+        """
+        Appends a stage to the pipeline, see PipelineStage for the arguments.
+
+        Returns:
+            The pipeline, so that calls can be chained.
+
+        Raises:
+            ValueError: If a stage with the same name was already added.
+        """
+        if any(stage.name == name for stage in self.stages):
+            raise ValueError(f"Stage '{name}' is already defined.")
+        self.stages.append(PipelineStage(name, func, inputs, outputs, cache))
+        return self
+
+    def run(
+        self,
+        context: Optional[Dict[str, Any]] = None,
+        resume_from: Optional[str] = None,
+        force: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Runs the pipeline.
+
+        Args:
+            context: initial values available to the stages, e.g. parameters
+            resume_from: name of the stage to resume from. The stages before it
+                are not run and their recorded results are used instead, and the
+                stages from it onwards are run even if their inputs did not
+                change.
+            force: whether to run every stage regardless of the manifest
+
+        Returns:
+            The context, with the results of every stage.
+
+        Raises:
+            ValueError: If resume_from is not a stage name, or a stage before it
+                has never completed.
+        """
+        context = dict(context or {})
+        names = [stage.name for stage in self.stages]
+        if resume_from is not None and resume_from not in names:
+            raise ValueError(f"Unknown stage to resume from: {resume_from}")
+        resume_index = names.index(resume_from) if resume_from is not None else None
+
+        for i, stage in enumerate(self.stages):
+            entry = self.manifest.get(stage.name)
+            if resume_index is not None and i < resume_index:
+                if entry is None:
+                    raise ValueError(
+                        f"Cannot resume from '{resume_from}': stage '{stage.name}' "
+                        "has no recorded results."
+                    )
+                logger.info(f"Skipping stage {stage.name}, resuming later")
+                context.update(entry["results"])
+                continue
+
+            fingerprint = self._fingerprint(stage, context)
+            forced = force or (resume_index is not None and i >= resume_index)
+            if (
+                not forced
+                and stage.cache
+                and entry is not None
+                and self._is_current(entry, fingerprint)
+            ):
+                logger.info(f"Skipping stage {stage.name}, its inputs did not change")
+                context.update(entry["results"])
+                continue
+
+            logger.info(f"Running stage {stage.name}")
+            start = time.perf_counter()
+            results = stage.func(context) or {}
+            context.update(results)
+            self.manifest[stage.name] = {
+                "fingerprint": fingerprint,
+                "results": results,
+                "outputs": {
+                    results[key]: file_sha256(results[key]) for key in stage.outputs
+                },
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+            self._save_manifest()
+            logger.info(f"Stage {stage.name} completed")
+
+        return context
+
+    def _fingerprint(self, stage: PipelineStage, context: Dict[str, Any]) -> str:
+        """
+        Hashes the name and the inputs of a stage, using the content of the
+        inputs that are paths to existing files.
+        """
+        values: Dict[str, Any] = {}
+        for key in stage.inputs:
+            value = context.get(key)
+            if isinstance(value, str) and os.path.isfile(value):
+                values[key] = {"path": value, "sha256": file_sha256(value)}
+            else:
+                values[key] = value
+        payload = json.dumps(
+            {"stage": stage.name, "inputs": values}, sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _is_current(entry: Optional[dict], fingerprint: str) -> bool:
+        """
+        Tells whether a manifest entry matches the fingerprint and its output files
+        are unchanged.
+        """
+        if entry is None or entry.get("fingerprint") != fingerprint:
+            return False
+        for path, digest in entry.get("outputs", {}).items():
+            if not os.path.isfile(path) or file_sha256(path) != digest:
+                logger.info(f"Output {path} is missing or was modified")
+                return False
+        return True
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)["stages"]
+        except (json.JSONDecodeError, KeyError) as e:
+            logger.warning(f"Ignoring corrupted manifest {self.manifest_path}: {e}")
+            return {}
+
+    def _save_manifest(self) -> None:
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stages": self.manifest}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,334 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Union
+
+from deta.metrics.metrics import Metrics
+from deta.xml_handler.extractor import COLUMNS, RECORD_TYPE_COLUMN
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+ID_COLUMN = "FinInstrmGnlAttrbts.Id"
+TABLE = "instruments"
+CHUNK_SIZE = 100_000
+SCAN_BATCH_SIZE = 10_000
+STORE_COLUMNS = COLUMNS + [RECORD_TYPE_COLUMN]
+CANCELLED = "CancRcrd"
+
+
+class InstrumentStore:
+    """
+    Persistent reference set of instruments, keyed by FinInstrmGnlAttrbts.Id and
+    stored in SQLite.
+
+    DLTINS deltas are applied as bulk upserts, so updating the store costs time
+    in proportion to the size of the delta. Instruments are stored in primary key
+    order, which makes point lookups and range scans on the identifier use the
+    key instead of a full table scan.
+
+    The type of the last record applied to an instrument is stored in
+    RECORD_TYPE_COLUMN, so that terminated instruments are flagged with
+    "TermntdRcrd", and cancelled instruments are deleted from the store.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        columns: Optional[List[str]] = None,
+        index_columns: Iterable[str] = (),
+        metrics: Optional[Metrics] = None,
+    ):
+        """
+        Initiates an instance of the InstrumentStore class, creating the database
+        if it does not exist.
+
+        Args:
+            db_path: path of the SQLite database file
+            columns: columns stored for every instrument, defaults to
+                STORE_COLUMNS. They must include ID_COLUMN.
+            index_columns: columns given a secondary index, to scan them by range
+            metrics: registry recording the "store" stage, a private one is
+                created if not given
+
+        Raises:
+            ValueError: If the columns do not include ID_COLUMN.
+        """
+        columns = list(columns or STORE_COLUMNS)
+        if ID_COLUMN not in columns:
+            raise ValueError(f"The store columns must include {ID_COLUMN}.")
+
+        self.db_path = db_path
+        self.columns = columns
+        self.index_columns = list(index_columns)
+        # Columns are selected by name, as a store reopened with other columns
+        # keeps the order of the table it was created with.
+        self._select = ", ".join(_quote(column) for column in columns)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        logger.debug(f"InstrumentStore initialized with db_path={db_path}")
+
+    def _create_schema(self) -> None:
+        definitions = ", ".join(
+            f"{_quote(column)} TEXT" + (" PRIMARY KEY" if column == ID_COLUMN else "")
+            for column in self.columns
+        )
+        with self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE} ({definitions}) WITHOUT ROWID"
+            )
+            existing = {
+                row[1] for row in self._conn.execute(f"PRAGMA table_info({TABLE})")
+            }
+            for column in self.columns:
+                # Stores created before a column was added get it empty.
+                if column not in existing:
+                    self._conn.execute(
+                        f"ALTER TABLE {TABLE} ADD COLUMN {_quote(column)} TEXT "
+                        "DEFAULT ''"
+                    )
+            for column in self.index_columns:
+                if column not in self.columns:
+                    raise ValueError(f"Cannot index unknown column '{column}'.")
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote('idx_' + column)} "
+                    f"ON {TABLE} ({_quote(column)})"
+                )
+
+    def apply_delta(
+        self, source: Union[str, "pd.DataFrame"], chunksize: int = CHUNK_SIZE
+    ) -> int:
+        """
+        Inserts the instruments of a delta, replacing the stored values of the
+        ones already known, and deletes the cancelled ones.
+
+        The delta is read chunksize rows at a time and applied in a single
+        transaction, so the store never holds a partially applied delta. When an
+        identifier appears several times in the delta, its last row wins. Rows
+        whose RECORD_TYPE_COLUMN is "CancRcrd" delete their instrument, which
+        needs a delta converted with DELTA_SCHEMA; a delta without that column
+        is upserted as a whole. Rows without an identifier are ignored, and
+        columns of the store missing from the delta are stored empty.
+
+        Args:
+            source: path to a converted CSV or Parquet file, or a DataFrame
+            chunksize: number of rows read and written at a time
+
+        Returns:
+            Number of rows applied, cancellations included.
+
+        Raises:
+            ValueError: If the delta has no ID_COLUMN or cannot be read.
+        """
+        import pandas as pd
+
+        columns = ", ".join(_quote(column) for column in self.columns)
+        updates = ", ".join(
+            f"{_quote(column)} = excluded.{_quote(column)}"
+            for column in self.columns
+            if column != ID_COLUMN
+        )
+        statement = (
+            f"INSERT INTO {TABLE} ({columns}) "
+            f"VALUES ({', '.join('?' for _ in self.columns)}) "
+            f"ON CONFLICT({_quote(ID_COLUMN)}) DO "
+            + (f"UPDATE SET {updates}" if updates else "NOTHING")
+        )
+        delete = f"DELETE FROM {TABLE} WHERE {_quote(ID_COLUMN)} = ?"
+
+        with self.metrics.stage("store") as stage, self._lock:
+            applied = deleted = 0
+            try:
+                with self._conn:
+                    for chunk in self._read_delta(source, chunksize):
+                        if ID_COLUMN not in chunk.columns:
+                            raise ValueError(f"The delta has no {ID_COLUMN} column.")
+                        chunk = chunk[chunk[ID_COLUMN] != ""]
+                        if RECORD_TYPE_COLUMN in chunk.columns:
+                            cancelled = chunk[RECORD_TYPE_COLUMN] == CANCELLED
+                        else:
+                            cancelled = pd.Series(False, index=chunk.index)
+                        # Consecutive rows of the same kind are applied together,
+                        # keeping the order of the delta.
+                        runs = (cancelled != cancelled.shift()).cumsum()
+                        for _, run in chunk.groupby(runs, sort=False):
+                            if cancelled[run.index[0]]:
+                                self._conn.executemany(
+                                    delete, ((i,) for i in run[ID_COLUMN])
+                                )
+                                deleted += len(run)
+                            else:
+                                rows = run.reindex(columns=self.columns, fill_value="")
+                                self._conn.executemany(
+                                    statement, rows.itertuples(index=False, name=None)
+                                )
+                        applied += len(chunk)
+            except (OSError, sqlite3.Error, pd.errors.ParserError) as e:
+                raise ValueError(f"Error applying delta: {e}") from e
+            stage.add("rows", applied)
+            if deleted:
+                stage.add("deleted", deleted)
+
+        logger.info(
+            f"Applied {applied} instruments to {self.db_path}, "
+            f"{deleted} of them cancelled"
+        )
+        return applied
+
+    @staticmethod
+    def _read_delta(
+        source: Union[str, "pd.DataFrame"], chunksize: int
+    ) -> Iterator["pd.DataFrame"]:
+        import pandas as pd
+
+        if isinstance(source, pd.DataFrame):
+            for start in range(0, len(source), chunksize):
+                yield source.iloc[start : start + chunksize].fillna("").astype(str)
+        elif source.lower().endswith((".parquet", ".pq")):
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+                yield batch.to_pandas().fillna("").astype(str)
+        else:
+            yield from pd.read_csv(
+                source, dtype=str, keep_default_na=False, chunksize=chunksize
+            )
+
+    def get(self, instrument_id: str) -> Optional[Dict[str, str]]:
+        """
+        Looks an instrument up by identifier.
+
+        Args:
+            instrument_id: value of FinInstrmGnlAttrbts.Id
+
+        Returns:
+            Mapping of column to value, or None if the instrument is not stored.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._select} FROM {TABLE} WHERE {_quote(ID_COLUMN)} = ?",
+                (instrument_id,),
+            ).fetchone()
+        return dict(zip(self.columns, row)) if row is not None else None
+
+    def get_many(self, instrument_ids: Iterable[str]) -> "pd.DataFrame":
+        """
+        Looks several instruments up by identifier.
+
+        Args:
+            instrument_ids: values of FinInstrmGnlAttrbts.Id
+
+        Returns:
+            DataFrame of the stored instruments among instrument_ids, sorted by
+            identifier.
+        """
+        import pandas as pd
+
+        ids = list(dict.fromkeys(instrument_ids))
+        frames = []
+        with self._lock:
+            # SQLite limits the number of parameters of a statement.
+            for start in range(0, len(ids), 900):
+                batch = ids[start : start + 900]
+                frames.append(
+                    pd.read_sql_query(
+                        f"SELECT {self._select} FROM {TABLE} "
+                        f"WHERE {_quote(ID_COLUMN)} IN "
+                        f"({', '.join('?' for _ in batch)}) "
+                        f"ORDER BY {_quote(ID_COLUMN)}",
+                        self._conn,
+                        params=batch,
+                    )
+                )
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        return (
+            pd.concat(frames, ignore_index=True)
+            .sort_values(ID_COLUMN)
+            .reset_index(drop=True)
+        )
+
+    def scan(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        column: str = ID_COLUMN,
+        batch_size: int = SCAN_BATCH_SIZE,
+    ) -> Iterator[Dict[str, str]]:
+        """
+        Iterates over the instruments whose column value is in [start, end), in
+        order of that value.
+
+        Use ID_COLUMN or a column of index_columns, so that the scan reads only
+        the matching range of the index. A prefix scan, e.g. every
+        ClssfctnTp starting with "DB", is the range ["DB", "DC").
+
+        Args:
+            start: first value included, or None to start from the lowest one
+            end: first value excluded, or None to scan up to the highest one
+            column: column the range applies to
+            batch_size: number of rows fetched from the database at a time
+
+        Yields:
+            Mapping of column to value of every matching instrument.
+
+        Raises:
+            ValueError: If column is not a stored column.
+        """
+        if column not in self.columns:
+            raise ValueError(f"Cannot scan unknown column '{column}'.")
+
+        conditions, params = [], []
+        if start is not None:
+            conditions.append(f"{_quote(column)} >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append(f"{_quote(column)} < ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        order = ", ".join(dict.fromkeys([_quote(column), _quote(ID_COLUMN)]))
+
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT {self._select} FROM {TABLE} {where}ORDER BY {order}",
+                params,
+            )
+            rows = cursor.fetchmany(batch_size)
+        while rows:
+            for row in rows:
+                yield dict(zip(self.columns, row))
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+
+    def count(self) -> int:
+        """
+        Returns the number of stored instruments.
+        """
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Closes the connection to the database.
+        """
+        self._conn.close()
+
+    def __enter__(self) -> "InstrumentStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def _quote(identifier: str) -> str:
+    """
+    Quotes a column name for SQLite, as the names contain dots.
+    """
+    return '"' + identifier.replace('"', '""') + '"'
@@ -0,0 +1,280 @@
+import gzip
+import io
+import logging
+import os
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Callable, Deque, Optional, Union
+
+logger = logging.getLogger(__name__)
+BLOCK_SIZE = 1024 * 1024
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+EXTENSIONS = {suffix: compression for compression, suffix in SUFFIXES.items()}
+LEVELS = {"gzip": 6, "zstd": 3}
+
+
+def infer_compression(path: str) -> Optional[str]:
+    """
+    Tells the compression of a file from its extension, e.g. "gzip" for
+    "final.csv.gz", or None for an uncompressed file.
+    """
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def compression_suffix(path: str) -> str:
+    """
+    Returns the compression extension of a path, e.g. ".gz", or "" when the path
+    is not compressed.
+    """
+    compression = infer_compression(path)
+    return SUFFIXES[compression] if compression is not None else ""
+
+
+class ParallelCompressedWriter(io.BufferedIOBase):
+    """
+    Binary file object compressing what is written to it on background threads.
+
+    The data is cut into blocks of block_size bytes, and every block is
+    compressed on its own by a pool of threads, as a gzip member or a zstd
+    frame, while the caller keeps producing the next blocks. The compressed
+    blocks are written in order, and their concatenation is a valid gzip or zstd
+    file that any decoder reads as one stream. zlib and zstd release the GIL
+    while compressing, so the blocks are compressed in parallel.
+    """
+
+    def __init__(
+        self,
+        raw: BinaryIO,
+        compression: str,
+        level: Optional[int] = None,
+        threads: Optional[int] = None,
+        block_size: int = BLOCK_SIZE,
+        close_raw: bool = True,
+    ):
+        """
+        Initiates an instance of the ParallelCompressedWriter class.
+
+        Args:
+            raw: binary file object receiving the compressed data
+            compression: "gzip" or "zstd"
+            level: compression level, defaults to LEVELS of the compression
+            threads: number of compressing threads, defaults to the number of
+                CPUs
+            block_size: number of uncompressed bytes per block
+            close_raw: whether raw is closed along with the writer
+
+        Raises:
+            ValueError: If the compression is unknown or block_size is invalid.
+            ImportError: If zstd is requested and neither zstandard nor pyarrow
+                is installed.
+        """
+        if block_size < 1:
+            raise ValueError(f"block_size must be at least 1, got {block_size}")
+
+        super().__init__()
+        self.compression = compression
+        self.block_size = block_size
+        self.threads = max(threads or os.cpu_count() or 1, 1)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._compress = _compressor(compression, level)
+        self._raw = raw
+        self._close_raw = close_raw
+        self._block = bytearray()
+        self._pending: Deque[Future] = deque()
+        self._blocks = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.threads, thread_name_prefix="deta-compress"
+        )
+        logger.debug(
+            f"ParallelCompressedWriter initialized with compression={compression} "
+            f"and threads={self.threads}"
+        )
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        """
+        Buffers data, handing every complete block to the compressing threads.
+
+        Returns:
+            The number of bytes written.
+        """
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        view = memoryview(data).cast("B")
+        self._block += view
+        self.bytes_in += len(view)
+        if len(self._block) >= self.block_size:
+            blocks = len(self._block) // self.block_size
+            end = blocks * self.block_size
+            for start in range(0, end, self.block_size):
+                self._submit(bytes(self._block[start : start + self.block_size]))
+            del self._block[:end]
+        return len(view)
+
+    def flush(self) -> None:
+        """
+        Writes the blocks compressed so far. The partial block stays buffered, so
+        that flushing often does not shrink the blocks and hurt the ratio.
+        """
+        while self._pending and self._pending[0].done():
+            self._write_block(self._pending.popleft())
+        if not self._raw.closed:
+            self._raw.flush()
+
+    def close(self) -> None:
+        """
+        Compresses the last block, writes every pending block and closes the
+        writer.
+        """
+        if self.closed:
+            return
+        try:
+            if self._block or self._blocks == 0:
+                self._submit(bytes(self._block))
+                self._block.clear()
+            while self._pending:
+                self._write_block(self._pending.popleft())
+            self._raw.flush()
+        finally:
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self._executor.shutdown()
+            if self._close_raw:
+                self._raw.close()
+            super().close()
+        logger.debug(
+            f"Compressed {self.bytes_in} bytes to {self.bytes_out} bytes "
+            f"in {self._blocks} {self.compression} blocks"
+        )
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(self._executor.submit(self._compress, block))
+        self._blocks += 1
+        # Bounds the blocks held in memory when compressing is slower than
+        # producing the data.
+        while len(self._pending) > 2 * self.threads:
+            self._write_block(self._pending.popleft())
+
+    def _write_block(self, future: Future) -> None:
+        compressed = future.result()
+        self._raw.write(compressed)
+        self.bytes_out += len(compressed)
+
+
+def open_compressed(
+    target: Union[str, BinaryIO],
+    mode: str = "rb",
+    compression: Optional[str] = None,
+    level: Optional[int] = None,
+    threads: Optional[int] = None,
+) -> BinaryIO:
+    """
+    Opens a compressed file as a binary file object.
+
+    Args:
+        target: path of the file, or a binary file object to write to, which is
+            left open when the writer is closed
+        mode: "rb" to read the decompressed content, or "wb" to write content
+            compressed on background threads, see ParallelCompressedWriter
+        compression: "gzip", "zstd", or None to infer it from the extension of
+            the path. A path without a compression extension is opened as is.
+        level: compression level when writing
+        threads: number of compressing threads when writing
+
+    Raises:
+        ValueError: If the mode or compression is unknown.
+        ImportError: If zstd is requested and neither zstandard nor pyarrow is
+            installed.
+    """
+    if mode not in {"rb", "wb"}:
+        raise ValueError(f"Unsupported mode: {mode}")
+    if compression is None and isinstance(target, str):
+        compression = infer_compression(target)
+    if compression is not None and compression not in SUFFIXES:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+    if mode == "wb":
+        raw: BinaryIO
+        if isinstance(target, str):
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            raw = open(target, "wb")
+        else:
+            raw = target
+        if compression is None:
+            return raw
+        try:
+            return ParallelCompressedWriter(  # type: ignore[return-value]
+                raw, compression, level, threads, close_raw=isinstance(target, str)
+            )
+        except Exception:
+            if isinstance(target, str):
+                raw.close()
+            raise
+
+    if not isinstance(target, str):
+        raise ValueError("Compressed files are read from a path.")
+    if compression is None:
+        return open(target, "rb")
+    if compression == "gzip":
+        return gzip.open(target, "rb")  # type: ignore[return-value]
+    try:
+        import zstandard  # type: ignore[import-not-found]
+
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(target, "rb"), read_across_frames=True, closefd=True
+        )
+    except ImportError:
+        pass
+    try:
+        import pyarrow as pa
+
+        return pa.CompressedInputStream(pa.OSFile(target), "zstd")
+    except ImportError:
+        raise ImportError("zstd files require the zstandard or pyarrow package.")
+
+
+def _compressor(compression: str, level: Optional[int]) -> Callable[[bytes], bytes]:
+    """
+    Returns a function compressing one block into a complete gzip member or zstd
+    frame. Every call uses its own compression context, so that the function is
+    safe to call from several threads.
+    """
+    if compression not in SUFFIXES:
+        raise ValueError(f"Unsupported compression: {compression}")
+    level = level if level is not None else LEVELS[compression]
+
+    if compression == "gzip":
+
+        def compress_gzip(block: bytes) -> bytes:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            return compressor.compress(block) + compressor.flush()
+
+        return compress_gzip
+
+    try:
+        import zstandard  # type: ignore[import-not-found]
+
+        def compress_zstandard(block: bytes) -> bytes:
+            return zstandard.ZstdCompressor(level=level).compress(block)
+
+        return compress_zstandard
+    except ImportError:
+        pass
+    try:
+        import pyarrow as pa
+    except ImportError:
+        pa = None
+    if pa is not None and pa.Codec.is_available("zstd"):
+
+        def compress_arrow(block: bytes) -> bytes:
+            codec = pa.Codec("zstd", compression_level=level)
+            return codec.compress(block, asbytes=True)
+
+        return compress_arrow
+
+    raise ImportError("zstd output requires the zstandard or pyarrow package.")
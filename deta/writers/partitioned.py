@@ -0,0 +1,236 @@
+import io
+import logging
+import uuid
+from collections import OrderedDict
+from typing import IO, TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from deta.writers.compression import SUFFIXES, open_compressed
+from deta.writers.writers import BATCH_SIZE
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+MAX_OPEN_FILES = 64
+DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+PARTITIONS: List[dict] = [
+    {"name": "currency", "column": "FinInstrmGnlAttrbts.NtnlCcy"},
+    {"name": "cfi_class", "column": "FinInstrmGnlAttrbts.ClssfctnTp", "length": 1},
+]
+
+
+class PartitionedWriter:
+    """
+    Writes rows to a Hive-partitioned CSV dataset, one "name=value/" directory
+    level per partition key, e.g. "currency=EUR/cfi_class=E/part-<id>-00000.csv",
+    so that readers can prune the partitions a query does not need.
+
+    Rows are buffered in batches, and every batch is split by partition and
+    appended to the open file of each partition. At most max_open_files files
+    are kept open: the least recently used one is closed when another partition
+    needs a file, and a partition written again after its file was closed gets a
+    new part file, as object stores cannot append to a file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: List[str],
+        partitions: Optional[List[dict]] = None,
+        batch_size: int = BATCH_SIZE,
+        max_open_files: int = MAX_OPEN_FILES,
+        compression: Optional[str] = None,
+        write_id: Optional[str] = None,
+    ):
+        """
+        Initiates an instance of the PartitionedWriter class.
+
+        Args:
+            path: root directory of the dataset, a local path or an fsspec URL
+                such as "s3://bucket/instruments"
+            columns: names of the columns, in output order
+            partitions: partition keys, outermost first, each a dict with the
+                "name" of the directory level, the "column" its value is read
+                from, and an optional "length" keeping only the first characters
+                of the value. Defaults to PARTITIONS, the currency and the CFI
+                category.
+            batch_size: number of rows buffered before they are written
+            max_open_files: number of part files kept open at the same time
+            compression: compression of the part files, "gzip", "zstd" or None
+            write_id: identifier in the names of the part files, so that several
+                writes to the same dataset never overwrite each other. Defaults to
+                a random one.
+
+        Raises:
+            ValueError: If a partition is invalid or its column is missing.
+        """
+        partitions = partitions if partitions is not None else PARTITIONS
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+        if max_open_files < 1:
+            raise ValueError(f"max_open_files must be at least 1, got {max_open_files}")
+        if compression is not None and compression not in SUFFIXES:
+            raise ValueError(f"Unsupported compression: {compression}")
+        for partition in partitions:
+            if "name" not in partition or "column" not in partition:
+                raise ValueError(f"Invalid partition: {partition}")
+            if partition["column"] not in columns:
+                raise ValueError(f"Partition column not found: {partition['column']}")
+
+        self.path = path
+        self.columns = columns
+        self.partitions = partitions
+        self.batch_size = batch_size
+        self.max_open_files = max_open_files
+        self.compression = compression
+        self.write_id = write_id or uuid.uuid4().hex[:12]
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.files: List[str] = []
+        self.evictions = 0
+        import fsspec
+
+        self.fs, self._root = fsspec.core.url_to_fs(path)
+        self._batch: List[Dict[str, str]] = []
+        self._handles: "OrderedDict[str, Tuple[io.TextIOWrapper, IO[bytes]]]" = (
+            OrderedDict()
+        )
+        self._parts: Dict[str, int] = {}
+        self._closed = False
+        logger.debug(
+            f"PartitionedWriter initialized with path={path}, "
+            f"partitions={[p['name'] for p in partitions]} "
+            f"and max_open_files={max_open_files}"
+        )
+
+    def write(self, row: Dict[str, str]) -> None:
+        """
+        Adds a row to the current batch, writing it once it is full.
+
+        Args:
+            row: mapping of column name to value
+        """
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows to their partitions.
+        """
+        if not self._batch:
+            return
+        import pandas as pd
+
+        batch, self._batch = self._batch, []
+        self.write_frame(pd.DataFrame(batch, columns=self.columns))
+
+    def write_frame(self, df: "pd.DataFrame") -> None:
+        """
+        Writes the rows of a DataFrame to their partitions.
+
+        Args:
+            df: rows with at least the columns of the writer
+        """
+        if self._closed:
+            raise ValueError("I/O operation on closed writer.")
+        if df.empty:
+            return
+
+        keys = [self._partition_values(df, partition) for partition in self.partitions]
+        groups = df.groupby(keys, sort=False, observed=True) if keys else [((), df)]
+        for values, group in groups:
+            values = values if isinstance(values, tuple) else (values,)
+            directory = "/".join(
+                f"{partition['name']}={quote(value, safe=' ')}"
+                for partition, value in zip(self.partitions, values)
+            )
+            group[self.columns].to_csv(self._file(directory), header=False, index=False)
+            self.rows_written += len(group)
+
+    def close(self) -> None:
+        """
+        Writes the remaining rows and closes every part file.
+        """
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            while self._handles:
+                self._close_file(*self._handles.popitem(last=False))
+        logger.info(
+            f"{self.rows_written} rows written to {len(self.files)} files "
+            f"in {len(self._parts)} partitions of {self.path}"
+        )
+
+    def __enter__(self) -> "PartitionedWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @staticmethod
+    def _partition_values(df: "pd.DataFrame", partition: dict) -> "pd.Series":
+        """
+        Returns the partition value of every row, DEFAULT_PARTITION for the rows
+        without one.
+        """
+        values = df[partition["column"]].astype("string").fillna("")
+        if partition.get("length"):
+            values = values.str[: partition["length"]]
+        return values.mask(values == "", DEFAULT_PARTITION).astype(str)
+
+    def _file(self, directory: str) -> io.TextIOWrapper:
+        """
+        Returns the open part file of a partition, opening a new one, and closing
+        the least recently used one if too many are open, when needed.
+        """
+        if directory in self._handles:
+            self._handles.move_to_end(directory)
+            return self._handles[directory][0]
+
+        if len(self._handles) >= self.max_open_files:
+            self._close_file(*self._handles.popitem(last=False))
+            self.evictions += 1
+
+        part = self._parts.get(directory, 0)
+        self._parts[directory] = part + 1
+        extension = SUFFIXES[self.compression] if self.compression else ""
+        file_path = (
+            f"{self._root}/{directory}/part-{self.write_id}-{part:05d}.csv{extension}"
+        )
+        self.fs.makedirs(f"{self._root}/{directory}", exist_ok=True)
+        import pandas as pd
+
+        raw = self.fs.open(file_path, "wb")
+        try:
+            text = io.TextIOWrapper(
+                open_compressed(raw, "wb", compression=self.compression),
+                encoding="utf-8",
+                newline="",
+            )
+            pd.DataFrame(columns=self.columns).to_csv(text, index=False)
+        except Exception:
+            raw.close()
+            raise
+        self._handles[directory] = (text, raw)
+        self.files.append(file_path)
+        return text
+
+    def _close_file(
+        self, directory: str, handle: Tuple[io.TextIOWrapper, IO[bytes]]
+    ) -> None:
+        text, raw = handle
+        try:
+            text.flush()
+            if text.buffer is not raw:
+                # Writes the last compressed blocks, leaving raw open.
+                text.close()
+            self.bytes_written += raw.tell()
+        finally:
+            text.close()
+            raw.close()
+        logger.debug(f"Closed the part file of partition {directory}")
@@ -0,0 +1,302 @@
+import io
+import logging
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Protocol, Union
+from deta.writers.compression import infer_compression, open_compressed
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+BATCH_SIZE = 10_000
+ROW_GROUP_SIZE = 100_000
+
+
+class CSVBatchWriter:
+    """
+    Writes rows to a CSV file in batches, so that at most batch_size rows are held
+    in memory however many rows are written.
+
+    A path ending with ".gz" or ".zst" is compressed while the rows are written,
+    on background threads, see ParallelCompressedWriter.
+
+    Rows are written to "<path>.tmp", which is moved to path once the writer is
+    closed. A writer left by an exception is discarded instead, so a failed
+    conversion never leaves a truncated file at path.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: List[str],
+        batch_size: int = BATCH_SIZE,
+        header: bool = True,
+        compression: Optional[str] = "infer",
+    ):
+        """
+        Initiates an instance of the CSVBatchWriter class and opens the output file.
+
+        Args:
+            path: path of the CSV file to write
+            columns: names of the columns, in output order
+            batch_size: number of rows buffered before they are written to the file
+            header: whether to write the column names as the first line
+            compression: "gzip", "zstd", None to write plain CSV, or "infer" to
+                guess it from the extension of path
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+
+        self.path = path
+        self.columns = columns
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._batch: List[Dict[str, str]] = []
+        self._header_written = not header
+        if compression == "infer":
+            compression = infer_compression(path)
+        self.compression = compression
+        self._tmp_path = f"{path}.tmp"
+        self._file = io.TextIOWrapper(
+            open_compressed(self._tmp_path, "wb", compression=compression),
+            encoding="utf-8",
+            newline="",
+        )
+        logger.debug(
+            f"CSVBatchWriter initialized with path={path}, batch_size={batch_size} "
+            f"and compression={compression}"
+        )
+
+    def write(self, row: Dict[str, str]) -> None:
+        """
+        Adds a row to the current batch, flushing it once it is full.
+
+        Args:
+            row: mapping of column name to value
+        """
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows to the file.
+        """
+        if not self._batch and self._header_written:
+            return
+
+        import pandas as pd
+
+        df = pd.DataFrame(self._batch, columns=self.columns)
+        df.to_csv(self._file, header=not self._header_written, index=False)
+        self._header_written = True
+        self.rows_written += len(self._batch)
+        self._batch = []
+
+    def close(self) -> None:
+        """
+        Flushes the remaining rows, closes the file and moves it to path.
+        """
+        if self._file.closed:
+            return
+        try:
+            self.flush()
+            self._file.close()
+        except BaseException:
+            self.discard()
+            raise
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self) -> None:
+        """
+        Closes the file without writing the remaining rows, and deletes it.
+        """
+        try:
+            self._file.close()
+        finally:
+            _remove(self._tmp_path)
+
+    def __enter__(self) -> "CSVBatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class ParquetBatchWriter:
+    """
+    Writes rows to a Parquet file, one row group per batch of row_group_size rows,
+    so that the file is built while rows are still being produced.
+
+    As with CSVBatchWriter, the file is written to "<path>.tmp" and only moved to
+    path once the writer is closed without an exception.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: List[str],
+        row_group_size: int = ROW_GROUP_SIZE,
+        compression: str = "snappy",
+        types: Optional[Dict[str, "pa.DataType"]] = None,
+        dictionary_columns: Optional[List[str]] = None,
+    ):
+        """
+        Initiates an instance of the ParquetBatchWriter class and opens the output
+        file.
+
+        Args:
+            path: path of the Parquet file to write
+            columns: names of the columns, in output order
+            row_group_size: number of rows buffered before they are written as a
+                row group
+            compression: codec used for the column chunks, e.g. "snappy", "zstd",
+                "gzip" or "none"
+            types: pyarrow type of each column, defaults to pa.string()
+            dictionary_columns: columns stored with dictionary encoding, defaults
+                to every column
+
+        Raises:
+            ImportError: If pyarrow is not installed.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:  # pragma: no cover - depends on the environment
+            raise ImportError("Parquet output requires the pyarrow package.")
+        if row_group_size < 1:
+            raise ValueError(f"row_group_size must be at least 1, got {row_group_size}")
+
+        types = types or {}
+        self.path = path
+        self.columns = columns
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self.schema = pa.schema(
+            [pa.field(column, types.get(column, pa.string())) for column in columns]
+        )
+        self._batch: List[Dict[str, str]] = []
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._tmp_path = f"{path}.tmp"
+        self._writer = pq.ParquetWriter(
+            self._tmp_path,
+            self.schema,
+            compression=compression,
+            use_dictionary=(
+                dictionary_columns if dictionary_columns is not None else True
+            ),
+        )
+        logger.debug(
+            f"ParquetBatchWriter initialized with path={path}, "
+            f"row_group_size={row_group_size} and compression={compression}"
+        )
+
+    def write(self, row: Dict[str, str]) -> None:
+        """
+        Adds a row to the current row group, writing it once it is full.
+
+        Args:
+            row: mapping of column name to value
+        """
+        self._batch.append(row)
+        if len(self._batch) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows as a row group.
+        """
+        if not self._batch:
+            return
+
+        import pyarrow as pa
+
+        table = pa.Table.from_pylist(self._batch, schema=self.schema)
+        self._writer.write_table(table)
+        self.rows_written += len(self._batch)
+        self._batch = []
+
+    def close(self) -> None:
+        """
+        Writes the remaining rows and the file footer, and moves the file to path.
+        """
+        if self._writer is None:
+            return
+        try:
+            self.flush()
+            self._writer.close()
+        except BaseException:
+            self.discard()
+            raise
+        self._writer = None
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self) -> None:
+        """
+        Closes the file without writing the remaining rows, and deletes it.
+        """
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+        finally:
+            self._writer = None
+            _remove(self._tmp_path)
+
+    def __enter__(self) -> "ParquetBatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+RecordWriter = Union[CSVBatchWriter, ParquetBatchWriter]
+
+
+class RowWriter(Protocol):
+    """
+    Anything the rows of a conversion can be handed to one at a time, e.g. a
+    RecordWriter or a PartitionedWriter.
+    """
+
+    def write(self, row: Dict[str, Any]) -> None: ...
+
+
+def arrow_types(types: Dict[str, str]) -> Dict[str, "pa.DataType"]:
+    """
+    Maps the column types of a FieldExtractor to pyarrow types.
+
+    Args:
+        types: mapping of column name to "str", "int", "float", "bool" or "date"
+
+    Returns:
+        Mapping of column name to pyarrow type, empty if pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:  # pragma: no cover - depends on the environment
+        return {}
+    arrow = {
+        "str": pa.string(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+        "date": pa.date32(),
+    }
+    return {column: arrow[field_type] for column, field_type in types.items()}
+
+
+def _remove(path: str) -> None:
+    """
+    Deletes a file, if it exists.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
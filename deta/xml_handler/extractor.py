@@ -0,0 +1,295 @@
+import logging
+import sys
+import xml.etree.ElementTree as ET
+from datetime import date
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # pragma: no cover - depends on the environment
+    lxml_etree = None
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("auto", "lxml", "stdlib")
+PARSE_ERRORS: tuple = (ET.ParseError,)
+if lxml_etree is not None:
+    PARSE_ERRORS += (lxml_etree.XMLSyntaxError,)
+
+NAMESPACES = {
+    "h": "urn:iso:std:iso:20022:tech:xsd:head.003.001.01",
+    "a": "urn:iso:std:iso:20022:tech:xsd:auth.036.001.02",
+}
+
+COLUMNS = [
+    "FinInstrmGnlAttrbts.Id",
+    "FinInstrmGnlAttrbts.FullNm",
+    "FinInstrmGnlAttrbts.ClssfctnTp",
+    "FinInstrmGnlAttrbts.CmmdtyDerivInd",
+    "FinInstrmGnlAttrbts.NtnlCcy",
+    "Issr",
+]
+
+LOW_CARDINALITY_COLUMNS = [
+    "FinInstrmGnlAttrbts.ClssfctnTp",
+    "FinInstrmGnlAttrbts.CmmdtyDerivInd",
+    "FinInstrmGnlAttrbts.NtnlCcy",
+    "Issr",
+]
+
+
+FIELD_TYPES = ("str", "int", "float", "bool", "date")
+DEFAULT_SCHEMA: Dict[str, Union[str, dict]] = {
+    column: column.replace(".", "/") for column in COLUMNS
+}
+
+Schema = Dict[str, Union[str, dict]]
+
+RECORD_TYPE_COLUMN = "RcrdTp"
+RECORD_TYPES = ("NewRcrd", "ModfdRcrd", "TermntdRcrd", "CancRcrd")
+# Schema field taking the type of the record of a FinInstrm, the local name of
+# its child element, one of RECORD_TYPES.
+RECORD_TYPE_FIELD: Dict[str, Any] = {"record_type": True}
+DELTA_SCHEMA: Schema = {**DEFAULT_SCHEMA, RECORD_TYPE_COLUMN: RECORD_TYPE_FIELD}
+
+
+class FieldExtractor:
+    """
+    Builds rows out of FinInstrm elements in a single pass over their descendants.
+
+    The schema maps every output column to the path of an element below the
+    FinInstrm, e.g. "FinInstrmGnlAttrbts/Id", searched at any depth as
+    Element.find(".//FinInstrmGnlAttrbts/Id") would. It is compiled once into a
+    tree of fully qualified tags, so no path or namespace resolution happens per
+    record, and only the text of the requested elements is read. Each column takes
+    the text of the first matching element.
+
+    The values of the string columns of LOW_CARDINALITY_COLUMNS are interned, so
+    that the rows buffered by the writers share one string per distinct value.
+    """
+
+    def __init__(
+        self, namespace: str = NAMESPACES["a"], schema: Optional[Schema] = None
+    ):
+        """
+        Initiates an instance of the FieldExtractor class.
+
+        Args:
+            namespace: namespace of the FinInstrm elements
+            schema: mapping of column name to either an element path, or a dict
+                with the "path" and the "type" of the column, one of FIELD_TYPES,
+                or RECORD_TYPE_FIELD for the type of the record, e.g. "CancRcrd".
+                Columns are output in the order of the schema. Defaults to
+                DEFAULT_SCHEMA, i.e. COLUMNS as strings.
+
+        Raises:
+            ValueError: If a path is empty or a type is not one of FIELD_TYPES.
+        """
+        schema = DEFAULT_SCHEMA if schema is None else schema
+        self.columns: List[str] = list(schema)
+        self.types: Dict[str, str] = {}
+        self._roots: Dict[str, tuple] = {}
+        self._casts: Dict[str, Callable[[str], Any]] = {}
+        self._record_type_columns: List[str] = []
+
+        ns = f"{{{namespace}}}"
+        for column, field in schema.items():
+            if isinstance(field, dict) and field.get("record_type"):
+                self.types[column] = "str"
+                self._record_type_columns.append(column)
+                continue
+            path, field_type = (
+                (field, "str")
+                if isinstance(field, str)
+                else (field.get("path"), field.get("type", "str"))
+            )
+            steps = (path or "").strip("/").split("/")
+            if not path or not all(steps):
+                raise ValueError(f"Invalid path for column '{column}': {path!r}")
+            if field_type not in FIELD_TYPES:
+                raise ValueError(
+                    f"Unsupported type for column '{column}': {field_type}"
+                )
+
+            self.types[column] = field_type
+            if field_type != "str":
+                self._casts[column] = _CASTS[field_type]
+
+            nodes = self._roots
+            for i, step in enumerate(steps):
+                tag = step if step.startswith("{") else f"{ns}{step}"
+                columns, children = nodes.setdefault(tag, ([], {}))
+                if i == len(steps) - 1:
+                    columns.append(column)
+                nodes = children
+
+        self._interned = [
+            column
+            for column in LOW_CARDINALITY_COLUMNS
+            if self.types.get(column) == "str"
+        ]
+
+    def extract(self, elem) -> Dict[str, Any]:
+        """
+        Extracts the row of a FinInstrm element.
+
+        Args:
+            elem: FinInstrm element, from xml.etree or lxml
+
+        Returns:
+            Mapping of every column to its value. A missing string column is "",
+            and a missing typed column is None.
+
+        Raises:
+            ValueError: If the text of a typed column cannot be cast.
+        """
+        row: Dict[str, str] = {}
+        roots = self._roots
+        n_columns = len(self.columns) - len(self._record_type_columns)
+
+        for node in elem.iter():
+            entry = roots.get(node.tag)
+            if entry is not None:
+                _collect(node, entry, row)
+                if len(row) == n_columns:
+                    break
+
+        values: Dict[str, Any] = {
+            column: row.get(column, "") for column in self.columns
+        }
+        if self._record_type_columns:
+            record_type = _record_type(elem)
+            for column in self._record_type_columns:
+                values[column] = record_type
+        for column in self._interned:
+            values[column] = sys.intern(values[column])
+        for column, cast in self._casts.items():
+            text = row.get(column)
+            try:
+                values[column] = cast(text.strip()) if text else None
+            except ValueError:
+                raise ValueError(
+                    f"Cannot convert {text!r} to {self.types[column]} "
+                    f"for column '{column}'"
+                )
+        return values
+
+
+def _collect(node, entry: tuple, row: Dict[str, str]) -> None:
+    """
+    Stores the text of node and of its matching descendants in row, unless their
+    columns already have a value.
+    """
+    columns, children = entry
+    for column in columns:
+        if column not in row:
+            row[column] = node.text or ""
+    if children:
+        for child in node:
+            sub_entry = children.get(child.tag)
+            if sub_entry is not None:
+                _collect(child, sub_entry, row)
+
+
+def _record_type(elem) -> str:
+    """
+    Returns the local name of the record element of a FinInstrm, e.g.
+    "ModfdRcrd", or "" if it has none.
+    """
+    for child in elem:
+        # lxml gives comments and processing instructions a non-string tag.
+        if isinstance(child.tag, str):
+            return sys.intern(child.tag.rpartition("}")[2])
+    return ""
+
+
+def _to_bool(text: str) -> bool:
+    lowered = text.lower()
+    if lowered in ("true", "1"):
+        return True
+    if lowered in ("false", "0"):
+        return False
+    raise ValueError(f"Invalid boolean: {text!r}")
+
+
+_CASTS: Dict[str, Callable[[str], Any]] = {
+    "int": int,
+    "float": float,
+    "bool": _to_bool,
+    "date": lambda text: date.fromisoformat(text[:10]),
+}
+
+
+def resolve_backend(backend: str = "auto") -> str:
+    """
+    Picks the XML parser to use.
+
+    Args:
+        backend: "lxml", "stdlib", or "auto" to use lxml when it is installed
+
+    Returns:
+        "lxml" or "stdlib".
+
+    Raises:
+        ValueError: If backend is not one of BACKENDS.
+        ImportError: If "lxml" is requested and is not installed.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported XML backend: {backend}")
+    if backend == "lxml" and lxml_etree is None:
+        raise ImportError("The lxml backend requires the lxml package.")
+    if backend == "auto":
+        return "lxml" if lxml_etree is not None else "stdlib"
+    return backend
+
+
+def iter_fin_instrm(source, backend: str = "auto") -> Iterator:
+    """
+    Streams the FinInstrm elements of an XML document.
+
+    Each element is cleared and detached from its parent once the caller moves
+    on to the next one, so the parsed tree does not grow with the document.
+
+    Args:
+        source: path to the XML file, or a binary file object with its content
+        backend: XML parser to use, see resolve_backend
+
+    Yields:
+        FinInstrm elements, in document order.
+    """
+    if resolve_backend(backend) == "lxml":
+        yield from _iter_fin_instrm_lxml(source)
+    else:
+        yield from _iter_fin_instrm_stdlib(source)
+
+
+def _iter_fin_instrm_stdlib(source) -> Iterator:
+    parents: list = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+
+        parents.pop()
+        if elem.tag.endswith("FinInstrm"):
+            try:
+                yield elem
+            finally:
+                elem.clear()
+                if parents:
+                    parents[-1].remove(elem)
+
+
+def _iter_fin_instrm_lxml(source) -> Iterator:
+    assert lxml_etree is not None
+    for _, elem in lxml_etree.iterparse(
+        source, events=("end",), tag="{*}FinInstrm", huge_tree=True
+    ):
+        try:
+            yield elem
+        finally:
+            elem.clear()
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
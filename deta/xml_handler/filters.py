@@ -0,0 +1,95 @@
+import logging
+from typing import Callable, List, Optional
+
+from deta.xml_handler.extractor import NAMESPACES, FieldExtractor, Schema
+
+logger = logging.getLogger(__name__)
+
+FILTER_OPERATIONS = ("eq", "in", "startswith")
+
+
+class RecordFilter:
+    """
+    Decides whether a FinInstrm element is kept, before its row is built.
+
+    Filters are dicts with the keys:
+        path: path of the element tested, as in a FieldExtractor schema
+        op: one of
+            "eq": the text of the element equals "value"
+            "in": the text of the element is one of "values"
+            "startswith": the text of the element starts with "value", or with one
+                of "values"
+    A missing element never matches, and an element is kept only when every
+    filter matches. Only the elements named by the filters are read.
+    """
+
+    def __init__(self, filters: List[dict], namespace: str = NAMESPACES["a"]):
+        """
+        Initiates an instance of the RecordFilter class.
+
+        Args:
+            filters: filters to apply, see the class docstring
+            namespace: namespace of the FinInstrm elements
+
+        Raises:
+            ValueError: If a filter is malformed.
+        """
+        self.filters = filters
+        self._predicates: List[Callable[[Optional[str]], bool]] = []
+        schema: Schema = {}
+
+        for i, spec in enumerate(filters):
+            op = spec.get("op")
+            path = spec.get("path")
+            if op not in FILTER_OPERATIONS or not path:
+                raise ValueError(f"Invalid filter: {spec}")
+            schema[str(i)] = path
+            self._predicates.append(_predicate(spec))
+
+        self._extractor = FieldExtractor(namespace, schema=schema)
+        self._keys = list(schema)
+
+    def matches(self, elem) -> bool:
+        """
+        Tests a FinInstrm element against every filter.
+
+        Args:
+            elem: FinInstrm element, from xml.etree or lxml
+
+        Returns:
+            True if the element matches all the filters.
+        """
+        values = self._extractor.extract(elem)
+        return all(
+            predicate(values[key])
+            for key, predicate in zip(self._keys, self._predicates)
+        )
+
+
+def _predicate(spec: dict) -> Callable[[Optional[str]], bool]:
+    """
+    Builds the function testing the text of an element against a filter.
+
+    Raises:
+        ValueError: If the filter has no value to compare with.
+    """
+    op = spec["op"]
+    if op == "eq":
+        if "value" not in spec:
+            raise ValueError(f"Invalid filter: {spec}")
+        value = spec["value"]
+        return lambda text: bool(text) and text == value
+
+    values = spec.get("values", [spec["value"]] if "value" in spec else None)
+    if not values or isinstance(values, str):
+        raise ValueError(f"Invalid filter: {spec}")
+    if op == "in":
+        allowed = frozenset(values)
+        return lambda text: bool(text) and text in allowed
+
+    prefixes = tuple(values)
+
+    def starts_with(text: Optional[str]) -> bool:
+        return text is not None and text != "" and text.startswith(prefixes)
+
+    return starts_with
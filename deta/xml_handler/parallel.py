@@ -0,0 +1,170 @@
+import os
+import re
+from typing import Dict, List, Tuple
+
+FIN_INSTRM_OPEN = re.compile(rb"<(?:[\w.-]+:)?FinInstrm[\s>]")
+FIN_INSTRM_CLOSE = re.compile(rb"</(?:[\w.-]+:)?FinInstrm\s*>")
+XMLNS = re.compile(rb"""xmlns(?::([\w.-]+))?\s*=\s*["']([^"']*)["']""")
+SCAN_SIZE = 64 * 1024
+
+
+def split_fin_instrm_ranges(
+    path: str, n_chunks: int
+) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """
+    Splits an XML file into byte ranges holding whole FinInstrm elements.
+
+    The FinInstrm elements of a FIRDS report are consecutive siblings, so the
+    region between the first opening tag and the last closing tag can be cut at
+    any opening tag. Each range is then parsed as its own document once wrapped
+    with wrap_chunk.
+
+    Args:
+        path: path to the XML file
+        n_chunks: number of ranges to aim for
+
+    Returns:
+        A tuple with the document header, i.e. every byte before the first
+        FinInstrm, and the list of (start, end) byte ranges in document order.
+        The list is empty if the file has no FinInstrm element.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        first = _find_forward(f, FIN_INSTRM_OPEN, 0, file_size)
+        if first is None:
+            return b"", []
+        last = _find_last_close(f, file_size)
+        if last is None or last <= first:
+            return b"", []
+
+        f.seek(0)
+        header = f.read(first)
+
+        boundaries = [first]
+        step = (last - first) / max(n_chunks, 1)
+        for i in range(1, n_chunks):
+            position = _find_forward(
+                f, FIN_INSTRM_OPEN, max(int(first + i * step), boundaries[-1] + 1), last
+            )
+            if position is None:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+        boundaries.append(last)
+
+    return header, list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def wrap_chunk(header: bytes) -> Tuple[bytes, bytes]:
+    """
+    Builds the bytes placed around a range so that it parses as a document.
+
+    The wrapper element redeclares the namespaces found in the header. When a
+    prefix is declared more than once, the last declaration wins, which is the
+    one in scope of the FinInstrm elements in FIRDS reports.
+
+    Args:
+        header: bytes of the document before the first FinInstrm
+
+    Returns:
+        A tuple with the prefix and the suffix to place around the range.
+    """
+    namespaces: Dict[bytes, bytes] = {}
+    for prefix, uri in XMLNS.findall(header):
+        namespaces[prefix] = uri
+
+    declarations = b"".join(
+        b' xmlns%s="%s"' % (b":" + prefix if prefix else b"", uri)
+        for prefix, uri in namespaces.items()
+    )
+    return b'<?xml version="1.0" encoding="UTF-8"?><Chunk%s>' % declarations, (
+        b"</Chunk>"
+    )
+
+
+class ByteRangeStream:
+    """
+    Read-only binary stream over prefix + file[start:end] + suffix, read lazily so
+    that a range can be parsed without loading it into memory.
+    """
+
+    def __init__(self, path: str, start: int, end: int, prefix: bytes, suffix: bytes):
+        """
+        Initiates an instance of the ByteRangeStream class and opens the file.
+
+        Args:
+            path: path to the file
+            start: first byte of the range
+            end: byte after the last one of the range
+            prefix: bytes returned before the range
+            suffix: bytes returned after the range
+        """
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+        self._prefix = prefix
+        self._suffix = suffix
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = len(self._prefix) + self._remaining + len(self._suffix)
+
+        if self._prefix:
+            data, self._prefix = self._prefix[:size], self._prefix[size:]
+            return data
+        if self._remaining:
+            data = self._file.read(min(size, self._remaining))
+            self._remaining -= len(data)
+            if not data:
+                self._remaining = 0
+            return data
+        data, self._suffix = self._suffix[:size], self._suffix[size:]
+        return data
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "ByteRangeStream":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def _find_forward(f, pattern: re.Pattern, start: int, end: int):
+    """
+    Returns the offset of the first match of pattern in f[start:end], or None.
+    """
+    overlap = 64
+    position = start
+    while position < end:
+        f.seek(position)
+        block = f.read(min(SCAN_SIZE, end - position))
+        if not block:
+            return None
+        match = pattern.search(block)
+        if match:
+            return position + match.start()
+        if position + len(block) >= end:
+            return None
+        position += max(len(block) - overlap, 1)
+    return None
+
+
+def _find_last_close(f, file_size: int):
+    """
+    Returns the offset right after the last FinInstrm closing tag, or None.
+    """
+    overlap = 64
+    end = file_size
+    while end > 0:
+        start = max(0, end - SCAN_SIZE)
+        f.seek(start)
+        block = f.read(end - start)
+        matches = list(FIN_INSTRM_CLOSE.finditer(block))
+        if matches:
+            return start + matches[-1].end()
+        if start == 0:
+            return None
+        end = start + overlap
+    return None
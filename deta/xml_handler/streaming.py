@@ -0,0 +1,404 @@
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from deta.downloader.downloader import CHUNK_SIZE, Downloader
+from deta.metrics.metrics import Metrics
+from deta.writers.writers import BATCH_SIZE, CSVBatchWriter, RecordWriter
+from deta.xml_handler.extractor import FieldExtractor, Schema, resolve_backend
+from deta.xml_handler.filters import RecordFilter
+from deta.xml_handler.xml_handler import parquet_writer, stream_records
+from deta.xml_handler.zipstream import iter_zip_member
+
+logger = logging.getLogger(__name__)
+QUEUE_SIZE = 8
+ROWS_PER_ITEM = 1_000
+POLL_INTERVAL = 0.1
+# Put in a BoundedChannel after the last item of the stream.
+END: object = object()
+
+
+class StreamCancelled(Exception):
+    """
+    Raised in a stage of a StreamingConverter when another stage failed.
+    """
+
+
+class BoundedChannel:
+    """
+    Bounded queue connecting two stages of a StreamingConverter.
+
+    put blocks while the queue is full, so a fast producer waits for its
+    consumer instead of buffering the whole stream in memory. Both ends give up
+    with StreamCancelled once the run is cancelled, so that a failing stage never
+    leaves the others blocked.
+    """
+
+    def __init__(self, maxsize: int, cancelled: threading.Event):
+        """
+        Initiates an instance of the BoundedChannel class.
+
+        Args:
+            maxsize: number of items the queue holds before put blocks
+            cancelled: event set when a stage of the run failed
+        """
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._cancelled = cancelled
+        self.put_seconds = 0.0
+        self.get_seconds = 0.0
+
+    def put(self, item: object) -> None:
+        start = time.perf_counter()
+        while True:
+            if self._cancelled.is_set():
+                raise StreamCancelled()
+            try:
+                self._queue.put(item, timeout=POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        self.put_seconds += time.perf_counter() - start
+
+    def get(self):
+        start = time.perf_counter()
+        while True:
+            if self._cancelled.is_set():
+                raise StreamCancelled()
+            try:
+                item = self._queue.get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                continue
+        self.get_seconds += time.perf_counter() - start
+        return item
+
+    def close(self) -> None:
+        """
+        Tells the consumer that no more items will be put.
+        """
+        self.put(END)
+
+    def __iter__(self) -> Iterator:
+        while True:
+            item = self.get()
+            if item is END:
+                return
+            yield item
+
+
+class ChannelReader(io.RawIOBase):
+    """
+    Binary file object reading the chunks of bytes put in a BoundedChannel, so
+    that the XML parsers can consume them as a file.
+    """
+
+    def __init__(self, channel: BoundedChannel):
+        self._channel = channel
+        self._chunk = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk:
+            if self._eof:
+                return 0
+            item = self._channel.get()
+            if item is END:
+                self._eof = True
+                return 0
+            self._chunk = memoryview(item)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def drain(self) -> None:
+        """
+        Consumes the chunks left in the channel, up to the end of the stream.
+        """
+        self._chunk = memoryview(b"")
+        while not self._eof:
+            self._eof = self._channel.get() is END
+
+
+class ChannelWriter:
+    """
+    Record writer handing rows to a BoundedChannel, ROWS_PER_ITEM at a time.
+    """
+
+    def __init__(self, channel: BoundedChannel):
+        self._channel = channel
+        self._rows: List[Dict[str, str]] = []
+
+    def write(self, row: Dict[str, str]) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= ROWS_PER_ITEM:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._rows:
+            self._channel.put(self._rows)
+            self._rows = []
+
+
+class StreamingConverter:
+    """
+    Converts a zipped FIRDS file to CSV or Parquet while it is being downloaded.
+
+    The download, the decompression of the ZIP member, the parsing of the
+    FinInstrm records and the writing of the output run on their own threads,
+    connected by bounded queues. Each stage works on a chunk while the next one
+    processes the previous chunk, so a conversion takes about as long as its
+    slowest stage instead of the sum of all of them, and backpressure caps the
+    memory held between the stages whatever the size of the file.
+
+    The output is only moved to its path once every stage has finished without
+    an error, see CSVBatchWriter.
+    """
+
+    def __init__(
+        self,
+        downloader: Optional[Downloader] = None,
+        backend: str = "auto",
+        schema: Optional[Schema] = None,
+        filters: Optional[List[dict]] = None,
+        queue_size: int = QUEUE_SIZE,
+        metrics: Optional[Metrics] = None,
+    ):
+        """
+        Initiates an instance of the StreamingConverter class.
+
+        Args:
+            downloader: downloader streaming the ZIP files, a default one is
+                created if not given
+            backend: parser used to stream FinInstrm nodes, see XMLHandler
+            schema: columns to extract from every FinInstrm node, see XMLHandler
+            filters: filters a FinInstrm node must match, see XMLHandler
+            queue_size: number of items each queue holds before its producer
+                waits. A queue item is a chunk of chunk_size bytes between the
+                first stages and ROWS_PER_ITEM rows before the writer.
+            metrics: registry recording the "download", "inflate", "parse" and
+                "write" stages, a private one is created if not given
+
+        Raises:
+            ValueError: If the schema or a filter is invalid.
+        """
+        if queue_size < 1:
+            raise ValueError(f"queue_size must be at least 1, got {queue_size}")
+
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.downloader = (
+            downloader if downloader is not None else Downloader(metrics=self.metrics)
+        )
+        self.backend = resolve_backend(backend)
+        self.extractor = FieldExtractor(schema=schema)
+        self.columns = self.extractor.columns
+        self.record_filter = RecordFilter(filters) if filters else None
+        self.stats: Dict[str, int] = {"scanned": 0, "kept": 0}
+        self.queue_size = queue_size
+        logger.debug(f"StreamingConverter initialized with queue_size={queue_size}")
+
+    def convert_url(
+        self,
+        url: str,
+        output_path: str,
+        zip_path: Optional[str] = None,
+        member: Optional[str] = None,
+        output_format: str = "csv",
+        batch_size: int = BATCH_SIZE,
+    ) -> str:
+        """
+        Downloads a ZIP file and converts its XML member at the same time.
+
+        Args:
+            url: url of the ZIP file
+            output_path: path of the output file
+            zip_path: path to also store the downloaded ZIP file at, or None to
+                only keep the converted output
+            member: name of the XML file inside the archive, defaults to the first
+                XML file
+            output_format: "csv" or "parquet"
+            batch_size: number of rows held by the writer before they are written
+
+        Returns:
+            Path to the written file.
+
+        Raises:
+            requests.RequestException: If the download failed.
+            ValueError: If the member is not found inside the ZIP.
+            zipfile.BadZipFile: If the ZIP file is corrupted.
+        """
+        logger.info(f"Streaming conversion of {url} to {output_path}")
+        return self._run(
+            "download",
+            lambda: self.downloader.stream(url),
+            output_path,
+            zip_path,
+            member,
+            output_format,
+            batch_size,
+        )
+
+    def convert_zip(
+        self,
+        zip_path: str,
+        output_path: str,
+        member: Optional[str] = None,
+        output_format: str = "csv",
+        batch_size: int = BATCH_SIZE,
+    ) -> str:
+        """
+        Converts the XML member of a local ZIP file, with the read, decompression,
+        parsing and writing of the output overlapped, see convert_url.
+
+        Raises:
+            FileNotFoundError: If zip_path does not exist.
+        """
+        if not os.path.exists(zip_path):
+            raise FileNotFoundError(f"ZIP file not found: {zip_path}")
+        logger.info(f"Streaming conversion of {zip_path} to {output_path}")
+        return self._run(
+            "read",
+            lambda: _read_chunks(zip_path),
+            output_path,
+            None,
+            member,
+            output_format,
+            batch_size,
+        )
+
+    def _run(
+        self,
+        source_stage: str,
+        source: Callable[[], Iterable[bytes]],
+        output_path: str,
+        zip_path: Optional[str],
+        member: Optional[str],
+        output_format: str,
+        batch_size: int,
+    ) -> str:
+        """
+        Runs the stages on one thread each and waits for all of them.
+
+        The first error raised by a stage cancels the others and is raised again
+        once every thread has stopped.
+        """
+        if output_format not in ("csv", "parquet"):
+            raise ValueError(f"Unsupported output format: {output_format}")
+
+        cancelled = threading.Event()
+        raw = BoundedChannel(self.queue_size, cancelled)
+        xml = BoundedChannel(self.queue_size, cancelled)
+        rows = BoundedChannel(self.queue_size, cancelled)
+
+        def fetch() -> None:
+            with self.metrics.stage(source_stage) as stage:
+                part_path = f"{zip_path}.part" if zip_path else None
+                if part_path:
+                    os.makedirs(os.path.dirname(part_path) or ".", exist_ok=True)
+                with open(part_path, "wb") if part_path else nullcontext() as f:
+                    for chunk in source():
+                        if f is not None:
+                            f.write(chunk)
+                        raw.put(chunk)
+                raw.close()
+                if part_path is not None and zip_path is not None:
+                    os.replace(part_path, zip_path)
+                stage.add("wait_seconds", raw.put_seconds)
+
+        def inflate() -> None:
+            with self.metrics.stage("inflate") as stage:
+                for data in iter_zip_member(raw, member):
+                    stage.add("bytes_out", len(data))
+                    xml.put(data)
+                xml.close()
+                stage.add("wait_seconds", raw.get_seconds + xml.put_seconds)
+
+        def parse() -> None:
+            with self.metrics.stage("parse") as stage:
+                reader = ChannelReader(xml)
+                writer = ChannelWriter(rows)
+                scanned, kept = stream_records(
+                    reader, writer, self.backend, self.extractor, self.record_filter
+                )
+                writer.flush()
+                rows.close()
+                reader.drain()
+                self.stats = {"scanned": scanned, "kept": kept}
+                stage.add("records_scanned", scanned)
+                stage.add("rows", kept)
+                stage.add("wait_seconds", xml.get_seconds + rows.put_seconds)
+
+        def write() -> None:
+            with self.metrics.stage("write") as stage:
+                writer = self._writer(output_path, output_format, batch_size)
+                with writer:
+                    for batch in rows:
+                        for row in batch:
+                            writer.write(row)
+                    # The other stages can still fail after the last row, e.g.
+                    # on the checksum of the ZIP member, so the output is only
+                    # committed once they all succeeded.
+                    for thread in upstream:
+                        thread.join()
+                    if cancelled.is_set():
+                        raise StreamCancelled()
+                stage.add("rows", writer.rows_written)
+                stage.add("bytes_out", os.path.getsize(output_path))
+                stage.add("wait_seconds", rows.get_seconds)
+
+        errors: List[BaseException] = []
+
+        def run_stage(func: Callable[[], None]) -> None:
+            try:
+                func()
+            except StreamCancelled:
+                pass
+            except BaseException as e:
+                errors.append(e)
+                cancelled.set()
+
+        upstream: List[threading.Thread] = []
+        threads = [
+            threading.Thread(target=run_stage, args=(func,), name=f"deta-{name}")
+            for name, func in (
+                (source_stage, fetch),
+                ("inflate", inflate),
+                ("parse", parse),
+                ("write", write),
+            )
+        ]
+        upstream.extend(threads[:-1])
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            logger.error(f"Streaming conversion failed: {errors[0]}")
+            raise errors[0]
+        logger.info(
+            f"{output_path} written with {self.stats['kept']} rows "
+            f"({self.stats['kept']} of {self.stats['scanned']} "
+            "FinInstrm kept)"
+        )
+        return output_path
+
+    def _writer(
+        self, output_path: str, output_format: str, batch_size: int
+    ) -> RecordWriter:
+        if output_format == "parquet":
+            return parquet_writer(output_path, self.extractor, batch_size)
+        return CSVBatchWriter(output_path, self.columns, batch_size)
+
+
+def _read_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        yield from iter(lambda: f.read(chunk_size), b"")
@@ -1,10 +1,42 @@
+import io
 import logging
 import xml.etree.ElementTree as ET
 import zipfile
 import os
-import pandas as pd
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+from deta.metrics.metrics import Metrics, Stage
+from deta.writers.writers import (
+    BATCH_SIZE,
+    ROW_GROUP_SIZE,
+    CSVBatchWriter,
+    ParquetBatchWriter,
+    RecordWriter,
+    RowWriter,
+    arrow_types,
+)
+from deta.writers.compression import compression_suffix
+from deta.writers.partitioned import MAX_OPEN_FILES, PartitionedWriter
+from deta.xml_handler.extractor import (
+    LOW_CARDINALITY_COLUMNS,
+    PARSE_ERRORS,
+    FieldExtractor,
+    Schema,
+    iter_fin_instrm,
+    resolve_backend,
+)
+from deta.xml_handler.filters import RecordFilter
+from deta.xml_handler.parallel import (
+    ByteRangeStream,
+    split_fin_instrm_ranges,
+    wrap_chunk,
+)
 
 logger = logging.getLogger(__name__)
+CHUNKS_PER_WORKER = 4
 
 
 class XMLHandler:
@@ -12,15 +44,46 @@ class XMLHandler:
     Handles XML file parsing and needed management.
     """
 
-    def __init__(self, file_path: str):
+    def __init__(
+        self,
+        file_path: str,
+        backend: str = "auto",
+        schema: Optional[Schema] = None,
+        filters: Optional[List[dict]] = None,
+        metrics: Optional[Metrics] = None,
+    ):
         """
         Initiates an instance of the XMLHandler class.
 
         Args:
             file_path: path to the XML file to be handled
+            backend: parser used to stream FinInstrm nodes, "lxml", "stdlib", or
+                "auto" to use lxml when it is installed
+            schema: columns to extract from every FinInstrm node, mapped to their
+                element path and optional type, see FieldExtractor. Defaults to
+                COLUMNS.
+            filters: filters a FinInstrm node must match to be converted, see
+                RecordFilter. Non-matching nodes are skipped before their row is
+                built.
+            metrics: registry recording the "extract" and "parse" stages, a
+                private one is created if not given
+
+        Raises:
+            ValueError: If the schema or a filter is invalid.
         """
         self.file_path = file_path
-        logger.debug(f"XMLHandler initialized with file_path={file_path}")
+        self.backend = resolve_backend(backend)
+        self.schema = schema
+        self.extractor = FieldExtractor(schema=schema)
+        self.columns = self.extractor.columns
+        self.filters = filters
+        self.record_filter = RecordFilter(filters) if filters else None
+        self.stats: Dict[str, int] = {"scanned": 0, "kept": 0}
+        self.metrics = metrics if metrics is not None else Metrics()
+        logger.debug(
+            f"XMLHandler initialized with file_path={file_path} "
+            f"and backend={self.backend}"
+        )
 
     def read_xml(self) -> str:
         """
@@ -100,23 +163,215 @@ class XMLHandler:
             FileNotFoundError: If zip_path does not exist.
             ValueError: If no XML file is found inside the ZIP.
         """
+        with self.metrics.stage("extract") as stage:
+            try:
+                if not os.path.exists(zip_path):
+                    raise FileNotFoundError(f"ZIP file not found: {zip_path}")
+
+                os.makedirs(extract_to, exist_ok=True)
+
+                with zipfile.ZipFile(zip_path, "r") as zip_ref:
+                    xml_file_name = self._find_xml_member(zip_ref)
+                    zip_ref.extract(xml_file_name, path=extract_to)
+                    extracted_path = os.path.join(extract_to, xml_file_name)
+                    stage.add("bytes_in", os.path.getsize(zip_path))
+                    stage.add("bytes_out", os.path.getsize(extracted_path))
+
+                    logger.info(f"Extracted XML file: {extracted_path}")
+                    return extracted_path
+
+            except FileNotFoundError as e:
+                logger.error(f"ZIP file not found: {e}")
+                raise
+
+            except zipfile.BadZipFile as e:
+                logger.error(f"Bad ZIP file: {e}")
+                raise
+
+            except Exception as e:
+                logger.critical(
+                    f"Unexpected error while extracting ZIP file: {e}", exc_info=True
+                )
+                raise
+
+    def convert_to_csv(
+        self, output_csv_path: str, batch_size: int = BATCH_SIZE, workers: int = 1
+    ) -> str:
+        """
+        Converts a large XML file to CSV by streaming FinInstrm nodes.
+
+        With more than one worker, the file is split into byte ranges at FinInstrm
+        boundaries, the ranges are converted in separate processes and the partial
+        CSV files are concatenated in document order, giving the same output as a
+        single-process conversion.
+
+        An output path ending with ".gz" or ".zst" is compressed while the rows are
+        written, see CSVBatchWriter.
+
+        Args:
+            output_csv_path: Path to output CSV file.
+            batch_size: Number of rows held in memory before they are written.
+            workers: Number of processes parsing the file.
+
+        Returns:
+            Path to the written CSV file.
+        """
+        if workers > 1:
+            return self._convert_parallel(output_csv_path, batch_size, workers)
+        writer = CSVBatchWriter(output_csv_path, self.columns, batch_size)
+        return self._convert(self.file_path, writer)
+
+    def convert_to_parquet(
+        self,
+        output_path: str,
+        row_group_size: int = ROW_GROUP_SIZE,
+        compression: str = "snappy",
+    ) -> str:
+        """
+        Converts a large XML file to Parquet by streaming FinInstrm nodes.
+
+        Row groups are written while the file is being parsed. Every column is
+        typed as a string, and the low-cardinality ones are dictionary encoded.
+
+        Args:
+            output_path: Path to output Parquet file.
+            row_group_size: Number of rows per row group, held in memory before
+                they are written.
+            compression: Parquet compression codec, e.g. "snappy", "zstd" or "none".
+
+        Returns:
+            Path to the written Parquet file.
+        """
+        writer = parquet_writer(
+            output_path, self.extractor, row_group_size, compression
+        )
+        return self._convert(self.file_path, writer)
+
+    def convert_to_partitioned(
+        self,
+        output_path: str,
+        partitions: Optional[List[dict]] = None,
+        batch_size: int = BATCH_SIZE,
+        max_open_files: int = MAX_OPEN_FILES,
+        compression: Optional[str] = None,
+    ) -> str:
+        """
+        Converts a large XML file to a Hive-partitioned CSV dataset by streaming
+        FinInstrm nodes, see PartitionedWriter.
+
+        Args:
+            output_path: Root directory of the dataset, a local path or an fsspec
+                URL.
+            partitions: Partition keys, defaults to the currency and the CFI
+                category.
+            batch_size: Number of rows held in memory before they are written.
+            max_open_files: Number of part files kept open at the same time.
+            compression: Compression of the part files, "gzip", "zstd" or None.
+
+        Returns:
+            Root directory of the written dataset.
+        """
+        writer = PartitionedWriter(
+            output_path,
+            self.columns,
+            partitions=partitions,
+            batch_size=batch_size,
+            max_open_files=max_open_files,
+            compression=compression,
+        )
+        return self._convert(self.file_path, writer)
+
+    def convert_zip_to_csv(
+        self,
+        zip_path: str,
+        output_csv_path: str,
+        member: Optional[str] = None,
+        batch_size: int = BATCH_SIZE,
+    ) -> str:
+        """
+        Converts an XML file stored inside a ZIP archive to CSV, streaming it
+        straight out of the archive instead of extracting it to disk first.
+
+        Args:
+            zip_path: Path to the ZIP file.
+            output_csv_path: Path to output CSV file.
+            member: Name of the XML file inside the archive. Defaults to the first
+                XML file found, as in extract_from_zip.
+            batch_size: Number of rows held in memory before they are written.
+
+        Returns:
+            Path to the written CSV file.
+
+        Raises:
+            FileNotFoundError: If zip_path does not exist.
+            ValueError: If the member is not found inside the ZIP.
+        """
+        with self._open_zip_member(zip_path, member) as stream:
+            writer = CSVBatchWriter(output_csv_path, self.columns, batch_size)
+            return self._convert(stream, writer)
+
+    def convert_zip_to_parquet(
+        self,
+        zip_path: str,
+        output_path: str,
+        member: Optional[str] = None,
+        row_group_size: int = ROW_GROUP_SIZE,
+        compression: str = "snappy",
+    ) -> str:
+        """
+        Converts an XML file stored inside a ZIP archive to Parquet, streaming it
+        straight out of the archive instead of extracting it to disk first.
+
+        Args:
+            zip_path: Path to the ZIP file.
+            output_path: Path to output Parquet file.
+            member: Name of the XML file inside the archive. Defaults to the first
+                XML file found, as in extract_from_zip.
+            row_group_size: Number of rows per row group.
+            compression: Parquet compression codec, e.g. "snappy", "zstd" or "none".
+
+        Returns:
+            Path to the written Parquet file.
+
+        Raises:
+            FileNotFoundError: If zip_path does not exist.
+            ValueError: If the member is not found inside the ZIP.
+        """
+        with self._open_zip_member(zip_path, member) as stream:
+            writer = parquet_writer(
+                output_path, self.extractor, row_group_size, compression
+            )
+            return self._convert(stream, writer)
+
+    @contextmanager
+    def _open_zip_member(
+        self, zip_path: str, member: Optional[str]
+    ) -> Iterator[IO[bytes]]:
+        """
+        Opens an XML file stored inside a ZIP archive as a binary stream.
+
+        Args:
+            zip_path: Path to the ZIP file.
+            member: Name of the XML file inside the archive, or None for the first
+                XML file found.
+
+        Raises:
+            FileNotFoundError: If zip_path does not exist.
+            ValueError: If the member is not found inside the ZIP.
+        """
         try:
             if not os.path.exists(zip_path):
                 raise FileNotFoundError(f"ZIP file not found: {zip_path}")
 
-            os.makedirs(extract_to, exist_ok=True)
-
             with zipfile.ZipFile(zip_path, "r") as zip_ref:
-                xml_files = [f for f in zip_ref.namelist() if f.endswith(".xml")]
-                if not xml_files:
-                    raise ValueError("No XML files found inside the ZIP archive.")
+                if member is None:
+                    member = self._find_xml_member(zip_ref)
+                elif member not in zip_ref.namelist():
+                    raise ValueError(f"{member} not found inside the ZIP archive.")
 
-                xml_file_name = xml_files[0]
-                zip_ref.extract(xml_file_name, path=extract_to)
-                extracted_path = os.path.join(extract_to, xml_file_name)
-
-                logger.info(f"Extracted XML file: {extracted_path}")
-                return extracted_path
+                logger.info(f"Converting {member} from {zip_path} without extracting")
+                with zip_ref.open(member) as stream:
+                    yield stream
 
         except FileNotFoundError as e:
             logger.error(f"ZIP file not found: {e}")
@@ -126,84 +381,268 @@ class XMLHandler:
             logger.error(f"Bad ZIP file: {e}")
             raise
 
-        except Exception as e:
-            logger.critical(
-                f"Unexpected error while extracting ZIP file: {e}", exc_info=True
-            )
-            raise
+    @staticmethod
+    def _find_xml_member(zip_ref: zipfile.ZipFile) -> str:
+        """
+        Returns the name of the first XML file inside an open ZIP archive.
 
-    def convert_to_csv(self, output_csv_path: str) -> str:
+        Raises:
+            ValueError: If no XML file is found inside the ZIP.
         """
-        Converts a large XML file to CSV by streaming FinInstrm nodes.
+        xml_files = [f for f in zip_ref.namelist() if f.endswith(".xml")]
+        if not xml_files:
+            raise ValueError("No XML files found inside the ZIP archive.")
+        return xml_files[0]
+
+    def _convert(
+        self,
+        source: Union[str, IO[bytes]],
+        writer: Union[RecordWriter, PartitionedWriter],
+    ) -> str:
+        """
+        Streams the FinInstrm nodes of an XML document into a writer.
+
+        Rows are written in batches by the writer, and every FinInstrm node is
+        cleared and detached from its parent once converted, so memory usage stays
+        flat however many instruments the document holds. The number of nodes
+        scanned and kept is stored in stats.
 
         Args:
-            output_csv_path: Path to output CSV file.
+            source: Path to the XML file, or a binary file object with its content.
+            writer: Writer of the output file, closed once the document is parsed,
+                or discarded if the conversion fails.
 
         Returns:
-            pandas DataFrame containing the parsed data.
+            Path to the written file.
         """
-        ns = {
-            "h": "urn:iso:std:iso:20022:tech:xsd:head.003.001.01",
-            "a": "urn:iso:std:iso:20022:tech:xsd:auth.036.001.02",
-        }
+        with self.metrics.stage("parse") as stage:
+            try:
+                with writer:
+                    scanned, kept = stream_records(
+                        source, writer, self.backend, self.extractor, self.record_filter
+                    )
+                self.stats = {"scanned": scanned, "kept": kept}
+                bytes_out = (
+                    writer.bytes_written
+                    if isinstance(writer, PartitionedWriter)
+                    else None
+                )
+                self._count_conversion(stage, source, writer.path, bytes_out)
+                logger.info(
+                    f"{writer.path} written with {writer.rows_written} rows "
+                    f"({kept} of {scanned} FinInstrm kept)"
+                )
+                return writer.path
+
+            except PARSE_ERRORS as e:
+                logger.error(f"XML parsing error: {e}")
+                raise
+            except Exception as e:
+                logger.critical(
+                    f"Unexpected error during conversion: {e}", exc_info=True
+                )
+                raise
 
-        records = []
-        try:
-            context = ET.iterparse(self.file_path, events=("end",))
-            for event, elem in context:
-                if elem.tag.endswith("FinInstrm"):
-                    try:
-                        gnl = elem.find(".//a:FinInstrmGnlAttrbts", ns)
-                        issr = elem.findtext(".//a:Issr", default="", namespaces=ns)
-
-                        row = {
-                            "FinInstrmGnlAttrbts.Id": (
-                                gnl.findtext("a:Id", default="", namespaces=ns)
-                                if gnl is not None
-                                else ""
-                            ),
-                            "FinInstrmGnlAttrbts.FullNm": (
-                                gnl.findtext("a:FullNm", default="", namespaces=ns)
-                                if gnl is not None
-                                else ""
-                            ),
-                            "FinInstrmGnlAttrbts.ClssfctnTp": (
-                                gnl.findtext("a:ClssfctnTp", default="", namespaces=ns)
-                                if gnl is not None
-                                else ""
-                            ),
-                            "FinInstrmGnlAttrbts.CmmdtyDerivInd": (
-                                gnl.findtext(
-                                    "a:CmmdtyDerivInd", default="", namespaces=ns
-                                )
-                                if gnl is not None
-                                else ""
-                            ),
-                            "FinInstrmGnlAttrbts.NtnlCcy": (
-                                gnl.findtext("a:NtnlCcy", default="", namespaces=ns)
-                                if gnl is not None
-                                else ""
-                            ),
-                            "Issr": issr,
-                        }
-
-                        records.append(row)
-                    except Exception as e:
-                        logger.warning(f"Error parsing FinInstrm: {e}")
-                    finally:
-                        elem.clear()
-
-            df = pd.DataFrame(records)
-            os.makedirs(os.path.dirname(output_csv_path), exist_ok=True)
-            df.to_csv(output_csv_path, index=False)
-            logger.info(f"CSV written to {output_csv_path} with {len(df)} rows")
-            return output_csv_path
+    def _convert_parallel(
+        self, output_csv_path: str, batch_size: int, workers: int
+    ) -> str:
+        """
+        Converts the XML file to CSV using a pool of worker processes.
 
-        except ET.ParseError as e:
-            logger.error(f"XML parsing error: {e}")
-            raise
+        Args:
+            output_csv_path: Path to output CSV file.
+            batch_size: Number of rows held in memory by each worker.
+            workers: Number of processes parsing the file.
+
+        Returns:
+            Path to the written CSV file.
+        """
+        header, ranges = split_fin_instrm_ranges(
+            self.file_path, workers * CHUNKS_PER_WORKER
+        )
+        if len(ranges) < 2:
+            writer = CSVBatchWriter(output_csv_path, self.columns, batch_size)
+            return self._convert(self.file_path, writer)
+
+        with self.metrics.stage("parse") as stage:
+            prefix, suffix = wrap_chunk(header)
+            os.makedirs(os.path.dirname(output_csv_path) or ".", exist_ok=True)
+            parts_dir = tempfile.mkdtemp(dir=os.path.dirname(output_csv_path) or ".")
+            try:
+                # Compressed parts are gzip members or zstd frames, which stay a
+                # valid compressed file once concatenated.
+                extension = compression_suffix(output_csv_path)
+                part_paths = [
+                    os.path.join(parts_dir, f"part-{i:05d}.csv{extension}")
+                    for i in range(len(ranges))
+                ]
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        executor.submit(
+                            _convert_byte_range,
+                            self.file_path,
+                            start,
+                            end,
+                            prefix,
+                            suffix,
+                            part_path,
+                            batch_size,
+                            i == 0,
+                            self.backend,
+                            self.schema,
+                            self.filters,
+                        )
+                        for i, ((start, end), part_path) in enumerate(
+                            zip(ranges, part_paths)
+                        )
+                    ]
+                    counts = [future.result() for future in futures]
+                scanned = sum(count[0] for count in counts)
+                kept = sum(count[1] for count in counts)
+                self.stats = {"scanned": scanned, "kept": kept}
+
+                # The parts are joined in the temporary directory, so that an
+                # error never leaves a truncated file at output_csv_path.
+                joined_path = os.path.join(parts_dir, "joined.csv")
+                with open(joined_path, "wb") as output:
+                    for part_path in part_paths:
+                        with open(part_path, "rb") as part:
+                            shutil.copyfileobj(part, output)
+                os.replace(joined_path, output_csv_path)
+                self._count_conversion(stage, self.file_path, output_csv_path)
+
+                logger.info(
+                    f"CSV written to {output_csv_path} with {kept} rows "
+                    f"({kept} of {scanned} FinInstrm kept) "
+                    f"from {len(ranges)} chunks on {workers} workers"
+                )
+                return output_csv_path
+
+            except PARSE_ERRORS as e:
+                logger.error(f"XML parsing error: {e}")
+                raise
+            finally:
+                shutil.rmtree(parts_dir, ignore_errors=True)
+
+    def _count_conversion(
+        self,
+        stage: Stage,
+        source: Union[str, IO[bytes]],
+        output_path: str,
+        bytes_out: Optional[int] = None,
+    ) -> None:
+        """
+        Adds the records, rows and bytes of the last conversion to a stage. The
+        bytes written default to the size of output_path.
+        """
+        stage.add("records_scanned", self.stats["scanned"])
+        stage.add("rows", self.stats["kept"])
+        stage.add(
+            "bytes_out",
+            bytes_out if bytes_out is not None else os.path.getsize(output_path),
+        )
+        if isinstance(source, str):
+            stage.add("bytes_in", os.path.getsize(source))
+
+
+def stream_records(
+    source: Union[str, IO[bytes], io.RawIOBase, ByteRangeStream],
+    writer: RowWriter,
+    backend: str,
+    extractor: FieldExtractor,
+    record_filter: Optional[RecordFilter] = None,
+) -> Tuple[int, int]:
+    """
+    Parses every FinInstrm node of an XML document and hands the rows of the
+    ones matching record_filter to writer.
+
+    This is the conversion loop shared by XMLHandler, its worker processes and
+    StreamingConverter, which hands it a stream fed by another thread.
+
+    Args:
+        source: Path to the XML file, or a binary file object with its content.
+        writer: Writer receiving the rows.
+        backend: Parser used to stream the document.
+        extractor: Extractor building the row of every FinInstrm node.
+        record_filter: Filter deciding which nodes are kept, or None to keep
+            every node.
+
+    Returns:
+        A tuple with the number of FinInstrm nodes scanned and kept.
+    """
+    scanned = kept = 0
+    for elem in iter_fin_instrm(source, backend):
+        scanned += 1
+        try:
+            if record_filter is not None and not record_filter.matches(elem):
+                continue
+            row = extractor.extract(elem)
         except Exception as e:
-            logger.critical(
-                f"Unexpected error during CSV conversion: {e}", exc_info=True
-            )
-            raise
+            logger.warning(f"Error parsing FinInstrm: {e}")
+            continue
+        # Outside of the try block, so that a failing write stops the
+        # conversion instead of leaving a truncated output.
+        writer.write(row)
+        kept += 1
+    return scanned, kept
+
+
+def parquet_writer(
+    output_path: str,
+    extractor: FieldExtractor,
+    row_group_size: int = ROW_GROUP_SIZE,
+    compression: str = "snappy",
+) -> ParquetBatchWriter:
+    """
+    Opens a ParquetBatchWriter for the rows of extractor, typed with its column
+    types and with the low-cardinality columns dictionary encoded.
+
+    Args:
+        output_path: Path to output Parquet file.
+        extractor: Extractor building the rows written.
+        row_group_size: Number of rows per row group.
+        compression: Parquet compression codec, e.g. "snappy", "zstd" or "none".
+
+    Returns:
+        The open writer.
+    """
+    return ParquetBatchWriter(
+        output_path,
+        extractor.columns,
+        row_group_size=row_group_size,
+        compression=compression,
+        types=arrow_types(extractor.types),
+        dictionary_columns=[
+            column for column in LOW_CARDINALITY_COLUMNS if column in extractor.columns
+        ],
+    )
+
+
+def _convert_byte_range(
+    file_path: str,
+    start: int,
+    end: int,
+    prefix: bytes,
+    suffix: bytes,
+    output_csv_path: str,
+    batch_size: int,
+    header: bool,
+    backend: str,
+    schema: Optional[Schema] = None,
+    filters: Optional[List[dict]] = None,
+) -> Tuple[int, int]:
+    """
+    Converts the FinInstrm nodes of one byte range of an XML file to CSV.
+
+    Runs in a worker process of XMLHandler._convert_parallel.
+
+    Returns:
+        A tuple with the number of FinInstrm nodes scanned and kept.
+    """
+    extractor = FieldExtractor(schema=schema)
+    record_filter = RecordFilter(filters) if filters else None
+    writer = CSVBatchWriter(
+        output_csv_path, extractor.columns, batch_size, header=header
+    )
+    with writer, ByteRangeStream(file_path, start, end, prefix, suffix) as stream:
+        return stream_records(stream, writer, backend, extractor, record_filter)
@@ -0,0 +1,219 @@
+import logging
+import struct
+import zipfile
+import zlib
+from typing import Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+LOCAL_HEADER_SIGNATURE = 0x04034B50
+DATA_DESCRIPTOR_SIGNATURE = 0x08074B50
+ZIP64_EXTRA_ID = 0x0001
+ZIP64_LIMIT = 0xFFFFFFFF
+FLAG_ENCRYPTED = 0x1
+FLAG_DATA_DESCRIPTOR = 0x8
+FLAG_UTF8 = 0x800
+OUTPUT_SIZE = 1024 * 1024
+
+
+def iter_zip_member(
+    chunks: Iterable[bytes], member: Optional[str] = None
+) -> Iterator[bytes]:
+    """
+    Decompresses a member of a ZIP archive received as a stream of chunks.
+
+    zipfile needs a seekable file to read the central directory at the end of
+    the archive. This walks the local file headers instead, so the member can be
+    inflated while the archive is still being downloaded. The rest of the
+    archive is consumed once the member is decompressed, so that the producer of
+    the chunks always runs to completion.
+
+    Args:
+        chunks: content of the ZIP archive, in order
+        member: name of the file to decompress, or None for the first XML file
+
+    Yields:
+        The decompressed content of the member, at most OUTPUT_SIZE bytes at a
+        time.
+
+    Raises:
+        ValueError: If the member is not found inside the archive.
+        zipfile.BadZipFile: If the archive is truncated or corrupted.
+        NotImplementedError: If the member is encrypted, or compressed with
+            another method than stored or deflated.
+    """
+    reader = _ChunkReader(chunks)
+    while True:
+        header = reader.read(LOCAL_HEADER.size)
+        if len(header) < 4 or struct.unpack("<I", header[:4])[0] != (
+            LOCAL_HEADER_SIGNATURE
+        ):
+            # The local headers are followed by the central directory.
+            reader.drain()
+            if member is not None:
+                raise ValueError(f"{member} not found inside the ZIP archive.")
+            raise ValueError("No XML files found inside the ZIP archive.")
+        if len(header) < LOCAL_HEADER.size:
+            raise zipfile.BadZipFile("Truncated local file header")
+
+        (_, _, flags, method, _, _, crc, csize, usize, name_len, extra_len) = (
+            LOCAL_HEADER.unpack(header)
+        )
+        name = reader.read(name_len).decode("utf-8" if flags & FLAG_UTF8 else "cp437")
+        extra = reader.read(extra_len)
+        zip64 = _has_zip64_extra(extra)
+        csize, usize = _zip64_sizes(extra, csize, usize)
+        if flags & FLAG_ENCRYPTED:
+            raise NotImplementedError(f"{name} is encrypted")
+
+        wanted = name == member if member is not None else name.endswith(".xml")
+        streamed = bool(flags & FLAG_DATA_DESCRIPTOR)
+        checksum = size = 0
+        for data in _member_data(reader, name, method, csize, streamed):
+            if wanted:
+                checksum = zlib.crc32(data, checksum)
+                size += len(data)
+                yield data
+        if streamed:
+            crc, usize = _read_data_descriptor(reader, zip64)
+        if not wanted:
+            continue
+
+        if checksum != crc or size != usize:
+            raise zipfile.BadZipFile(f"Bad CRC-32 or size for {name}")
+        logger.debug(f"Inflated {size} bytes of {name}")
+        reader.drain()
+        return
+
+
+def _member_data(
+    reader: "_ChunkReader", name: str, method: int, csize: int, streamed: bool
+) -> Iterator[bytes]:
+    """
+    Yields the decompressed data of the member whose header was just read.
+    """
+    if method == zipfile.ZIP_STORED:
+        if streamed:
+            raise NotImplementedError(f"Cannot stream {name}, stored without a size")
+        remaining = csize
+        while remaining:
+            data = reader.read_some(min(remaining, OUTPUT_SIZE))
+            if not data:
+                raise zipfile.BadZipFile(f"Truncated data for {name}")
+            remaining -= len(data)
+            yield data
+        return
+
+    if method != zipfile.ZIP_DEFLATED:
+        raise NotImplementedError(f"Unsupported compression method {method} for {name}")
+
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    while not decompressor.eof:
+        data = reader.read_some()
+        if not data:
+            raise zipfile.BadZipFile(f"Truncated data for {name}")
+        while True:
+            try:
+                output = decompressor.decompress(data, OUTPUT_SIZE)
+            except zlib.error as e:
+                raise zipfile.BadZipFile(f"Corrupted data for {name}: {e}") from e
+            if output:
+                yield output
+            data = decompressor.unconsumed_tail
+            if decompressor.eof or (not data and len(output) < OUTPUT_SIZE):
+                break
+    reader.unread(decompressor.unused_data)
+
+
+def _read_data_descriptor(reader: "_ChunkReader", zip64: bool) -> Tuple[int, int]:
+    """
+    Reads the descriptor following a member written without seeking back to its
+    header, and returns its CRC-32 and uncompressed size.
+    """
+    size_format = "<QQ" if zip64 else "<II"
+    first = reader.read(4)
+    if len(first) == 4 and struct.unpack("<I", first)[0] == DATA_DESCRIPTOR_SIGNATURE:
+        first = reader.read(4)
+    sizes = reader.read(struct.calcsize(size_format))
+    if len(first) < 4 or len(sizes) < struct.calcsize(size_format):
+        raise zipfile.BadZipFile("Truncated data descriptor")
+    return struct.unpack("<I", first)[0], struct.unpack(size_format, sizes)[1]
+
+
+def _iter_extra(extra: bytes) -> Iterator[Tuple[int, bytes]]:
+    position = 0
+    while position + 4 <= len(extra):
+        field_id, length = struct.unpack("<HH", extra[position : position + 4])
+        yield field_id, extra[position + 4 : position + 4 + length]
+        position += 4 + length
+
+
+def _has_zip64_extra(extra: bytes) -> bool:
+    return any(field_id == ZIP64_EXTRA_ID for field_id, _ in _iter_extra(extra))
+
+
+def _zip64_sizes(extra: bytes, csize: int, usize: int) -> Tuple[int, int]:
+    """
+    Replaces the sizes of a local header saturated at ZIP64_LIMIT with the ones
+    of its zip64 extra field, which holds the saturated ones only, uncompressed
+    size first.
+    """
+    for field_id, data in _iter_extra(extra):
+        if field_id != ZIP64_EXTRA_ID:
+            continue
+        values = [
+            value for (value,) in struct.iter_unpack("<Q", data[: len(data) // 8 * 8])
+        ]
+        if usize == ZIP64_LIMIT and values:
+            usize = values.pop(0)
+        if csize == ZIP64_LIMIT and values:
+            csize = values.pop(0)
+    return csize, usize
+
+
+class _ChunkReader:
+    """
+    Reads an iterable of byte chunks as a stream, with support for pushing back
+    the bytes read past the end of a member.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def read_some(self, size: int = -1) -> bytes:
+        """
+        Returns the buffered bytes or the next chunk, at most size bytes if size
+        is positive, and b"" at the end of the stream.
+        """
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._buffer = bytes(chunk)
+        if 0 < size < len(self._buffer):
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        else:
+            data, self._buffer = self._buffer, b""
+        return data
+
+    def read(self, size: int) -> bytes:
+        """
+        Returns the next size bytes, or fewer at the end of the stream.
+        """
+        parts = []
+        while size > 0:
+            data = self.read_some(size)
+            if not data:
+                break
+            parts.append(data)
+            size -= len(data)
+        return b"".join(parts)
+
+    def unread(self, data: bytes) -> None:
+        self._buffer = data + self._buffer
+
+    def drain(self) -> None:
+        self._buffer = b""
+        for _ in self._chunks:
+            pass
@@ -0,0 +1,175 @@
+import functools
+import json
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+
+from deta.batch.batch import BatchProcessor, _unique_stems, merge_outputs
+from deta.benchmark.synthetic import write_synthetic_zip
+from deta.metrics.metrics import Metrics
+
+
+@pytest.fixture
+def archives(tmp_path):
+    """
+    Serves three synthetic DLTINS archives of 30, 20 and 10 records over HTTP, and
+    returns their crawl results in publication order.
+    """
+    served = tmp_path / "served"
+    for day, records in ((17, 30), (18, 20), (19, 10)):
+        write_synthetic_zip(str(served / f"DLTINS_202101{day}_01of01.zip"), records)
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(served))
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    yield [
+        {
+            "file_name": f"DLTINS_202101{day}_01of01.zip",
+            "file_type": "DLTINS",
+            "download_link": f"{base_url}/DLTINS_202101{day}_01of01.zip",
+            "publication_date": f"2021-01-{day}T00:00:00Z",
+        }
+        for day in (17, 18, 19)
+    ]
+    server.shutdown()
+    server.server_close()
+
+
+def make_processor(tmp_path, files, **kwargs):
+    crawler = MagicMock()
+    crawler.crawl.return_value = files
+    return BatchProcessor(str(tmp_path / "out"), crawler=crawler, **kwargs), crawler
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_run_processes_every_file(tmp_path, archives, streaming):
+    metrics = Metrics()
+    processor, crawler = make_processor(
+        tmp_path, archives, workers=2, streaming=streaming, metrics=metrics
+    )
+    merged = str(tmp_path / "merged" / "all.csv")
+
+    results = processor.run("2021-01-17", "2021-01-19", ["DLTINS"], merge_path=merged)
+
+    crawler.crawl.assert_called_once_with(
+        "2021-01-17", "2021-01-19", file_types=["DLTINS"]
+    )
+    assert [result["rows"] for result in results] == [30, 20, 10]
+    for result, file in zip(results, archives):
+        assert result["output_path"] == str(
+            tmp_path / "out" / file["file_name"].replace(".zip", ".csv")
+        )
+        df = pd.read_csv(result["output_path"])
+        assert len(df) == result["rows"]
+        assert {"a_count", "contains_a"} <= set(df.columns)
+
+    merged_df = pd.read_csv(merged)
+    expected = pd.concat(
+        [pd.read_csv(result["output_path"]) for result in results], ignore_index=True
+    )
+    pd.testing.assert_frame_equal(merged_df, expected)
+    summary = json.load(open(tmp_path / "out" / "batch.json"))
+    assert summary["merged"] == merged
+    assert [file["rows"] for file in summary["files"]] == [30, 20, 10]
+    assert metrics.stages["download"]["counters"]["files"] == 3
+    assert metrics.stages["parse"]["counters"]["rows"] == 60
+
+
+def test_failed_file_does_not_stop_the_batch(tmp_path, archives):
+    archives[1] = dict(
+        archives[1], download_link=archives[1]["download_link"] + ".missing"
+    )
+    processor, _ = make_processor(tmp_path, archives, workers=2)
+    merged = str(tmp_path / "merged.csv")
+
+    with patch("time.sleep"):
+        results = processor.run("2021-01-17", "2021-01-19", merge_path=merged)
+
+    assert "404" in results[1]["error"]
+    assert "error" not in results[0] and "error" not in results[2]
+    assert len(pd.read_csv(merged)) == 40
+
+
+def test_run_without_files(tmp_path):
+    processor, _ = make_processor(tmp_path, [])
+
+    assert processor.run("2021-01-17", "2021-01-19") == []
+
+
+def test_merge_outputs_keeps_first_header(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"part{i}.csv"
+        path.write_text(f"a,b\n{i},x\n")
+        paths.append(str(path))
+
+    merge_outputs(paths, str(tmp_path / "merged.csv"))
+
+    assert (tmp_path / "merged.csv").read_text() == "a,b\n0,x\n1,x\n2,x\n"
+
+
+def test_unique_stems():
+    files = [
+        {"file_name": "DLTINS_1.zip", "download_link": "http://x/a.zip"},
+        {"file_name": "DLTINS_1.zip", "download_link": "http://x/b.zip"},
+        {"download_link": "http://x/path/FULINS_2.zip"},
+    ]
+
+    assert _unique_stems(files) == ["DLTINS_1", "DLTINS_1_2", "FULINS_2"]
+
+
+def test_main_batch_command(tmp_path):
+    from deta.main import main
+
+    with patch("deta.main.BatchProcessor") as processor:
+        processor.return_value.run.return_value = [{"rows": 1}, {"error": "boom"}]
+        status = main(
+            [
+                "batch",
+                "--start-date",
+                "2021-01-01",
+                "--end-date",
+                "2021-03-31",
+                "--file-type",
+                "DLTINS",
+                "--file-type",
+                "FULINS",
+                "--output-dir",
+                str(tmp_path),
+                "--workers",
+                "3",
+                "--merge",
+                "merged.csv",
+                "--streaming",
+            ]
+        )
+
+    assert status == 1
+    assert processor.call_args.args == (str(tmp_path),)
+    assert processor.call_args.kwargs["workers"] == 3
+    assert processor.call_args.kwargs["streaming"] is True
+    processor.return_value.run.assert_called_once_with(
+        "2021-01-01",
+        "2021-03-31",
+        file_types=["DLTINS", "FULINS"],
+        merge_path="merged.csv",
+    )
+    assert os.path.exists(tmp_path / "metrics" / "run.json")
+
+
+def test_main_rejects_invalid_dates():
+    from deta.main import main
+
+    with pytest.raises(SystemExit):
+        main(["batch", "--start-date", "2021-13-01", "--end-date", "2021-01-02"])
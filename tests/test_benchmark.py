@@ -0,0 +1,84 @@
+import io
+import json
+import zipfile
+
+import pandas as pd
+import pytest
+
+from deta.benchmark.benchmark import CASES, main, run_benchmarks
+from deta.benchmark.synthetic import (
+    write_synthetic_stream,
+    write_synthetic_xml,
+    write_synthetic_zip,
+)
+from deta.xml_handler.extractor import iter_fin_instrm
+from deta.xml_handler.xml_handler import XMLHandler
+
+
+def test_write_synthetic_xml(tmp_path):
+    path = write_synthetic_xml(str(tmp_path / "data" / "synthetic.xml"), 2500)
+
+    records = sum(1 for _ in iter_fin_instrm(path, "stdlib"))
+    assert records == 2500
+
+    df = pd.read_csv(XMLHandler(path).convert_to_csv(str(tmp_path / "out.csv")))
+    assert df["FinInstrmGnlAttrbts.Id"].is_unique
+    assert df["FinInstrmGnlAttrbts.Id"].iloc[-1] == "XS0000002499"
+    assert df["FinInstrmGnlAttrbts.NtnlCcy"].nunique() > 1
+    assert df["Issr"].notna().all()
+
+
+def test_synthetic_data_is_deterministic():
+    first, second, other = io.BytesIO(), io.BytesIO(), io.BytesIO()
+    write_synthetic_stream(first, 50, seed=1)
+    write_synthetic_stream(second, 50, seed=1)
+    write_synthetic_stream(other, 50, seed=2)
+
+    assert first.getvalue() == second.getvalue()
+    assert first.getvalue() != other.getvalue()
+
+
+def test_write_synthetic_zip(tmp_path):
+    path = write_synthetic_zip(str(tmp_path / "DLTINS_test.zip"), 100)
+
+    with zipfile.ZipFile(path) as zipf:
+        assert zipf.namelist() == ["DLTINS_test.xml"]
+        content = zipf.read("DLTINS_test.xml")
+    expected = io.BytesIO()
+    write_synthetic_stream(expected, 100)
+    assert content == expected.getvalue()
+
+
+def test_run_benchmarks(tmp_path):
+    report = run_benchmarks(
+        records=200,
+        cases=["download", "convert_zip_to_csv"],
+        workdir=str(tmp_path),
+    )
+
+    json.dumps(report)
+    assert report["records"] == 200
+    assert report["xml_bytes"] > report["zip_bytes"] > 0
+    download, convert = report["results"]
+    assert download["case"] == "download"
+    assert download["unit"] == "bytes"
+    assert download["items"] == report["zip_bytes"]
+    assert convert["items"] == 200
+    assert convert["throughput"] > 0
+    assert convert["peak_memory_bytes"] > 0
+    assert (tmp_path / "converted_zip.csv").exists()
+
+
+def test_run_benchmarks_unknown_case():
+    with pytest.raises(ValueError, match="Unknown benchmark cases: parse"):
+        run_benchmarks(records=10, cases=["parse"])
+
+
+def test_main_writes_json(tmp_path):
+    output = tmp_path / "report.json"
+
+    main(["--records", "50", "--cases", "csv_transforms", "--output", str(output)])
+
+    report = json.loads(output.read_text())
+    assert [result["case"] for result in report["results"]] == ["csv_transforms"]
+    assert set(CASES) >= {"download", "extract_from_zip", "convert_to_csv"}
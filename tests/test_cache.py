@@ -0,0 +1,150 @@
+import os
+from unittest.mock import MagicMock, patch
+
+from deta.cache.cache import DownloadCache
+from deta.downloader.downloader import Downloader
+
+
+def write_file(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_store_and_restore(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    source = write_file(tmp_path / "a.zip", b"archive")
+
+    cache.store("https://example.com/a.zip", source, etag='"v1"')
+    restored = cache.restore("https://example.com/a.zip", str(tmp_path / "out/a.zip"))
+
+    with open(restored, "rb") as f:
+        assert f.read() == b"archive"
+
+
+def test_conditional_headers(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    source = write_file(tmp_path / "a.xml", b"<xml/>")
+    last_modified = "Sun, 17 Jan 2021 00:00:00 GMT"
+
+    assert cache.conditional_headers("https://example.com/a.xml") == {}
+    cache.store(
+        "https://example.com/a.xml", source, etag='"v1"', last_modified=last_modified
+    )
+
+    assert cache.conditional_headers("https://example.com/a.xml") == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": last_modified,
+    }
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    source = write_file(tmp_path / "a.zip", b"same")
+
+    first = cache.store("https://example.com/a.zip", source)
+    second = cache.store("https://mirror.example.com/a.zip", source)
+
+    assert first == second
+    assert cache.size() == 4
+
+
+def test_index_survives_reopening(tmp_path):
+    source = write_file(tmp_path / "a.zip", b"archive")
+    DownloadCache(str(tmp_path / "cache")).store(
+        "https://example.com/a.zip", source, etag='"v1"'
+    )
+
+    reopened = DownloadCache(str(tmp_path / "cache"))
+    assert reopened.conditional_headers("https://example.com/a.zip") == {
+        "If-None-Match": '"v1"'
+    }
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"), max_size=10)
+    a = write_file(tmp_path / "a", b"a" * 4)
+    b = write_file(tmp_path / "b", b"b" * 4)
+    c = write_file(tmp_path / "c", b"c" * 4)
+
+    with patch("time.time", side_effect=[1, 2, 3, 4]):
+        cache.store("https://example.com/a", a, etag="a")
+        cache.store("https://example.com/b", b, etag="b")
+        cache.restore("https://example.com/a", str(tmp_path / "a2"))
+        cache.store("https://example.com/c", c, etag="c")
+
+    assert cache.size() == 8
+    assert cache.conditional_headers("https://example.com/b") == {}
+    assert cache.conditional_headers("https://example.com/a") == {"If-None-Match": "a"}
+
+
+def test_missing_object_drops_entry(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    source = write_file(tmp_path / "a.zip", b"archive")
+    digest = cache.store("https://example.com/a.zip", source, etag='"v1"')
+
+    os.remove(tmp_path / "cache" / "objects" / digest[:2] / digest)
+
+    assert cache.conditional_headers("https://example.com/a.zip") == {}
+    assert cache.restore("https://example.com/a.zip", str(tmp_path / "out.zip")) is None
+
+
+def test_restore_after_the_object_disappeared(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    source = write_file(tmp_path / "a.zip", b"archive")
+    digest = cache.store("https://example.com/a.zip", source, etag='"v1"')
+    cache.conditional_headers("https://example.com/a.zip")
+
+    os.remove(tmp_path / "cache" / "objects" / digest[:2] / digest)
+
+    assert cache.restore("https://example.com/a.zip", str(tmp_path / "out.zip")) is None
+    assert not os.path.exists(tmp_path / "out.zip")
+
+
+def test_downloader_uses_cache_on_not_modified(tmp_path):
+    url = "https://example.com/a.zip"
+    cache = DownloadCache(str(tmp_path / "cache"))
+
+    first = MagicMock(status_code=200, headers={"ETag": '"v1"'})
+    first.iter_content.return_value = [b"archive"]
+    not_modified = MagicMock(status_code=304, headers={})
+
+    downloader = Downloader(cache=cache)
+    with patch.object(
+        downloader.session, "get", side_effect=[first, not_modified]
+    ) as mock_get:
+        downloader.download_from_url(url, str(tmp_path / "first.zip"))
+        result = downloader.download_from_url(url, str(tmp_path / "second.zip"))
+
+    assert mock_get.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
+    not_modified.iter_content.assert_not_called()
+    with open(result, "rb") as f:
+        assert f.read() == b"archive"
+
+
+def test_downloader_downloads_again_when_evicted_before_not_modified(tmp_path):
+    url = "https://example.com/a.zip"
+    cache = DownloadCache(str(tmp_path / "cache"))
+    cache.store(url, write_file(tmp_path / "a.zip", b"archive"), etag='"v1"')
+
+    not_modified = MagicMock(status_code=304, headers={})
+    full = MagicMock(status_code=200, headers={"ETag": '"v1"'})
+    full.iter_content.return_value = [b"archive"]
+
+    def get(*args, **kwargs):
+        if kwargs["headers"]:
+            # Another download evicts the entry while the request is in flight.
+            cache._entries.clear()
+            return not_modified
+        return full
+
+    downloader = Downloader(cache=cache)
+    with patch.object(downloader.session, "get", side_effect=get) as mock_get:
+        result = downloader.download_from_url(url, str(tmp_path / "out.zip"))
+
+    assert [c.kwargs["headers"] for c in mock_get.call_args_list] == [
+        {"If-None-Match": '"v1"'},
+        {},
+    ]
+    with open(result, "rb") as f:
+        assert f.read() == b"archive"
+    assert cache.conditional_headers(url) == {"If-None-Match": '"v1"'}
@@ -0,0 +1,139 @@
+import gzip
+import io
+import sys
+import zlib
+
+import pytest
+
+from deta.writers import compression
+from deta.writers.compression import (
+    ParallelCompressedWriter,
+    compression_suffix,
+    infer_compression,
+    open_compressed,
+)
+
+DATA = b"".join(f"{i},instrument {i},EUR\n".encode() for i in range(20_000))
+
+
+def count_gzip_members(data: bytes) -> int:
+    members = 0
+    while data:
+        decompressor = zlib.decompressobj(31)
+        decompressor.decompress(data)
+        data = decompressor.unused_data
+        members += 1
+    return members
+
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd"])
+def test_writer_round_trip(tmp_path, codec):
+    path = str(tmp_path / f"data.csv{compression.SUFFIXES[codec]}")
+
+    with open_compressed(path, "wb", threads=3) as f:
+        for start in range(0, len(DATA), 7_000):
+            f.write(DATA[start : start + 7_000])
+
+    with open_compressed(path) as f:
+        assert f.read() == DATA
+
+
+def test_writer_compresses_independent_blocks_in_order(tmp_path):
+    raw = io.BytesIO()
+    writer = ParallelCompressedWriter(
+        raw, "gzip", threads=4, block_size=10_000, close_raw=False
+    )
+    writer.write(DATA)
+    writer.close()
+
+    data = raw.getvalue()
+    assert gzip.decompress(data) == DATA
+    assert count_gzip_members(data) == -(-len(DATA) // 10_000)
+    assert writer.bytes_in == len(DATA)
+    assert writer.bytes_out == len(data) < len(DATA)
+    assert not raw.closed
+
+
+def test_writer_bounds_pending_blocks(monkeypatch):
+    writer = ParallelCompressedWriter(io.BytesIO(), "gzip", threads=2, block_size=10)
+    pending = []
+    submit = writer._submit
+
+    def record(block):
+        submit(block)
+        pending.append(len(writer._pending))
+
+    monkeypatch.setattr(writer, "_submit", record)
+    writer.write(b"x" * 1_000)
+    writer.close()
+
+    assert max(pending) <= 4
+
+
+def test_empty_output_is_a_valid_stream(tmp_path):
+    for codec in ("gzip", "zstd"):
+        path = str(tmp_path / f"empty{compression.SUFFIXES[codec]}")
+        open_compressed(path, "wb").close()
+
+        with open_compressed(path) as f:
+            assert f.read() == b""
+
+
+def test_compression_error_is_raised_on_close(tmp_path):
+    writer = ParallelCompressedWriter(open(tmp_path / "out.gz", "wb"), "gzip")
+    raw = writer._raw
+
+    def fail(block):
+        raise zlib.error("boom")
+
+    writer._compress = fail
+    writer.write(b"data")
+    with pytest.raises(zlib.error, match="boom"):
+        writer.close()
+    assert writer.closed and raw.closed
+
+
+def test_zstd_falls_back_to_pyarrow(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    path = str(tmp_path / "data.zst")
+
+    with open_compressed(path, "wb") as f:
+        f.write(DATA)
+
+    with open_compressed(path) as f:
+        assert f.read() == DATA
+
+
+def test_zstd_without_any_backend(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+
+    with pytest.raises(ImportError, match="zstandard or pyarrow"):
+        open_compressed(str(tmp_path / "data.zst"), "wb")
+
+
+def test_uncompressed_paths_are_opened_as_is(tmp_path):
+    path = str(tmp_path / "plain" / "data.csv")
+
+    with open_compressed(path, "wb") as f:
+        f.write(b"a,b\n")
+
+    assert open(path, "rb").read() == b"a,b\n"
+
+
+def test_infer_compression():
+    assert infer_compression("data/final.csv.gz") == "gzip"
+    assert infer_compression("s3://bucket/final.CSV.ZST") == "zstd"
+    assert infer_compression("data/final.csv") is None
+    assert compression_suffix("final.csv.zst") == ".zst"
+    assert compression_suffix("final.csv") == ""
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported compression"):
+        open_compressed(str(tmp_path / "a.csv"), "wb", compression="bz2")
+    with pytest.raises(ValueError, match="Unsupported mode"):
+        open_compressed(str(tmp_path / "a.csv"), "ab")
+    with pytest.raises(ValueError, match="block_size"):
+        ParallelCompressedWriter(io.BytesIO(), "gzip", block_size=0)
@@ -130,3 +130,403 @@ def test_upload_invalid_type_raises(sample_csv_handler):
         sample_csv_handler.upload_file(
             destination_type="ftp", destination_path="invalid/path.csv"
         )
+
+
+def test_read_parquet_with_column_projection(tmp_path):
+    pytest.importorskip("pyarrow")
+    file_path = tmp_path / "test.parquet"
+    pd.DataFrame({"A": [1, 2], "B": ["x", "y"], "C": [True, False]}).to_parquet(
+        file_path, index=False
+    )
+
+    handler = CSVHandler(str(file_path), columns=["B", "A"])
+
+    assert handler.df.columns.tolist() == ["B", "A"]
+    assert handler.df["A"].tolist() == [1, 2]
+
+
+def test_read_csv_with_column_projection(tmp_path):
+    file_path = tmp_path / "test.csv"
+    pd.DataFrame({"A": [1, 2], "B": ["x", "y"]}).to_csv(file_path, index=False)
+
+    handler = CSVHandler(str(file_path), columns=["B"])
+
+    assert handler.df.columns.tolist() == ["B"]
+
+
+def test_upload_local_parquet(sample_csv_handler, tmp_path):
+    pytest.importorskip("pyarrow")
+    dest_path = tmp_path / "output" / "file.parquet"
+
+    sample_csv_handler.upload_file(
+        destination_type="local", destination_path=str(dest_path)
+    )
+
+    pd.testing.assert_frame_equal(pd.read_parquet(dest_path), sample_csv_handler.df)
+
+
+@patch("fsspec.get_fs_token_paths")
+def test_upload_s3_parquet_opens_binary_file(mock_fs_token, sample_csv_handler):
+    pytest.importorskip("pyarrow")
+    mock_fs = MagicMock()
+    mock_fs_token.return_value = (mock_fs, None, ["mock/path.parquet"])
+
+    with patch.object(pd.DataFrame, "to_parquet") as mock_to_parquet:
+        sample_csv_handler.upload_file(
+            destination_type="s3", destination_path="mock-bucket/test.parquet"
+        )
+
+    mock_fs.open.assert_called_once_with("s3://mock-bucket/test.parquet", "wb")
+    mock_to_parquet.assert_called_once()
+
+
+def test_add_derived_columns(tmp_path):
+    file_path = tmp_path / "test.csv"
+    pd.DataFrame({"FinInstrmGnlAttrbts.FullNm": ["Banana", "Kiwi"]}).to_csv(
+        file_path, index=False
+    )
+
+    handler = CSVHandler(str(file_path))
+    df = handler.add_derived_columns(
+        [
+            {
+                "name": "a_count",
+                "op": "count",
+                "source": "FinInstrmGnlAttrbts.FullNm",
+                "pattern": "a",
+            },
+            {"name": "contains_a", "op": "flag", "source": "a_count"},
+        ]
+    )
+
+    assert df["a_count"].tolist() == [3, 0]
+    assert df["contains_a"].tolist() == ["YES", "NO"]
+
+
+@pytest.fixture
+def instruments_csv(tmp_path):
+    file_path = tmp_path / "instruments.csv"
+    pd.DataFrame(
+        {
+            "FinInstrmGnlAttrbts.Id": [f"ID{i}" for i in range(7)],
+            "FinInstrmGnlAttrbts.FullNm": [
+                "Alpha Asset",
+                "Beta",
+                None,
+                "Gamma, Capital",
+                "",
+                "Kiwi",
+                "banana",
+            ],
+            "Issr": ["X", "Y", "X", "Z", "Y", "X", "Z"],
+        }
+    ).to_csv(file_path, index=False)
+    return file_path
+
+
+def test_chunked_write_matches_in_memory(instruments_csv, tmp_path):
+    in_memory_path = tmp_path / "in_memory.csv"
+    in_memory_path.write_bytes(instruments_csv.read_bytes())
+
+    in_memory = CSVHandler(str(in_memory_path))
+    in_memory.add_a_count_column()
+    in_memory.add_contains_a_column()
+    in_memory.write_csv()
+
+    chunked = CSVHandler(str(instruments_csv), chunksize=2)
+    assert chunked.add_a_count_column() is None
+    chunked.add_contains_a_column()
+    chunked.write_csv()
+
+    assert chunked.df is None
+    assert instruments_csv.read_text() == in_memory_path.read_text()
+    assert chunked.column_names() == list(in_memory.df.columns)
+
+
+def test_chunked_upload_matches_in_memory(instruments_csv, tmp_path):
+    in_memory = CSVHandler(str(instruments_csv))
+    in_memory.add_a_count_column()
+    in_memory.upload_file("local", str(tmp_path / "out" / "in_memory.csv"))
+
+    chunked = CSVHandler(str(instruments_csv), chunksize=3)
+    chunked.add_a_count_column()
+    chunked.upload_file("local", str(tmp_path / "out" / "chunked.csv"))
+
+    assert (tmp_path / "out" / "chunked.csv").read_text() == (
+        tmp_path / "out" / "in_memory.csv"
+    ).read_text()
+
+
+def test_chunked_iter_chunks_sizes(instruments_csv):
+    handler = CSVHandler(str(instruments_csv), chunksize=3)
+    handler.add_a_count_column()
+
+    chunks = list(handler.iter_chunks())
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert all("a_count" in chunk.columns for chunk in chunks)
+
+
+def test_chunked_parquet_with_projection(instruments_csv, tmp_path):
+    pytest.importorskip("pyarrow")
+    parquet_path = tmp_path / "instruments.parquet"
+    pd.read_csv(instruments_csv).to_parquet(parquet_path, index=False)
+
+    handler = CSVHandler(
+        str(parquet_path),
+        columns=["FinInstrmGnlAttrbts.FullNm", "Issr"],
+        chunksize=2,
+    )
+    handler.add_a_count_column()
+    handler.upload_file("local", str(tmp_path / "out" / "result.parquet"))
+
+    result = pd.read_parquet(tmp_path / "out" / "result.parquet")
+    assert list(result.columns) == ["FinInstrmGnlAttrbts.FullNm", "Issr", "a_count"]
+    assert result["a_count"].tolist() == [1, 1, 0, 4, 0, 0, 3]
+
+
+def test_chunked_derivation_on_missing_column(instruments_csv):
+    handler = CSVHandler(str(instruments_csv), chunksize=2)
+
+    with pytest.raises(ValueError, match="'a_count' column is missing"):
+        handler.add_contains_a_column()
+
+
+def test_chunked_missing_projection_column(instruments_csv):
+    with pytest.raises(ValueError, match="Error reading CSV file"):
+        CSVHandler(str(instruments_csv), columns=["Nope"], chunksize=2)
+
+
+def test_publish_serializes_once_for_many_destinations(sample_csv_handler, tmp_path):
+    import fsspec
+
+    destinations = [
+        str(tmp_path / "a" / "final.csv"),
+        "memory://bucket/final.csv",
+        "memory://other/final.csv",
+    ]
+
+    with patch.object(
+        CSVHandler, "_write_df", autospec=True, side_effect=CSVHandler._write_df
+    ) as mock_write:
+        results = sample_csv_handler.publish(destinations)
+
+    assert mock_write.call_count == 1
+    assert set(results) == set(destinations)
+    expected = (tmp_path / "a" / "final.csv").read_bytes()
+    memory = fsspec.filesystem("memory")
+    assert memory.cat("/bucket/final.csv") == expected
+    assert memory.cat("/other/final.csv") == expected
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "a" / "final.csv"), sample_csv_handler.df
+    )
+
+
+def test_publish_csv_and_parquet(sample_csv_handler, tmp_path):
+    pytest.importorskip("pyarrow")
+
+    sample_csv_handler.publish(
+        [str(tmp_path / "final.csv"), str(tmp_path / "final.parquet")]
+    )
+
+    pd.testing.assert_frame_equal(
+        pd.read_parquet(tmp_path / "final.parquet"), sample_csv_handler.df
+    )
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "final.csv"), sample_csv_handler.df
+    )
+
+
+def test_publish_uses_multipart_options_for_s3(sample_csv_handler):
+    mock_fs = MagicMock()
+    mock_fs.protocol = ("s3", "s3a")
+
+    with patch(
+        "fsspec.get_fs_token_paths",
+        return_value=(mock_fs, None, ["bucket/final.csv"]),
+    ):
+        sample_csv_handler.publish(
+            ["s3://bucket/final.csv"], part_size=8 * 1024**2, max_concurrency=6
+        )
+
+    args, kwargs = mock_fs.put_file.call_args
+    assert args[1] == "bucket/final.csv"
+    assert kwargs == {"chunksize": 8 * 1024**2, "max_concurrency": 6}
+
+
+def test_publish_reports_failures_after_other_uploads(sample_csv_handler, tmp_path):
+    failing_fs = MagicMock()
+    failing_fs.protocol = "az"
+    failing_fs.put_file.side_effect = OSError("Access denied")
+    local_path = str(tmp_path / "ok" / "final.csv")
+
+    real_get_fs = __import__("fsspec").get_fs_token_paths
+
+    def get_fs(url):
+        if url.startswith("az://"):
+            return failing_fs, None, ["container/final.csv"]
+        return real_get_fs(url)
+
+    with patch("fsspec.get_fs_token_paths", side_effect=get_fs):
+        with pytest.raises(ValueError, match="Access denied"):
+            sample_csv_handler.publish([local_path, "az://container/final.csv"])
+
+    assert os.path.exists(local_path)
+    assert failing_fs.put_file.call_args.kwargs == {"max_concurrency": 4}
+
+
+def test_csv_handler_records_metrics(instruments_csv, tmp_path):
+    from deta.metrics.metrics import Metrics
+
+    metrics = Metrics()
+    handler = CSVHandler(str(instruments_csv), metrics=metrics)
+    handler.add_a_count_column()
+    handler.add_contains_a_column()
+    handler.write_csv()
+    handler.upload_file("local", str(tmp_path / "final" / "final.csv"))
+
+    stages = metrics.to_dict()["stages"]
+    assert stages["load"]["counters"]["rows"] == 7
+    assert stages["transform"]["calls"] == 2
+    assert stages["transform"]["counters"] == {"rows": 14, "columns": 2}
+    assert stages["write"]["counters"]["bytes_out"] == os.path.getsize(instruments_csv)
+    assert stages["upload"]["counters"]["files"] == 1
+
+
+@pytest.fixture
+def low_cardinality_csv(tmp_path):
+    file_path = tmp_path / "low_cardinality.csv"
+    file_path.write_text(
+        "FinInstrmGnlAttrbts.Id,FinInstrmGnlAttrbts.FullNm,"
+        "FinInstrmGnlAttrbts.CmmdtyDerivInd,FinInstrmGnlAttrbts.NtnlCcy,Issr\n"
+        "ID1,Alpha,false,EUR,X\n"
+        "ID2,Beta,true,,Y\n"
+        "ID3,Gamma,false,EUR,X\n"
+    )
+    return file_path
+
+
+def test_read_csv_loads_low_cardinality_columns_as_categories(low_cardinality_csv):
+    handler = CSVHandler(str(low_cardinality_csv))
+
+    assert handler.df["Issr"].dtype == "category"
+    assert handler.df["FinInstrmGnlAttrbts.NtnlCcy"].dtype == "category"
+    assert list(handler.df["Issr"].cat.categories) == ["X", "Y"]
+    assert handler.df["FinInstrmGnlAttrbts.FullNm"].dtype == object
+    assert CSVHandler(str(low_cardinality_csv), dtypes={}).df["Issr"].dtype == object
+
+
+def test_categorical_columns_are_written_unchanged(low_cardinality_csv, tmp_path):
+    outputs = []
+    for dtypes in (None, {}):
+        handler = CSVHandler(str(low_cardinality_csv), dtypes=dtypes)
+        handler.add_a_count_column()
+        path = tmp_path / "out" / f"result-{len(outputs)}.csv"
+        handler.upload_file("local", str(path))
+        outputs.append(path.read_text())
+
+    assert outputs[0] == outputs[1]
+    assert outputs[0].splitlines()[1:] == ["ID1,Alpha,False,EUR,X,1",
+                                           "ID2,Beta,True,,Y,1",
+                                           "ID3,Gamma,False,EUR,X,2"]  # fmt: skip
+
+
+def test_chunked_parquet_with_categories_differing_between_chunks(tmp_path):
+    pytest.importorskip("pyarrow")
+    file_path = tmp_path / "instruments.csv"
+    pd.DataFrame(
+        {
+            "FinInstrmGnlAttrbts.FullNm": ["Alpha", "Beta"] + ["Gamma"] * 300,
+            "Issr": [None, None] + [f"ISSUER{i}" for i in range(300)],
+        }
+    ).to_csv(file_path, index=False)
+
+    handler = CSVHandler(str(file_path), chunksize=2)
+    assert all(chunk["Issr"].dtype == "category" for chunk in handler.iter_chunks())
+    handler.add_a_count_column()
+    handler.upload_file("local", str(tmp_path / "out" / "result.parquet"))
+
+    result = pd.read_parquet(tmp_path / "out" / "result.parquet")
+    assert result["Issr"].isna().tolist() == [True, True] + [False] * 300
+    assert result["Issr"].iloc[-1] == "ISSUER299"
+    assert result["a_count"].sum() == 1 + 1 + 2 * 300
+
+
+@pytest.mark.parametrize("extension", [".gz", ".zst"])
+def test_read_compressed_csv(instruments_csv, tmp_path, extension):
+    from deta.writers.compression import open_compressed
+
+    path = str(tmp_path / f"instruments.csv{extension}")
+    with open_compressed(path, "wb") as f:
+        f.write(instruments_csv.read_bytes())
+
+    expected = CSVHandler(str(instruments_csv)).df
+    pd.testing.assert_frame_equal(CSVHandler(path).df, expected)
+    chunks = list(CSVHandler(path, chunksize=3).iter_chunks())
+    assert len(chunks) == 3
+    assert pd.concat(chunks, ignore_index=True).astype(str).equals(expected.astype(str))
+
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_write_compressed_csv(instruments_csv, tmp_path, chunksize):
+    from deta.writers.compression import open_compressed
+
+    path = tmp_path / "instruments.csv.zst"
+    with open_compressed(str(path), "wb") as f:
+        f.write(instruments_csv.read_bytes())
+
+    handler = CSVHandler(str(path), chunksize=chunksize)
+    handler.add_a_count_column()
+    handler.write_csv()
+
+    with open_compressed(str(path)) as f:
+        df = pd.read_csv(f)
+    expected = CSVHandler(str(instruments_csv))
+    expected.add_a_count_column()
+    assert df["a_count"].tolist() == expected.df["a_count"].tolist()
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_upload_and_publish_compressed_csv(sample_csv_handler, tmp_path):
+    import fsspec
+
+    sample_csv_handler.upload_file("local", str(tmp_path / "local" / "final.csv.gz"))
+    sample_csv_handler.publish(
+        [
+            str(tmp_path / "final.csv"),
+            str(tmp_path / "final.csv.gz"),
+            "memory://compressed/final.csv.gz",
+        ]
+    )
+
+    for path in ("local/final.csv.gz", "final.csv.gz"):
+        pd.testing.assert_frame_equal(
+            pd.read_csv(tmp_path / path), sample_csv_handler.df
+        )
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "final.csv"), sample_csv_handler.df
+    )
+    assert (
+        fsspec.filesystem("memory").cat("/compressed/final.csv.gz")
+        == (tmp_path / "final.csv.gz").read_bytes()
+    )
+
+
+@patch("fsspec.get_fs_token_paths")
+def test_upload_s3_compressed_opens_binary_file(mock_fs_token, sample_csv_handler):
+    import gzip
+    import io
+
+    uploaded = io.BytesIO()
+    uploaded.close = lambda: None
+    mock_fs = MagicMock()
+    mock_fs.open.return_value.__enter__.return_value = uploaded
+    mock_fs_token.return_value = (mock_fs, None, ["mock/path.csv.gz"])
+
+    sample_csv_handler.upload_file(
+        destination_type="s3", destination_path="mock-bucket/test.csv.gz"
+    )
+
+    mock_fs.open.assert_called_once_with("s3://mock-bucket/test.csv.gz", "wb")
+    df = pd.read_csv(io.BytesIO(gzip.decompress(uploaded.getvalue())))
+    pd.testing.assert_frame_equal(df, sample_csv_handler.df)
@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+from deta.csv_handler.derivations import A_COUNT, CONTAINS_A, derive_columns
+
+
+def test_derive_columns_matches_row_wise_lambdas():
+    names = ["Alpha Asset", "Beta", "Gamma Capital", "", None, "banana", 1.5]
+    df = pd.DataFrame({"FinInstrmGnlAttrbts.FullNm": names})
+
+    expected_count = df["FinInstrmGnlAttrbts.FullNm"].apply(
+        lambda x: str(x).count("a") if pd.notna(x) else 0
+    )
+    expected_flag = expected_count.apply(lambda x: "YES" if x > 0 else "NO")
+
+    derive_columns(df, [A_COUNT, CONTAINS_A])
+
+    pd.testing.assert_series_equal(df["a_count"], expected_count, check_names=False)
+    pd.testing.assert_series_equal(df["contains_a"], expected_flag, check_names=False)
+
+
+def test_derive_columns_other_operations():
+    df = pd.DataFrame({"name": ["ab.c", None, "xyz"], "n": [3, 0, 5]})
+
+    derive_columns(
+        df,
+        [
+            {"name": "dots", "op": "count", "source": "name", "pattern": "."},
+            {"name": "has_b", "op": "contains", "source": "name", "pattern": "b"},
+            {"name": "len", "op": "length", "source": "name"},
+            {
+                "name": "big",
+                "op": "flag",
+                "source": "n",
+                "threshold": 4,
+                "values": ("Y", "N"),
+            },
+        ],
+    )
+
+    assert df["dots"].tolist() == [1, 0, 0]
+    assert df["has_b"].tolist() == [True, False, False]
+    assert df["len"].tolist() == [4, 0, 3]
+    assert df["big"].tolist() == ["N", "N", "Y"]
+
+
+def test_derive_columns_missing_source():
+    df = pd.DataFrame({"name": ["a"]})
+
+    with pytest.raises(ValueError, match="Column 'other' not found"):
+        derive_columns(df, [{"name": "x", "op": "length", "source": "other"}])
+
+
+def test_derive_columns_invalid_operation():
+    df = pd.DataFrame({"name": ["a"]})
+
+    with pytest.raises(ValueError, match="Invalid derivation"):
+        derive_columns(df, [{"name": "x", "op": "upper", "source": "name"}])
+
+
+def test_derive_columns_on_categorical_source():
+    names = ["ab.c", None, "xyz", "ab.c", "", "xyz"]
+    derivations = [
+        {"name": "dots", "op": "count", "source": "name", "pattern": "."},
+        {"name": "has_b", "op": "contains", "source": "name", "pattern": "b"},
+        {"name": "len", "op": "length", "source": "name"},
+    ]
+
+    expected = derive_columns(pd.DataFrame({"name": names}), derivations)
+    result = derive_columns(
+        pd.DataFrame({"name": pd.Series(names, dtype="category")}), derivations
+    )
+
+    for column in ("dots", "has_b", "len"):
+        pd.testing.assert_series_equal(result[column], expected[column])
+
+
+def test_derive_columns_on_empty_categorical_source():
+    df = pd.DataFrame({"name": pd.Series([None, None], dtype="category")})
+
+    derive_columns(df, [A_COUNT | {"source": "name"}])
+
+    assert df["a_count"].tolist() == [0, 0]
@@ -0,0 +1,173 @@
+import io
+import threading
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+from datetime import date, datetime, timezone, timedelta
+from deta.discovery.discovery import FirdsIndexCrawler, _solr_date
+
+
+def make_doc(file_name, file_type="DLTINS", publication_date="2021-01-19T00:00:00Z"):
+    return (
+        "<doc>"
+        '<str name="checksum">abc</str>'
+        f'<str name="download_link">http://example.com/{file_name}</str>'
+        f'<str name="file_name">{file_name}</str>'
+        f'<str name="file_type">{file_type}</str>'
+        f'<date name="publication_date">{publication_date}</date>'
+        "</doc>"
+    )
+
+
+def make_page(docs, num_found, start=0):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><response>'
+        '<lst name="responseHeader"><int name="status">0</int></lst>'
+        f'<result name="response" numFound="{num_found}" start="{start}">'
+        f"{''.join(docs)}</result></response>"
+    ).encode()
+
+
+class FakeSession:
+    """
+    Serves the pages of an in-memory Solr index, slicing it by start and rows.
+    """
+
+    def __init__(self, docs, failures=None):
+        self.docs = docs
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, params, timeout, stream):
+        start, rows = params["start"], params["rows"]
+        with self.lock:
+            self.calls.append(params)
+            failing = self.failures.get(start, 0)
+            if failing:
+                self.failures[start] = failing - 1
+
+        response = MagicMock()
+        if failing:
+            response.raise_for_status.side_effect = requests.HTTPError("503")
+        response.raw = io.BytesIO(
+            make_page(self.docs[start : start + rows], len(self.docs), start)
+        )
+        return response
+
+
+def test_crawl_fetches_every_page():
+    docs = [make_doc(f"DLTINS_{i:03d}.zip") for i in range(25)]
+    session = FakeSession(docs)
+    crawler = FirdsIndexCrawler(rows=10, max_workers=3, session=session)
+
+    files = crawler.crawl("2021-01-17", "2021-01-19")
+
+    assert sorted(call["start"] for call in session.calls) == [0, 10, 20]
+    assert [f["file_name"] for f in files] == [f"DLTINS_{i:03d}.zip" for i in range(25)]
+    assert files[0] == {
+        "file_name": "DLTINS_000.zip",
+        "file_type": "DLTINS",
+        "download_link": "http://example.com/DLTINS_000.zip",
+        "publication_date": "2021-01-19T00:00:00Z",
+    }
+
+
+def test_crawl_builds_query():
+    session = FakeSession([])
+    crawler = FirdsIndexCrawler(rows=50, session=session)
+
+    assert crawler.crawl("2021-01-17", date(2021, 1, 19), ["DLTINS", "FULINS"]) == []
+
+    (params,) = session.calls
+    assert params["fq"] == [
+        "publication_date:[2021-01-17T00:00:00Z TO 2021-01-19T23:59:59Z]",
+        "file_type:(DLTINS OR FULINS)",
+    ]
+    assert params["rows"] == 50
+    assert params["start"] == 0
+
+
+def test_crawl_deduplicates_filters_and_sorts():
+    docs = [
+        make_doc("DLTINS_b.zip", publication_date="2021-01-18T00:00:00Z"),
+        make_doc("FULINS_a.zip", file_type="FULINS"),
+        make_doc("DLTINS_a.zip", publication_date="2021-01-19T00:00:00Z"),
+        make_doc("DLTINS_b.zip", publication_date="2021-01-18T00:00:00Z"),
+        make_doc("DLTINS_c.zip", publication_date="2021-01-17T00:00:00Z"),
+    ]
+    crawler = FirdsIndexCrawler(rows=2, session=FakeSession(docs))
+
+    files = crawler.crawl("2021-01-17", "2021-01-19")
+
+    assert [(f["file_name"], f["publication_date"]) for f in files] == [
+        ("DLTINS_c.zip", "2021-01-17T00:00:00Z"),
+        ("DLTINS_b.zip", "2021-01-18T00:00:00Z"),
+        ("DLTINS_a.zip", "2021-01-19T00:00:00Z"),
+    ]
+
+
+def test_crawl_keeps_index_order():
+    docs = [
+        make_doc("DLTINS_b.zip", publication_date="2021-01-18T00:00:00Z"),
+        make_doc("DLTINS_a.zip", publication_date="2021-01-19T00:00:00Z"),
+        make_doc("DLTINS_c.zip", publication_date="2021-01-17T00:00:00Z"),
+    ]
+    session = FakeSession(docs)
+    crawler = FirdsIndexCrawler(rows=2, session=session)
+
+    files = crawler.crawl("2021-01-17", "2021-01-19", index_order=True)
+
+    assert [f["file_name"] for f in files] == [
+        "DLTINS_b.zip",
+        "DLTINS_a.zip",
+        "DLTINS_c.zip",
+    ]
+    assert all("sort" not in call for call in session.calls)
+
+
+@patch("deta.discovery.discovery.time.sleep")
+def test_crawl_retries_failed_pages(mock_sleep):
+    docs = [make_doc(f"DLTINS_{i}.zip") for i in range(4)]
+    session = FakeSession(docs, failures={2: 1})
+    crawler = FirdsIndexCrawler(rows=2, retries=2, session=session)
+
+    files = crawler.crawl("2021-01-17", "2021-01-19")
+
+    assert len(files) == 4
+    assert [call["start"] for call in session.calls].count(2) == 2
+    mock_sleep.assert_called_once()
+
+
+@patch("deta.discovery.discovery.time.sleep")
+def test_crawl_raises_after_all_retries(mock_sleep):
+    docs = [make_doc(f"DLTINS_{i}.zip") for i in range(4)]
+    session = FakeSession(docs, failures={2: 3})
+    crawler = FirdsIndexCrawler(rows=2, retries=3, session=session)
+
+    with pytest.raises(requests.HTTPError):
+        crawler.crawl("2021-01-17", "2021-01-19")
+    assert mock_sleep.call_count == 2
+
+
+def test_invalid_rows():
+    with pytest.raises(ValueError, match="rows must be a positive integer"):
+        FirdsIndexCrawler(rows=0)
+
+
+@pytest.mark.parametrize(
+    "value, end_of_day, expected",
+    [
+        ("2021-01-17", False, "2021-01-17T00:00:00Z"),
+        ("2021-01-17", True, "2021-01-17T23:59:59Z"),
+        (date(2021, 1, 17), True, "2021-01-17T23:59:59Z"),
+        ("2021-01-17T12:30:00Z", True, "2021-01-17T12:30:00Z"),
+        (
+            datetime(2021, 1, 17, 12, tzinfo=timezone(timedelta(hours=2))),
+            False,
+            "2021-01-17T10:00:00Z",
+        ),
+    ],
+)
+def test_solr_date(value, end_of_day, expected):
+    assert _solr_date(value, end_of_day=end_of_day) == expected
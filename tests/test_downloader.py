@@ -2,9 +2,62 @@ import pytest
 from unittest.mock import patch, MagicMock
 from deta.downloader.downloader import Downloader
 import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from requests.exceptions import RequestException
 
 
+def make_response(chunks, status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.iter_content.return_value = chunks
+    return response
+
+
+@pytest.fixture
+def flaky_server():
+    """
+    Serves PAYLOAD over HTTP with Range support. The first response drops the
+    connection after DROP_AFTER bytes, as an unreliable upstream would.
+    """
+    payload = bytes(range(256)) * 64
+    drop_after = 4096
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            range_header = self.headers.get("Range")
+            requests_seen.append(range_header)
+            start = int(range_header[6:-1]) if range_header else 0
+            body = payload[start:]
+
+            self.send_response(206 if range_header else 200)
+            if range_header:
+                self.send_header(
+                    "Content-Range",
+                    f"bytes {start}-{len(payload) - 1}/{len(payload)}",
+                )
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+
+            if len(requests_seen) == 1:
+                self.wfile.write(body[:drop_after])
+                self.close_connection = True
+            else:
+                self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/file.zip", payload, requests_seen
+    server.shutdown()
+    server.server_close()
+
+
 def test_download_success(tmp_path):
     """
     Test successful download of a file from a URL.
@@ -12,21 +65,162 @@ def test_download_success(tmp_path):
     url = "https://example.com/file.xml"
     file_path = tmp_path / "downloaded.xml"
 
-    fake_response = MagicMock()
-    fake_response.status_code = 200
-    fake_response.content = b"<xml>hello</xml>"
-    fake_response.raise_for_status = MagicMock()
+    fake_response = make_response([b"<xml>", b"hello", b"</xml>"])
 
-    with patch("requests.get", return_value=fake_response) as mock_get:
+    with patch("requests.Session.get", return_value=fake_response) as mock_get:
         downloader = Downloader()
         result = downloader.download_from_url(url, str(file_path))
 
-        mock_get.assert_called_once_with(url, timeout=10)
+        mock_get.assert_called_once_with(url, timeout=10, stream=True, headers={})
         assert os.path.exists(result)
+        assert not os.path.exists(f"{file_path}.part")
         with open(result, "rb") as f:
             assert f.read() == b"<xml>hello</xml>"
 
 
+def test_download_streams_in_chunks(tmp_path):
+    """
+    Test that the response body is read in chunks of the configured size.
+    """
+    url = "https://example.com/big.zip"
+    file_path = tmp_path / "big.zip"
+    chunks = [b"x" * 4] * 5
+
+    fake_response = make_response(chunks)
+
+    with patch("requests.Session.get", return_value=fake_response):
+        downloader = Downloader(chunk_size=4)
+        downloader.download_from_url(url, str(file_path))
+
+    fake_response.iter_content.assert_called_once_with(chunk_size=4)
+    fake_response.close.assert_called_once()
+    assert file_path.read_bytes() == b"x" * 20
+
+
+def test_download_keeps_partial_file_on_failure(tmp_path):
+    """
+    Test that an interrupted stream keeps the partial file for a later resume.
+    """
+    url = "https://example.com/broken.zip"
+    file_path = tmp_path / "broken.zip"
+
+    def broken_stream(chunk_size):
+        yield b"partial"
+        raise RequestException("Connection reset")
+
+    fake_response = make_response(None)
+    fake_response.iter_content.side_effect = broken_stream
+
+    with patch("requests.Session.get", return_value=fake_response), patch("time.sleep"):
+        downloader = Downloader(retries=1)
+        with pytest.raises(RequestException, match="Connection reset"):
+            downloader.download_from_url(url, str(file_path))
+
+    assert not os.path.exists(file_path)
+    assert (tmp_path / "broken.zip.part").read_bytes() == b"partial"
+
+
+def test_download_resumes_after_dropped_connection(tmp_path, flaky_server):
+    """
+    Test that a retry only requests the bytes missing from the partial file.
+    """
+    url, payload, requests_seen = flaky_server
+    file_path = tmp_path / "file.zip"
+
+    with patch("time.sleep"):
+        Downloader(retries=2, chunk_size=1024).download_from_url(url, str(file_path))
+
+    assert requests_seen == [None, "bytes=4096-"]
+    assert file_path.read_bytes() == payload
+    assert not os.path.exists(f"{file_path}.part")
+
+
+def test_download_resumes_only_if_the_file_is_unchanged(tmp_path):
+    """
+    Test that the validator of the first response is sent as If-Range when
+    resuming, and that a changed file replaces the partial one.
+    """
+    url = "https://example.com/file.zip"
+    file_path = tmp_path / "file.zip"
+
+    def broken_stream(chunk_size):
+        yield b"old-"
+        raise RequestException("Connection reset")
+
+    first = make_response(None, headers={"ETag": '"v1"', "Content-Length": "8"})
+    first.iter_content.side_effect = broken_stream
+    changed = make_response([b"new file"], headers={"ETag": '"v2"'})
+
+    with (
+        patch("requests.Session.get", side_effect=[first, changed]) as mock_get,
+        patch("time.sleep"),
+    ):
+        Downloader(retries=2).download_from_url(url, str(file_path))
+
+    assert mock_get.call_args.kwargs["headers"] == {
+        "Range": "bytes=4-",
+        "Accept-Encoding": "identity",
+        "If-Range": '"v1"',
+    }
+    assert file_path.read_bytes() == b"new file"
+    assert list(tmp_path.iterdir()) == [file_path]
+
+
+def test_download_resume_uses_last_modified_for_weak_etags(tmp_path):
+    """
+    Test that Last-Modified is used as validator when the ETag is weak.
+    """
+    file_path = tmp_path / "file.zip"
+    (tmp_path / "file.zip.part").write_bytes(b"abc")
+    Downloader._save_validator(
+        str(tmp_path / "file.zip.part"),
+        make_response([], headers={"ETag": 'W/"v1"', "Last-Modified": "Mon"}),
+    )
+    rest = make_response(
+        [b"de"], status_code=206, headers={"Content-Range": "bytes 3-4/5"}
+    )
+
+    with patch("requests.Session.get", return_value=rest) as mock_get:
+        Downloader().download_from_url("https://example.com/f", str(file_path))
+
+    assert mock_get.call_args.kwargs["headers"]["If-Range"] == "Mon"
+    assert file_path.read_bytes() == b"abcde"
+    assert not os.path.exists(tmp_path / "file.zip.part.validator")
+
+
+def test_download_fails_when_size_does_not_match(tmp_path):
+    """
+    Test that a body shorter than Content-Length is reported as incomplete.
+    """
+    url = "https://example.com/short.zip"
+    file_path = tmp_path / "short.zip"
+    fake_response = make_response([b"abc"], headers={"Content-Length": "10"})
+
+    with patch("requests.Session.get", return_value=fake_response):
+        downloader = Downloader(retries=1)
+        with pytest.raises(RequestException, match="expected 10"):
+            downloader.download_from_url(url, str(file_path))
+
+    assert not os.path.exists(file_path)
+
+
+def test_download_without_resume_discards_partial_file(tmp_path):
+    """
+    Test that resume=False starts from byte zero even if a partial file exists.
+    """
+    url = "https://example.com/file.zip"
+    file_path = tmp_path / "file.zip"
+    (tmp_path / "file.zip.part").write_bytes(b"stale")
+
+    with patch(
+        "requests.Session.get", return_value=make_response([b"fresh"])
+    ) as mock_get:
+        Downloader().download_from_url(url, str(file_path), resume=False)
+
+    assert mock_get.call_args.kwargs["headers"] == {}
+    assert file_path.read_bytes() == b"fresh"
+
+
 def test_download_retries_on_request_exception():
     """
     Test that the downloader retries on a RequestException.
@@ -34,7 +228,7 @@ def test_download_retries_on_request_exception():
     url = "https://example.com/fail.xml"
 
     with patch(
-        "requests.get", side_effect=RequestException("Network error")
+        "requests.Session.get", side_effect=RequestException("Network error")
     ) as mock_get:
         downloader = Downloader(retries=3)
         with pytest.raises(RequestException, match="Network error"):
@@ -49,10 +243,141 @@ def test_download_fails_on_unexpected_exception():
     url = "https://example.com/fail-hard.xml"
 
     with patch(
-        "requests.get", side_effect=ValueError("Something unexpected")
+        "requests.Session.get", side_effect=ValueError("Something unexpected")
     ) as mock_get:
         downloader = Downloader(retries=3)
         with pytest.raises(ValueError, match="Something unexpected"):
             downloader.download_from_url(url, "irrelevant/path.xml")
         # Should not retry — only 1 attempt
         assert mock_get.call_count == 1
+
+
+def test_downloader_shares_pooled_session():
+    """
+    Test that the session mounts an adapter sized to the configured pool.
+    """
+    downloader = Downloader(pool_size=7)
+    adapter = downloader.session.get_adapter("https://example.com")
+    assert adapter._pool_maxsize == 7
+
+
+def test_download_many_collects_results_and_failures(tmp_path):
+    """
+    Test that a failing url is reported without failing the rest of the batch.
+    """
+    urls = [
+        "https://example.com/files/a.zip",
+        "https://example.com/files/b.zip",
+        "https://example.com/files/broken.zip",
+    ]
+
+    def fake_get(url, timeout, stream, headers):
+        if url.endswith("broken.zip"):
+            raise RequestException("Not found")
+        return make_response([url.encode()])
+
+    downloader = Downloader(retries=1)
+    with patch.object(downloader.session, "get", side_effect=fake_get):
+        results, failures = downloader.download_many(urls, str(tmp_path), max_workers=3)
+
+    assert results == {
+        urls[0]: os.path.join(str(tmp_path), "a.zip"),
+        urls[1]: os.path.join(str(tmp_path), "b.zip"),
+    }
+    assert list(failures) == [urls[2]]
+    assert isinstance(failures[urls[2]], RequestException)
+    assert (tmp_path / "a.zip").read_bytes() == urls[0].encode()
+
+
+def test_download_many_reports_url_without_file_name_as_failure(tmp_path):
+    """
+    Test that a url without a file name fails on its own, without stopping the
+    rest of the batch.
+    """
+    urls = ["https://example.com/", "https://example.com/files/a.zip"]
+    downloader = Downloader(retries=1)
+
+    with patch.object(
+        downloader.session, "get", return_value=make_response([b"a"])
+    ) as mock_get:
+        results, failures = downloader.download_many(urls, str(tmp_path))
+
+    assert results == {urls[1]: os.path.join(str(tmp_path), "a.zip")}
+    assert isinstance(failures[urls[0]], ValueError)
+    assert "Cannot infer a file name" in str(failures[urls[0]])
+    mock_get.assert_called_once()
+
+
+def test_download_many_rejects_urls_with_the_same_file_name(tmp_path):
+    """
+    Test that two urls stored at the same path are rejected before any download
+    starts, instead of writing to the same partial file.
+    """
+    urls = ["https://example.com/a/file.zip", "https://mirror.com/b/file.zip"]
+    downloader = Downloader()
+
+    with patch.object(downloader.session, "get") as mock_get:
+        with pytest.raises(ValueError, match="would both be stored at"):
+            downloader.download_many(urls, str(tmp_path))
+
+    mock_get.assert_not_called()
+    assert list(tmp_path.iterdir()) == []
+
+
+@patch("time.sleep")
+def test_download_records_metrics(mock_sleep, tmp_path):
+    from deta.metrics.metrics import Metrics
+
+    metrics = Metrics()
+    downloader = Downloader(retries=3, metrics=metrics)
+    path = str(tmp_path / "file.zip")
+
+    with patch(
+        "requests.Session.get",
+        side_effect=[
+            RequestException("Connection reset"),
+            make_response([b"abc", b"de"], headers={"Content-Length": "5"}),
+        ],
+    ):
+        downloader.download_from_url("http://example.com/file.zip", path)
+
+    download = metrics.to_dict()["stages"]["download"]
+    assert download["calls"] == 1
+    assert download["counters"] == {"bytes_in": 5, "files": 1, "retries": 1}
+
+
+def test_stream_resumes_after_dropped_connection(flaky_server):
+    """
+    Test that a streamed transfer resumes where it stopped, yielding every byte once.
+    """
+    url, payload, requests_seen = flaky_server
+
+    with patch("time.sleep"):
+        chunks = list(Downloader(retries=2, chunk_size=1024).stream(url))
+
+    assert requests_seen == [None, "bytes=4096-"]
+    assert b"".join(chunks) == payload
+
+
+@patch("time.sleep")
+def test_stream_skips_bytes_sent_again(mock_sleep):
+    """
+    Test that the bytes already yielded are skipped when the server ignores the
+    range request and sends the whole file again.
+    """
+    from deta.metrics.metrics import Metrics
+
+    metrics = Metrics()
+    first = make_response([b"abc", b"de"], headers={"Content-Length": "9"})
+    second = make_response([b"ab", b"cdefg", b"hi"], headers={"Content-Length": "9"})
+
+    with patch("requests.Session.get", side_effect=[first, second]) as mock_get:
+        data = b"".join(Downloader(retries=2, metrics=metrics).stream("http://x/f"))
+
+    assert data == b"abcdefghi"
+    assert mock_get.call_args.kwargs["headers"]["Range"] == "bytes=5-"
+    assert metrics.stages["download"]["counters"] == {
+        "bytes_in": 9,
+        "files": 1,
+        "retries": 1,
+    }
@@ -0,0 +1,226 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from datetime import date
+
+from deta.xml_handler.extractor import (
+    COLUMNS,
+    DEFAULT_SCHEMA,
+    DELTA_SCHEMA,
+    RECORD_TYPE_COLUMN,
+    FieldExtractor,
+    iter_fin_instrm,
+    lxml_etree,
+    resolve_backend,
+)
+
+A = "urn:iso:std:iso:20022:tech:xsd:auth.036.001.02"
+
+RECORDS_XML = f"""<Document xmlns="{A}">
+  <FinInstrmRptgRefDataDltaRpt>
+    <RptHdr><RptgNtty><NCA>FR</NCA></RptgNtty></RptHdr>
+    <FinInstrm>
+      <NewRcrd>
+        <FinInstrmGnlAttrbts>
+          <Id>ID1</Id>
+          <FullNm>First</FullNm>
+          <ShrtNm>Ignored</ShrtNm>
+          <ClssfctnTp>ESVUFR</ClssfctnTp>
+          <NtnlCcy>EUR</NtnlCcy>
+          <CmmdtyDerivInd>false</CmmdtyDerivInd>
+        </FinInstrmGnlAttrbts>
+        <Issr>ISSUER1</Issr>
+        <TradgVnRltdAttrbts><Id>XPAR</Id></TradgVnRltdAttrbts>
+      </NewRcrd>
+    </FinInstrm>
+    <FinInstrm>
+      <TermntdRcrd>
+        <FinInstrmGnlAttrbts><Id>ID2</Id></FinInstrmGnlAttrbts>
+      </TermntdRcrd>
+    </FinInstrm>
+  </FinInstrmRptgRefDataDltaRpt>
+</Document>
+"""
+
+BACKENDS = ["stdlib"] + (["lxml"] if lxml_etree is not None else [])
+
+
+@pytest.fixture
+def records_path(tmp_path):
+    path = tmp_path / "records.xml"
+    path.write_text(RECORDS_XML, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_extract_rows(records_path, backend):
+    extractor = FieldExtractor()
+    rows = [extractor.extract(elem) for elem in iter_fin_instrm(records_path, backend)]
+
+    assert rows == [
+        {
+            "FinInstrmGnlAttrbts.Id": "ID1",
+            "FinInstrmGnlAttrbts.FullNm": "First",
+            "FinInstrmGnlAttrbts.ClssfctnTp": "ESVUFR",
+            "FinInstrmGnlAttrbts.CmmdtyDerivInd": "false",
+            "FinInstrmGnlAttrbts.NtnlCcy": "EUR",
+            "Issr": "ISSUER1",
+        },
+        dict(dict.fromkeys(COLUMNS, ""), **{"FinInstrmGnlAttrbts.Id": "ID2"}),
+    ]
+
+
+def test_extract_matches_findtext(records_path):
+    ns = {"a": A}
+    extractor = FieldExtractor()
+
+    for elem in iter_fin_instrm(records_path, "stdlib"):
+        gnl = elem.find(".//a:FinInstrmGnlAttrbts", ns)
+        expected = {
+            column: gnl.findtext(f"a:{column.split('.')[1]}", default="", namespaces=ns)
+            for column in COLUMNS[:-1]
+        }
+        expected["Issr"] = elem.findtext(".//a:Issr", default="", namespaces=ns)
+        assert extractor.extract(elem) == expected
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_extract_with_schema(records_path, backend):
+    extractor = FieldExtractor(
+        schema={
+            "venue": "TradgVnRltdAttrbts/Id",
+            "id": "FinInstrmGnlAttrbts/Id",
+            "derivative": {
+                "path": "FinInstrmGnlAttrbts/CmmdtyDerivInd",
+                "type": "bool",
+            },
+            "record_id": "NewRcrd/FinInstrmGnlAttrbts/Id",
+        }
+    )
+    rows = [extractor.extract(elem) for elem in iter_fin_instrm(records_path, backend)]
+
+    assert extractor.columns == ["venue", "id", "derivative", "record_id"]
+    assert extractor.types["derivative"] == "bool"
+    assert rows == [
+        {"venue": "XPAR", "id": "ID1", "derivative": False, "record_id": "ID1"},
+        {"venue": "", "id": "ID2", "derivative": None, "record_id": ""},
+    ]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_extract_record_type(records_path, backend):
+    extractor = FieldExtractor(schema=DELTA_SCHEMA)
+    rows = [extractor.extract(elem) for elem in iter_fin_instrm(records_path, backend)]
+
+    assert extractor.columns == COLUMNS + [RECORD_TYPE_COLUMN]
+    assert [
+        (row["FinInstrmGnlAttrbts.Id"], row[RECORD_TYPE_COLUMN]) for row in rows
+    ] == [
+        ("ID1", "NewRcrd"),
+        ("ID2", "TermntdRcrd"),
+    ]
+    assert rows[0]["Issr"] == "ISSUER1"
+
+
+def test_extract_casts():
+    elem = ET.fromstring(
+        f"""<FinInstrm xmlns="{A}"><ModfdRcrd>
+          <DebtInstrmAttrbts><TtlIssdNmnlAmt> 1500.5 </TtlIssdNmnlAmt>
+            <MtrtyDt>2030-06-15</MtrtyDt><IntrstRate><Fxd>2</Fxd></IntrstRate>
+          </DebtInstrmAttrbts>
+          <TechAttrbts><PblctnPrd><FrDt>2021-01-19T00:00:00Z</FrDt></PblctnPrd>
+          </TechAttrbts>
+        </ModfdRcrd></FinInstrm>"""
+    )
+    extractor = FieldExtractor(
+        schema={
+            "amount": {"path": "DebtInstrmAttrbts/TtlIssdNmnlAmt", "type": "float"},
+            "maturity": {"path": "DebtInstrmAttrbts/MtrtyDt", "type": "date"},
+            "rate": {"path": "DebtInstrmAttrbts/IntrstRate/Fxd", "type": "int"},
+            "published": {"path": "TechAttrbts/PblctnPrd/FrDt", "type": "date"},
+        }
+    )
+
+    assert extractor.extract(elem) == {
+        "amount": 1500.5,
+        "maturity": date(2030, 6, 15),
+        "rate": 2,
+        "published": date(2021, 1, 19),
+    }
+
+
+def test_extract_raises_on_bad_value():
+    elem = ET.fromstring(f'<FinInstrm xmlns="{A}"><Amt>abc</Amt></FinInstrm>')
+    extractor = FieldExtractor(schema={"amount": {"path": "Amt", "type": "int"}})
+
+    with pytest.raises(ValueError, match="Cannot convert 'abc' to int"):
+        extractor.extract(elem)
+
+
+def test_extract_takes_first_match_in_document_order():
+    elem = ET.fromstring(
+        f"""<FinInstrm xmlns="{A}">
+          <FinInstrmGnlAttrbts><FullNm>Only name</FullNm></FinInstrmGnlAttrbts>
+          <FinInstrmGnlAttrbts><Id>ID1</Id><FullNm>Other</FullNm></FinInstrmGnlAttrbts>
+        </FinInstrm>"""
+    )
+    extractor = FieldExtractor(
+        schema={"id": "FinInstrmGnlAttrbts/Id", "name": "FinInstrmGnlAttrbts/FullNm"}
+    )
+
+    assert extractor.extract(elem) == {"id": "ID1", "name": "Only name"}
+
+
+@pytest.mark.parametrize(
+    "schema, message",
+    [
+        ({"id": ""}, "Invalid path for column 'id'"),
+        ({"id": "FinInstrmGnlAttrbts//Id"}, "Invalid path for column 'id'"),
+        ({"id": {"type": "int"}}, "Invalid path for column 'id'"),
+        ({"id": {"path": "Id", "type": "decimal"}}, "Unsupported type"),
+    ],
+)
+def test_invalid_schema(schema, message):
+    with pytest.raises(ValueError, match=message):
+        FieldExtractor(schema=schema)
+
+
+def test_default_schema_matches_columns():
+    assert list(DEFAULT_SCHEMA) == COLUMNS
+    assert FieldExtractor().columns == COLUMNS
+
+
+def test_iter_fin_instrm_raises_on_malformed_xml(tmp_path):
+    path = tmp_path / "bad.xml"
+    path.write_text("<Document><FinInstrm></Document>", encoding="utf-8")
+
+    with pytest.raises(ET.ParseError):
+        list(iter_fin_instrm(str(path), "stdlib"))
+
+
+def test_resolve_backend():
+    assert resolve_backend("stdlib") == "stdlib"
+    assert resolve_backend("auto") == ("lxml" if lxml_etree is not None else "stdlib")
+    with pytest.raises(ValueError, match="Unsupported XML backend"):
+        resolve_backend("sax")
+
+
+def test_extract_interns_low_cardinality_values():
+    record = (
+        f'<FinInstrm xmlns="{A}"><NewRcrd><FinInstrmGnlAttrbts>'
+        "<Id>{}</Id><NtnlCcy>{}</NtnlCcy></FinInstrmGnlAttrbts>"
+        "<Issr>ISSUER1</Issr></NewRcrd></FinInstrm>"
+    )
+    currency = "".join(["E", "U", "R", "X"])
+    extractor = FieldExtractor()
+
+    first, second = (
+        extractor.extract(ET.fromstring(record.format(f"ID{i}", currency)))
+        for i in range(2)
+    )
+
+    assert first["FinInstrmGnlAttrbts.NtnlCcy"] == currency
+    assert first["FinInstrmGnlAttrbts.NtnlCcy"] is second["FinInstrmGnlAttrbts.NtnlCcy"]
+    assert first["Issr"] is second["Issr"]
+    assert first["FinInstrmGnlAttrbts.Id"] != second["FinInstrmGnlAttrbts.Id"]
@@ -0,0 +1,100 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from deta.xml_handler.filters import RecordFilter
+
+A = "urn:iso:std:iso:20022:tech:xsd:auth.036.001.02"
+
+
+def make_elem(isin="FR0000000001", clssfctn="ESVUFR", ccy="EUR"):
+    ccy_elem = f"<NtnlCcy>{ccy}</NtnlCcy>" if ccy is not None else ""
+    return ET.fromstring(
+        f"""<FinInstrm xmlns="{A}"><ModfdRcrd><FinInstrmGnlAttrbts>
+          <Id>{isin}</Id><ClssfctnTp>{clssfctn}</ClssfctnTp>{ccy_elem}
+        </FinInstrmGnlAttrbts></ModfdRcrd></FinInstrm>"""
+    )
+
+
+@pytest.mark.parametrize(
+    "spec, kept, dropped",
+    [
+        (
+            {"path": "FinInstrmGnlAttrbts/Id", "op": "eq", "value": "FR0000000001"},
+            make_elem(),
+            make_elem(isin="DE0000000002"),
+        ),
+        (
+            {
+                "path": "FinInstrmGnlAttrbts/NtnlCcy",
+                "op": "in",
+                "values": ["EUR", "USD"],
+            },
+            make_elem(ccy="USD"),
+            make_elem(ccy="GBP"),
+        ),
+        (
+            {
+                "path": "FinInstrmGnlAttrbts/ClssfctnTp",
+                "op": "startswith",
+                "value": "ES",
+            },
+            make_elem(),
+            make_elem(clssfctn="DBFTFB"),
+        ),
+        (
+            {
+                "path": "FinInstrmGnlAttrbts/ClssfctnTp",
+                "op": "startswith",
+                "values": ["DB", "FF"],
+            },
+            make_elem(clssfctn="FFICSX"),
+            make_elem(),
+        ),
+    ],
+)
+def test_record_filter_operations(spec, kept, dropped):
+    record_filter = RecordFilter([spec])
+
+    assert record_filter.matches(kept)
+    assert not record_filter.matches(dropped)
+
+
+def test_record_filter_requires_every_filter():
+    record_filter = RecordFilter(
+        [
+            {
+                "path": "FinInstrmGnlAttrbts/ClssfctnTp",
+                "op": "startswith",
+                "value": "E",
+            },
+            {"path": "FinInstrmGnlAttrbts/NtnlCcy", "op": "eq", "value": "EUR"},
+        ]
+    )
+
+    assert record_filter.matches(make_elem())
+    assert not record_filter.matches(make_elem(ccy="USD"))
+    assert not record_filter.matches(make_elem(clssfctn="DBFTFB"))
+
+
+def test_record_filter_missing_element_never_matches():
+    record_filter = RecordFilter(
+        [{"path": "FinInstrmGnlAttrbts/NtnlCcy", "op": "in", "values": [""]}]
+    )
+
+    assert not record_filter.matches(make_elem(ccy=None))
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        {"path": "FinInstrmGnlAttrbts/Id", "op": "like", "value": "FR%"},
+        {"op": "eq", "value": "FR0000000001"},
+        {"path": "FinInstrmGnlAttrbts/Id", "op": "eq"},
+        {"path": "FinInstrmGnlAttrbts/Id", "op": "in", "values": "FR0000000001"},
+        {"path": "FinInstrmGnlAttrbts/Id", "op": "in", "values": []},
+    ],
+)
+def test_invalid_filter(spec):
+    with pytest.raises(ValueError, match="Invalid filter"):
+        RecordFilter([spec])
@@ -0,0 +1,81 @@
+import json
+import re
+import subprocess
+import sys
+
+import pytest
+
+# Importing the CLI must stay well below the ~0.5s pandas alone takes to import.
+IMPORT_BUDGET_SECONDS = 0.3
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "fsspec", "requests", "zstandard"]
+
+
+def run_python(code: str, *options: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "deta.main",
+        "deta.csv_handler.csv_handler",
+        "deta.xml_handler.xml_handler",
+        "deta.xml_handler.streaming",
+        "deta.downloader.downloader",
+    ],
+)
+def test_import_does_not_load_heavy_dependencies(module):
+    result = run_python(
+        f"import json, sys, {module}; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+
+    assert json.loads(result.stdout) == []
+
+
+def test_import_time_of_main_is_within_budget():
+    seconds = []
+    for _ in range(3):
+        result = run_python("import deta.main", "-X", "importtime")
+        match = re.search(r"\|\s*(\d+) \| deta\.main$", result.stderr, re.MULTILINE)
+        assert match, result.stderr[-2000:]
+        seconds.append(int(match.group(1)) / 1e6)
+
+    assert min(seconds) < IMPORT_BUDGET_SECONDS, f"deta.main imported in {seconds}"
+
+
+def test_heavy_dependencies_load_when_needed(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("a,b\n1,x\n")
+
+    result = run_python(
+        "import json, sys\n"
+        "from deta.downloader.downloader import Downloader\n"
+        "from deta.csv_handler.csv_handler import CSVHandler\n"
+        "downloader = Downloader()\n"
+        "loaded = ['requests' in sys.modules]\n"
+        "downloader.session\n"
+        "loaded.append('requests' in sys.modules)\n"
+        f"CSVHandler({str(path)!r})\n"
+        "loaded.append('pandas' in sys.modules)\n"
+        "print(json.dumps(loaded))"
+    )
+
+    assert json.loads(result.stdout) == [False, True, True]
+
+
+def test_incomplete_download_error_is_still_a_request_exception():
+    import requests
+
+    from deta.downloader import downloader
+    from deta.downloader.downloader import IncompleteDownloadError
+
+    assert issubclass(IncompleteDownloadError, requests.RequestException)
+    assert downloader.IncompleteDownloadError is IncompleteDownloadError
+    with pytest.raises(AttributeError):
+        downloader.missing
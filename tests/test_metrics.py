@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from deta.metrics import metrics as metrics_module
+from deta.metrics.metrics import Metrics, peak_rss_bytes
+
+
+def test_stage_records_time_and_counters():
+    metrics = Metrics(run_id="run-1")
+
+    with metrics.stage("download") as stage:
+        stage.add("bytes_in", 100)
+        stage.add("retries")
+    with metrics.stage("download") as stage:
+        stage.add("bytes_in", 50)
+
+    report = metrics.to_dict()
+    assert report["run_id"] == "run-1"
+    download = report["stages"]["download"]
+    assert download["calls"] == 2
+    assert download["seconds"] >= 0
+    assert download["counters"] == {"bytes_in": 150, "retries": 1}
+    assert download["peak_rss_growth_bytes"] >= 0
+    assert report["peak_rss_bytes"] == pytest.approx(peak_rss_bytes(), rel=0.5)
+
+
+def test_stage_memory_is_the_growth_of_the_peak(monkeypatch):
+    peak = {"bytes": 100}
+    monkeypatch.setattr(metrics_module, "peak_rss_bytes", lambda: peak["bytes"])
+    metrics = Metrics()
+
+    with metrics.stage("parse"):
+        peak["bytes"] = 300
+    with metrics.stage("write"):
+        pass
+
+    report = metrics.to_dict()
+    assert report["stages"]["parse"]["peak_rss_growth_bytes"] == 200
+    assert report["stages"]["write"]["peak_rss_growth_bytes"] == 0
+    assert report["peak_rss_bytes"] == 300
+
+
+def test_merge_keeps_the_highest_peaks():
+    metrics = Metrics()
+    worker = {"calls": 1, "seconds": 1.0, "peak_rss_growth_bytes": 5, "counters": {}}
+
+    metrics.merge({"parse": worker}, peak_rss_bytes=2**50)
+    metrics.merge({"parse": dict(worker, peak_rss_growth_bytes=3)})
+
+    report = metrics.to_dict()
+    assert report["stages"]["parse"]["peak_rss_growth_bytes"] == 5
+    assert report["stages"]["parse"]["calls"] == 2
+    assert report["peak_rss_bytes"] == 2**50
+
+
+def test_stage_counts_errors():
+    metrics = Metrics()
+
+    with pytest.raises(RuntimeError):
+        with metrics.stage("parse") as stage:
+            stage.add("rows", 3)
+            raise RuntimeError("boom")
+
+    assert metrics.to_dict()["stages"]["parse"]["counters"] == {"rows": 3, "errors": 1}
+
+
+def test_write_json(tmp_path):
+    metrics = Metrics()
+    with metrics.stage("upload") as stage:
+        stage.add("bytes_out", 10)
+
+    path = metrics.write_json(str(tmp_path / "metrics" / "run.json"))
+
+    report = json.loads(open(path).read())
+    assert report["stages"]["upload"]["counters"]["bytes_out"] == 10
+    assert not (tmp_path / "metrics" / "run.json.tmp").exists()
+
+
+def test_write_prometheus(tmp_path):
+    metrics = Metrics()
+    with metrics.stage("parse") as stage:
+        stage.add("rows", 1500000)
+    with metrics.stage("download") as stage:
+        stage.add("retries", 2)
+
+    path = metrics.write_prometheus(str(tmp_path / "deta.prom"))
+    lines = open(path).read().splitlines()
+
+    assert "# TYPE deta_stage_duration_seconds gauge" in lines
+    assert 'deta_stage_calls{stage="download"} 1' in lines
+    assert 'deta_stage_rows{stage="parse"} 1500000' in lines
+    assert 'deta_stage_retries{stage="download"} 2' in lines
+    assert any(line.startswith("deta_run_wall_seconds ") for line in lines)
+    assert any(line.startswith("deta_process_peak_rss_bytes ") for line in lines)
+    assert not any("stage_peak_rss_bytes" in line for line in lines)
+    samples = [line for line in lines if not line.startswith("#")]
+    assert all(len(line.split(" ")) == 2 for line in samples)
@@ -0,0 +1,147 @@
+import os
+
+import fsspec
+import pandas as pd
+import pytest
+
+from deta.csv_handler.csv_handler import CSVHandler
+from deta.writers.partitioned import DEFAULT_PARTITION, PartitionedWriter
+
+CCY = "FinInstrmGnlAttrbts.NtnlCcy"
+CFI = "FinInstrmGnlAttrbts.ClssfctnTp"
+COLUMNS = ["FinInstrmGnlAttrbts.Id", CFI, CCY]
+ROWS = [
+    {"FinInstrmGnlAttrbts.Id": "ID0", CFI: "ESVUFR", CCY: "EUR"},
+    {"FinInstrmGnlAttrbts.Id": "ID1", CFI: "DBFTFB", CCY: "EUR"},
+    {"FinInstrmGnlAttrbts.Id": "ID2", CFI: "ESVUFR", CCY: "USD"},
+    {"FinInstrmGnlAttrbts.Id": "ID3", CFI: "EMXXXX", CCY: "EUR"},
+    {"FinInstrmGnlAttrbts.Id": "ID4", CFI: "", CCY: "A/B"},
+]
+
+
+def read_dataset(root) -> pd.DataFrame:
+    frames = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            frames.append(pd.read_csv(os.path.join(directory, name), dtype=str))
+    return pd.concat(frames).fillna("").sort_values(COLUMNS[0], ignore_index=True)
+
+
+def test_rows_are_split_by_currency_and_cfi_class(tmp_path):
+    root = tmp_path / "dataset"
+
+    with PartitionedWriter(str(root), COLUMNS, batch_size=2, write_id="w") as writer:
+        for row in ROWS:
+            writer.write(row)
+
+    assert writer.rows_written == 5
+    assert sorted(
+        os.path.relpath(os.path.join(d, f), root)
+        for d, _, files in os.walk(root)
+        for f in files
+    ) == [
+        f"currency=A%2FB/cfi_class={DEFAULT_PARTITION}/part-w-00000.csv",
+        "currency=EUR/cfi_class=D/part-w-00000.csv",
+        "currency=EUR/cfi_class=E/part-w-00000.csv",
+        "currency=USD/cfi_class=E/part-w-00000.csv",
+    ]
+    pd.testing.assert_frame_equal(read_dataset(root), pd.DataFrame(ROWS))
+    assert writer.bytes_written == sum(os.path.getsize(path) for path in writer.files)
+
+
+def test_least_recently_used_file_is_closed(tmp_path):
+    rows = [
+        {"FinInstrmGnlAttrbts.Id": f"ID{i}", CFI: "ESVUFR", CCY: ccy}
+        for i, ccy in enumerate(["EUR", "USD", "EUR", "GBP", "USD", "EUR"])
+    ]
+    writer = PartitionedWriter(
+        str(tmp_path),
+        COLUMNS,
+        partitions=[{"name": "ccy", "column": CCY}],
+        max_open_files=2,
+    )
+
+    for row in rows:
+        writer.write_frame(pd.DataFrame([row]))
+        assert len(writer._handles) <= 2
+    writer.close()
+
+    # GBP evicts USD, the least recently used, USD evicts EUR and EUR evicts GBP,
+    # and every partition written again gets a new part file.
+    assert writer.evictions == 3
+    assert [os.path.relpath(path, tmp_path)[:9] for path in writer.files] == [
+        "ccy=EUR/p",
+        "ccy=USD/p",
+        "ccy=GBP/p",
+        "ccy=USD/p",
+        "ccy=EUR/p",
+    ]
+    assert len(read_dataset(tmp_path)) == 6
+
+
+def test_fsspec_destination_with_compression():
+    memory = fsspec.filesystem("memory")
+
+    with PartitionedWriter(
+        "memory://lake/instruments", COLUMNS, compression="gzip", write_id="w"
+    ) as writer:
+        writer.write_frame(pd.DataFrame(ROWS))
+
+    path = "/lake/instruments/currency=USD/cfi_class=E/part-w-00000.csv.gz"
+    with memory.open(path, "rb") as f:
+        df = pd.read_csv(f, compression="gzip")
+    assert df["FinInstrmGnlAttrbts.Id"].tolist() == ["ID2"]
+    assert len(writer.files) == 4
+
+
+def test_dataset_is_readable_with_hive_partitioning(tmp_path):
+    ds = pytest.importorskip("pyarrow.dataset")
+    with PartitionedWriter(str(tmp_path), COLUMNS) as writer:
+        writer.write_frame(pd.DataFrame(ROWS[:4]))
+
+    dataset = ds.dataset(str(tmp_path), format="csv", partitioning="hive")
+    table = dataset.to_table(filter=ds.field("currency") == "EUR")
+
+    assert sorted(table.column("FinInstrmGnlAttrbts.Id").to_pylist()) == [
+        "ID0",
+        "ID1",
+        "ID3",
+    ]
+
+
+def test_invalid_partitions(tmp_path):
+    with pytest.raises(ValueError, match="Partition column not found"):
+        PartitionedWriter(str(tmp_path), ["a"])
+    with pytest.raises(ValueError, match="Invalid partition"):
+        PartitionedWriter(str(tmp_path), ["a"], partitions=[{"column": "a"}])
+    with pytest.raises(ValueError, match="max_open_files"):
+        PartitionedWriter(str(tmp_path), COLUMNS, max_open_files=0)
+
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_csv_handler_upload_partitioned(tmp_path, chunksize):
+    csv_path = tmp_path / "instruments.csv"
+    pd.DataFrame(ROWS).to_csv(csv_path, index=False)
+    handler = CSVHandler(str(csv_path), chunksize=chunksize)
+
+    files = handler.upload_partitioned(str(tmp_path / "out"))
+
+    assert len(files) == 4
+    pd.testing.assert_frame_equal(read_dataset(tmp_path / "out"), pd.DataFrame(ROWS))
+    assert handler.metrics.stages["upload"]["counters"]["rows"] == 5
+
+
+def test_xml_handler_convert_to_partitioned(tmp_path):
+    from tests.test_xml_handler import write_many_records_xml
+    from deta.xml_handler.xml_handler import XMLHandler
+
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 30)
+
+    handler = XMLHandler(str(xml_path))
+    root = handler.convert_to_partitioned(str(tmp_path / "out"), batch_size=7)
+
+    assert root == str(tmp_path / "out")
+    assert sorted(os.listdir(tmp_path / "out")) == ["currency=EUR", "currency=USD"]
+    assert len(read_dataset(tmp_path / "out")) == 31
+    assert handler.metrics.stages["parse"]["counters"]["rows"] == 31
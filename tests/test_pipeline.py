@@ -0,0 +1,209 @@
+import json
+import os
+import zipfile
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from deta.cache.cache import file_sha256
+from deta.pipeline.pipeline import Pipeline
+from deta.store.store import InstrumentStore
+
+
+def make_pipeline(tmp_path, calls, fail_on=None):
+    source = tmp_path / "source.txt"
+    if not source.exists():
+        source.write_text("hello")
+
+    def read(context):
+        calls.append("read")
+        out = tmp_path / "read.txt"
+        out.write_text(open(context["source"]).read().upper())
+        return {"read_path": str(out)}
+
+    def write(context):
+        calls.append("write")
+        if fail_on == "write":
+            raise RuntimeError("disk full")
+        out = tmp_path / "final.txt"
+        out.write_text(open(context["read_path"]).read() + context["suffix"])
+        return {"final_path": str(out)}
+
+    pipeline = (
+        Pipeline(str(tmp_path / "manifest.json"))
+        .add_stage("read", read, inputs=["source"], outputs=["read_path"])
+        .add_stage(
+            "write", write, inputs=["read_path", "suffix"], outputs=["final_path"]
+        )
+    )
+    return pipeline, {"source": str(source), "suffix": "!"}
+
+
+def test_run_records_manifest(tmp_path):
+    calls = []
+    pipeline, context = make_pipeline(tmp_path, calls)
+
+    result = pipeline.run(context)
+
+    assert calls == ["read", "write"]
+    assert open(result["final_path"]).read() == "HELLO!"
+    manifest = json.load(open(tmp_path / "manifest.json"))["stages"]
+    assert manifest["write"]["results"] == {"final_path": result["final_path"]}
+    assert manifest["write"]["outputs"] == {
+        result["final_path"]: file_sha256(result["final_path"])
+    }
+
+
+def test_rerun_skips_unchanged_stages(tmp_path):
+    calls = []
+    pipeline, context = make_pipeline(tmp_path, calls)
+    pipeline.run(context)
+
+    calls.clear()
+    pipeline, context = make_pipeline(tmp_path, calls)
+    result = pipeline.run(context)
+
+    assert calls == []
+    assert result["final_path"] == str(tmp_path / "final.txt")
+
+
+def test_rerun_when_input_content_changes(tmp_path):
+    calls = []
+    pipeline, context = make_pipeline(tmp_path, calls)
+    pipeline.run(context)
+
+    (tmp_path / "source.txt").write_text("bye")
+    calls.clear()
+    pipeline.run(context)
+
+    assert calls == ["read", "write"]
+    assert (tmp_path / "final.txt").read_text() == "BYE!"
+
+
+def test_rerun_when_parameter_changes(tmp_path):
+    calls = []
+    pipeline, context = make_pipeline(tmp_path, calls)
+    pipeline.run(context)
+
+    calls.clear()
+    pipeline.run(dict(context, suffix="?"))
+
+    assert calls == ["write"]
+
+
+def test_rerun_when_output_is_modified(tmp_path):
+    calls = []
+    pipeline, context = make_pipeline(tmp_path, calls)
+    pipeline.run(context)
+
+    (tmp_path / "final.txt").write_text("tampered")
+    os.remove(tmp_path / "read.txt")
+    calls.clear()
+    pipeline.run(context)
+
+    assert calls == ["read", "write"]
+    assert (tmp_path / "final.txt").read_text() == "HELLO!"
+
+
+def test_failed_stage_keeps_previous_ones(tmp_path):
+    calls = []
+    pipeline, context = make_pipeline(tmp_path, calls, fail_on="write")
+    with pytest.raises(RuntimeError, match="disk full"):
+        pipeline.run(context)
+
+    calls.clear()
+    pipeline, context = make_pipeline(tmp_path, calls)
+    pipeline.run(context)
+
+    assert calls == ["write"]
+
+
+def test_resume_from_stage(tmp_path):
+    calls = []
+    pipeline, context = make_pipeline(tmp_path, calls)
+    pipeline.run(context)
+
+    calls.clear()
+    (tmp_path / "source.txt").write_text("ignored")
+    pipeline.run(context, resume_from="write")
+
+    assert calls == ["write"]
+    assert (tmp_path / "final.txt").read_text() == "HELLO!"
+
+
+def test_resume_requires_recorded_stages(tmp_path):
+    pipeline, context = make_pipeline(tmp_path, [])
+
+    with pytest.raises(ValueError, match="stage 'read' has no recorded results"):
+        pipeline.run(context, resume_from="write")
+    with pytest.raises(ValueError, match="Unknown stage to resume from: upload"):
+        pipeline.run(context, resume_from="upload")
+
+
+def test_force_runs_every_stage(tmp_path):
+    calls = []
+    pipeline, context = make_pipeline(tmp_path, calls)
+    pipeline.run(context)
+
+    calls.clear()
+    pipeline.run(context, force=True)
+
+    assert calls == ["read", "write"]
+
+
+def test_duplicate_stage(tmp_path):
+    pipeline = Pipeline(str(tmp_path / "manifest.json")).add_stage("a", dict)
+
+    with pytest.raises(ValueError, match="Stage 'a' is already defined"):
+        pipeline.add_stage("a", dict)
+
+
+def test_corrupted_manifest_is_ignored(tmp_path):
+    (tmp_path / "manifest.json").write_text("{not json")
+
+    assert Pipeline(str(tmp_path / "manifest.json")).manifest == {}
+
+
+def test_main_pipeline_skips_completed_stages(tmp_path, monkeypatch):
+    from deta.main import main
+
+    xml = (
+        '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:auth.036.001.02">'
+        "<FinInstrm><ModfdRcrd><FinInstrmGnlAttrbts><Id>ID1</Id>"
+        "<FullNm>Banana</FullNm></FinInstrmGnlAttrbts><Issr>I</Issr>"
+        "</ModfdRcrd></FinInstrm></Document>"
+    )
+
+    def fake_download(self, url, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with zipfile.ZipFile(path, "w") as zipf:
+            zipf.writestr("DLTINS.xml", xml)
+        return path
+
+    files = [{"download_link": f"http://example.com/{i}.zip"} for i in range(2)]
+    monkeypatch.chdir(tmp_path)
+    with (
+        patch(
+            "deta.discovery.discovery.FirdsIndexCrawler.crawl", return_value=files
+        ) as crawl,
+        patch(
+            "deta.downloader.downloader.Downloader.download_from_url",
+            autospec=True,
+            side_effect=fake_download,
+        ) as download,
+    ):
+        main([])
+        main([])
+        main(["--resume-from", "upload"])
+
+    assert crawl.call_count == 1
+    assert crawl.call_args.kwargs["index_order"] is True
+    assert download.call_count == 1
+    df = pd.read_csv(tmp_path / "data" / "final" / "final.csv")
+    assert df["a_count"].tolist() == [3]
+    assert df["contains_a"].tolist() == ["YES"]
+    with InstrumentStore(str(tmp_path / "data" / "instruments.sqlite")) as store:
+        assert store.count() == 1
+        assert store.get("ID1")["FinInstrmGnlAttrbts.FullNm"] == "Banana"
+    assert (tmp_path / "data" / "metrics" / "run.json").exists()
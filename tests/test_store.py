@@ -0,0 +1,219 @@
+import pandas as pd
+import pytest
+
+from deta.metrics.metrics import Metrics
+from deta.store.store import ID_COLUMN, InstrumentStore
+
+COLUMNS = [ID_COLUMN, "FinInstrmGnlAttrbts.FullNm", "Issr"]
+
+
+def write_delta(path, rows):
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path):
+    with InstrumentStore(str(tmp_path / "store.sqlite"), columns=COLUMNS) as store:
+        yield store
+
+
+def test_apply_delta_inserts_rows(store, tmp_path):
+    delta = write_delta(
+        tmp_path / "delta.csv", [["ID2", "Banana", "I2"], ["ID1", "Apple", "I1"]]
+    )
+
+    assert store.apply_delta(delta) == 2
+    assert store.count() == 2
+    assert store.get("ID1") == {
+        ID_COLUMN: "ID1",
+        "FinInstrmGnlAttrbts.FullNm": "Apple",
+        "Issr": "I1",
+    }
+    assert store.get("ID3") is None
+
+
+def test_apply_delta_upserts_existing_rows(store, tmp_path):
+    store.apply_delta(
+        write_delta(tmp_path / "day1.csv", [["ID1", "Apple", "I1"], ["ID2", "B", "I2"]])
+    )
+
+    applied = store.apply_delta(
+        write_delta(
+            tmp_path / "day2.csv",
+            [["ID2", "Banana", "I2"], ["ID3", "Cherry", "I3"], ["ID2", "Bnn", "I9"]],
+        ),
+        chunksize=1,
+    )
+
+    assert applied == 3
+    assert store.count() == 3
+    assert store.get("ID1")["FinInstrmGnlAttrbts.FullNm"] == "Apple"
+    assert store.get("ID2")["FinInstrmGnlAttrbts.FullNm"] == "Bnn"
+    assert store.get("ID2")["Issr"] == "I9"
+
+
+def test_apply_delta_from_dataframe_fills_missing_columns(store):
+    df = pd.DataFrame({ID_COLUMN: ["ID1", ""], "Issr": ["I1", "I2"]})
+
+    assert store.apply_delta(df) == 1
+    assert store.get("ID1") == {
+        ID_COLUMN: "ID1",
+        "FinInstrmGnlAttrbts.FullNm": "",
+        "Issr": "I1",
+    }
+
+
+def test_apply_delta_without_id_is_rolled_back(store, tmp_path):
+    path = tmp_path / "delta.csv"
+    pd.DataFrame({"Issr": ["I1"]}).to_csv(path, index=False)
+
+    with pytest.raises(ValueError, match="has no"):
+        store.apply_delta(str(path))
+    assert store.count() == 0
+
+
+def test_store_persists_between_instances(tmp_path):
+    db_path = str(tmp_path / "store.sqlite")
+    with InstrumentStore(db_path, columns=COLUMNS) as store:
+        store.apply_delta(write_delta(tmp_path / "d.csv", [["ID1", "Apple", "I1"]]))
+
+    with InstrumentStore(db_path, columns=COLUMNS) as store:
+        assert store.get("ID1")["Issr"] == "I1"
+
+
+def test_get_many(store, tmp_path):
+    store.apply_delta(
+        write_delta(
+            tmp_path / "d.csv",
+            [[f"ID{i}", f"Name{i}", "I"] for i in range(2000)],
+        )
+    )
+
+    df = store.get_many(["ID5", "ID1999", "ID5", "UNKNOWN"] + ["ID7"] * 1000)
+
+    assert df[ID_COLUMN].tolist() == ["ID1999", "ID5", "ID7"]
+    assert df["FinInstrmGnlAttrbts.FullNm"].tolist() == ["Name1999", "Name5", "Name7"]
+    assert store.get_many([]).empty
+
+
+def test_scan_ranges(tmp_path):
+    with InstrumentStore(
+        str(tmp_path / "store.sqlite"), columns=COLUMNS, index_columns=["Issr"]
+    ) as store:
+        store.apply_delta(
+            write_delta(
+                tmp_path / "d.csv",
+                [
+                    ["C", "Cherry", "DB1"],
+                    ["A", "Apple", "EQ"],
+                    ["B", "Banana", "DB2"],
+                    ["D", "Date", "DC"],
+                ],
+            )
+        )
+
+        assert [row[ID_COLUMN] for row in store.scan()] == ["A", "B", "C", "D"]
+        assert [row[ID_COLUMN] for row in store.scan("B", "D", batch_size=1)] == [
+            "B",
+            "C",
+        ]
+        assert [row[ID_COLUMN] for row in store.scan(end="B")] == ["A"]
+        assert [row[ID_COLUMN] for row in store.scan("DB", "DC", column="Issr")] == [
+            "C",
+            "B",
+        ]
+        with pytest.raises(ValueError, match="unknown column"):
+            list(store.scan(column="Unknown"))
+
+
+def test_invalid_columns(tmp_path):
+    with pytest.raises(ValueError, match="must include"):
+        InstrumentStore(str(tmp_path / "a.sqlite"), columns=["Issr"])
+    with pytest.raises(ValueError, match="Cannot index"):
+        InstrumentStore(
+            str(tmp_path / "b.sqlite"), columns=COLUMNS, index_columns=["Unknown"]
+        )
+
+
+def test_apply_delta_records_metrics(tmp_path):
+    metrics = Metrics()
+    with InstrumentStore(
+        str(tmp_path / "store.sqlite"), columns=COLUMNS, metrics=metrics
+    ) as store:
+        store.apply_delta(write_delta(tmp_path / "d.csv", [["ID1", "Apple", "I1"]]))
+
+    assert metrics.stages["store"]["counters"] == {"rows": 1}
+
+
+def test_apply_delta_deletes_cancelled_and_flags_terminated(tmp_path):
+    from deta.xml_handler.extractor import DELTA_SCHEMA, RECORD_TYPE_COLUMN
+    from deta.xml_handler.xml_handler import XMLHandler
+
+    def record(record_type, instrument_id, name):
+        return (
+            f"<FinInstrm><{record_type}><FinInstrmGnlAttrbts><Id>{instrument_id}</Id>"
+            f"<FullNm>{name}</FullNm></FinInstrmGnlAttrbts><Issr>I</Issr>"
+            f"</{record_type}></FinInstrm>"
+        )
+
+    xml_path = tmp_path / "delta.xml"
+    xml_path.write_text(
+        '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:auth.036.001.02">'
+        + record("NewRcrd", "ID1", "Apple")
+        + record("NewRcrd", "ID2", "Banana")
+        + record("NewRcrd", "ID3", "Cherry")
+        + record("CancRcrd", "ID1", "Apple")
+        + record("TermntdRcrd", "ID2", "Banana")
+        + record("CancRcrd", "ID3", "Cherry")
+        + record("ModfdRcrd", "ID3", "Cherry 2")
+        + "</Document>"
+    )
+    csv_path = XMLHandler(str(xml_path), schema=DELTA_SCHEMA).convert_to_csv(
+        str(tmp_path / "delta.csv")
+    )
+    metrics = Metrics()
+
+    with InstrumentStore(str(tmp_path / "store.sqlite"), metrics=metrics) as store:
+        assert store.apply_delta(csv_path, chunksize=4) == 7
+
+        assert store.get("ID1") is None
+        assert store.get("ID2")[RECORD_TYPE_COLUMN] == "TermntdRcrd"
+        assert store.get("ID3")["FinInstrmGnlAttrbts.FullNm"] == "Cherry 2"
+        assert store.count() == 2
+    assert metrics.stages["store"]["counters"] == {"rows": 7, "deleted": 2}
+
+
+def test_store_created_without_a_column_gets_it(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    with InstrumentStore(path, columns=COLUMNS) as store:
+        store.apply_delta(write_delta(tmp_path / "d.csv", [["ID1", "Apple", "I1"]]))
+
+    with InstrumentStore(path, columns=COLUMNS + ["RcrdTp"]) as store:
+        assert store.get("ID1") == {
+            ID_COLUMN: "ID1",
+            "FinInstrmGnlAttrbts.FullNm": "Apple",
+            "Issr": "I1",
+            "RcrdTp": "",
+        }
+
+
+def test_store_reopened_with_other_columns_reads_them_by_name(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    with InstrumentStore(path, columns=[ID_COLUMN, "Issr"]) as store:
+        store.apply_delta(pd.DataFrame({ID_COLUMN: ["ID1"], "Issr": ["I1"]}))
+
+    with InstrumentStore(path, columns=[ID_COLUMN, "Ccy", "Issr"]) as store:
+        store.apply_delta(
+            pd.DataFrame({ID_COLUMN: ["ID2"], "Ccy": ["EUR"], "Issr": ["I2"]})
+        )
+
+    with InstrumentStore(path, columns=["Issr", ID_COLUMN]) as store:
+        assert store.get("ID1") == {"Issr": "I1", ID_COLUMN: "ID1"}
+        assert list(store.scan()) == [
+            {"Issr": "I1", ID_COLUMN: "ID1"},
+            {"Issr": "I2", ID_COLUMN: "ID2"},
+        ]
+        df = store.get_many(["ID2"])
+        assert df.columns.tolist() == ["Issr", ID_COLUMN]
+        assert df.iloc[0].tolist() == ["I2", "ID2"]
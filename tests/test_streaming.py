@@ -0,0 +1,155 @@
+import functools
+import os
+import threading
+import zipfile
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from deta.benchmark.synthetic import write_synthetic_zip
+from deta.downloader.downloader import Downloader
+from deta.metrics.metrics import Metrics
+from deta.xml_handler import streaming
+from deta.xml_handler.streaming import StreamingConverter
+from deta.xml_handler.xml_handler import XMLHandler
+
+
+@pytest.fixture
+def zip_path(tmp_path):
+    return write_synthetic_zip(str(tmp_path / "DLTINS_test.zip"), 2500)
+
+
+@pytest.fixture
+def http_server(zip_path):
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    handler = functools.partial(QuietHandler, directory=os.path.dirname(zip_path))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def expected_csv(zip_path, tmp_path):
+    path = str(tmp_path / "expected.csv")
+    XMLHandler(zip_path).convert_zip_to_csv(zip_path, path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_convert_zip_matches_sequential_conversion(zip_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming, "ROWS_PER_ITEM", 100)
+    output = str(tmp_path / "out" / "streamed.csv")
+    metrics = Metrics()
+
+    converter = StreamingConverter(queue_size=1, metrics=metrics)
+    result = converter.convert_zip(zip_path, output, batch_size=300)
+
+    assert result == output
+    with open(output, "rb") as f:
+        assert f.read() == expected_csv(zip_path, tmp_path)
+    assert converter.stats == {"scanned": 2500, "kept": 2500}
+    stages = metrics.to_dict()["stages"]
+    assert set(stages) == {"read", "inflate", "parse", "write"}
+    assert stages["parse"]["counters"]["rows"] == 2500
+    assert stages["write"]["counters"]["rows"] == 2500
+
+
+def test_convert_url_keeps_downloaded_zip(zip_path, http_server, tmp_path):
+    output = str(tmp_path / "streamed.csv")
+    kept_zip = str(tmp_path / "kept" / "downloaded.zip")
+    metrics = Metrics()
+
+    StreamingConverter(
+        downloader=Downloader(retries=1, chunk_size=4096, metrics=metrics),
+        metrics=metrics,
+    ).convert_url(
+        f"{http_server}/{os.path.basename(zip_path)}", output, zip_path=kept_zip
+    )
+
+    with open(output, "rb") as f:
+        assert f.read() == expected_csv(zip_path, tmp_path)
+    with open(kept_zip, "rb") as downloaded, open(zip_path, "rb") as original:
+        assert downloaded.read() == original.read()
+    assert not os.path.exists(f"{kept_zip}.part")
+    assert metrics.stages["download"]["counters"]["bytes_in"] == os.path.getsize(
+        zip_path
+    )
+
+
+def test_convert_zip_to_parquet_with_filters(zip_path, tmp_path):
+    pytest.importorskip("pyarrow")
+    output = str(tmp_path / "streamed.parquet")
+
+    StreamingConverter(
+        filters=[{"path": "FinInstrmGnlAttrbts/NtnlCcy", "op": "eq", "value": "EUR"}]
+    ).convert_zip(zip_path, output, output_format="parquet")
+
+    df = pd.read_parquet(output)
+    assert len(df) > 0
+    assert set(df["FinInstrmGnlAttrbts.NtnlCcy"]) == {"EUR"}
+
+
+def test_error_in_a_stage_stops_the_others(tmp_path):
+    path = tmp_path / "broken.zip"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr("DLTINS.xml", "<Document><FinInstrm><Id>1</Document>" * 1000)
+
+    with pytest.raises(Exception, match="mismatched tag"):
+        StreamingConverter(backend="stdlib").convert_zip(
+            str(path), str(tmp_path / "out.csv")
+        )
+    assert sorted(os.listdir(tmp_path)) == ["broken.zip"]
+    assert not [t for t in threading.enumerate() if t.name.startswith("deta-")]
+
+
+def test_failure_after_the_last_row_leaves_no_output(zip_path, tmp_path, monkeypatch):
+    iter_zip_member = streaming.iter_zip_member
+
+    def corrupted(raw, member):
+        yield from iter_zip_member(raw, member)
+        raise zipfile.BadZipFile("Bad CRC-32 for file 'DLTINS_test.xml'")
+
+    monkeypatch.setattr(streaming, "iter_zip_member", corrupted)
+    output = tmp_path / "out" / "streamed.csv"
+
+    with pytest.raises(zipfile.BadZipFile, match="Bad CRC-32"):
+        StreamingConverter().convert_zip(zip_path, str(output))
+    assert os.listdir(output.parent) == []
+
+
+def test_missing_member_and_format(zip_path, tmp_path):
+    converter = StreamingConverter()
+
+    with pytest.raises(ValueError, match="other.xml not found"):
+        converter.convert_zip(zip_path, str(tmp_path / "a.csv"), member="other.xml")
+    with pytest.raises(ValueError, match="Unsupported output format"):
+        converter.convert_zip(zip_path, str(tmp_path / "a.json"), output_format="json")
+    with pytest.raises(FileNotFoundError):
+        converter.convert_zip(str(tmp_path / "missing.zip"), str(tmp_path / "a.csv"))
+
+
+def test_main_pipeline_in_streaming_mode(zip_path, tmp_path, monkeypatch):
+    from deta.main import main
+
+    files = [{"download_link": f"http://example.com/{i}.zip"} for i in range(2)]
+    monkeypatch.chdir(tmp_path)
+    with (
+        patch("deta.discovery.discovery.FirdsIndexCrawler.crawl", return_value=files),
+        patch(
+            "deta.downloader.downloader.Downloader.stream",
+            return_value=streaming._read_chunks(zip_path),
+        ) as stream,
+    ):
+        main(["--streaming"])
+
+    stream.assert_called_once_with("http://example.com/1.zip")
+    assert os.path.exists(tmp_path / "data" / "second_url.zip")
+    df = pd.read_csv(tmp_path / "data" / "final" / "final.csv")
+    assert len(df) == 2500
@@ -0,0 +1,117 @@
+import os
+import pandas as pd
+import pytest
+
+from deta.writers.writers import CSVBatchWriter, ParquetBatchWriter
+
+
+def test_csv_batch_writer_flushes_in_batches(tmp_path):
+    path = tmp_path / "out.csv"
+    writer = CSVBatchWriter(str(path), ["a", "b"], batch_size=2)
+
+    writer.write({"a": "1", "b": "x"})
+    assert writer.rows_written == 0
+    writer.write({"a": "2", "b": "y"})
+    assert writer.rows_written == 2
+    writer.write({"a": "3", "b": "z"})
+    writer.close()
+
+    assert writer.rows_written == 3
+    df = pd.read_csv(path)
+    assert df["a"].tolist() == [1, 2, 3]
+    assert df["b"].tolist() == ["x", "y", "z"]
+
+
+def test_csv_batch_writer_matches_single_dataframe(tmp_path):
+    rows = [{"a": f"name, {i}", "b": "" if i % 2 else "v"} for i in range(7)]
+    path = tmp_path / "out.csv"
+
+    with CSVBatchWriter(str(path), ["a", "b"], batch_size=3) as writer:
+        for row in rows:
+            writer.write(row)
+
+    expected = tmp_path / "expected.csv"
+    pd.DataFrame(rows).to_csv(expected, index=False)
+    assert path.read_text() == expected.read_text()
+
+
+def test_csv_batch_writer_writes_header_without_rows(tmp_path):
+    path = tmp_path / "nested" / "empty.csv"
+
+    with CSVBatchWriter(str(path), ["a", "b"]):
+        pass
+
+    assert path.read_text().splitlines() == ["a,b"]
+
+
+def test_csv_batch_writer_rejects_invalid_batch_size(tmp_path):
+    with pytest.raises(ValueError, match="batch_size must be at least 1"):
+        CSVBatchWriter(str(tmp_path / "out.csv"), ["a"], batch_size=0)
+
+
+def test_parquet_batch_writer_row_groups(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "out.parquet"
+
+    with ParquetBatchWriter(
+        str(path), ["a", "b"], row_group_size=2, compression="zstd"
+    ) as writer:
+        for i in range(5):
+            writer.write({"a": str(i), "b": "x"})
+
+    metadata = pq.ParquetFile(path).metadata
+    assert writer.rows_written == 5
+    assert metadata.num_row_groups == 3
+    assert metadata.row_group(0).column(0).compression == "ZSTD"
+    assert pq.read_table(path).column("a").to_pylist() == ["0", "1", "2", "3", "4"]
+
+
+def test_parquet_batch_writer_explicit_types(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    path = tmp_path / "typed.parquet"
+
+    with ParquetBatchWriter(
+        str(path), ["name", "count"], types={"count": pa.int64()}
+    ) as writer:
+        writer.write({"name": "x", "count": 3})
+
+    df = pd.read_parquet(path)
+    assert str(df["count"].dtype) == "int64"
+    assert df.to_dict("records") == [{"name": "x", "count": 3}]
+
+
+@pytest.mark.parametrize("extension", [".gz", ".zst"])
+def test_csv_batch_writer_compresses_by_extension(tmp_path, extension):
+    from deta.writers.compression import open_compressed
+
+    rows = [{"a": str(i), "b": f"name {i}"} for i in range(25)]
+    path = tmp_path / f"out.csv{extension}"
+    expected = tmp_path / "expected.csv"
+
+    for target in (path, expected):
+        with CSVBatchWriter(str(target), ["a", "b"], batch_size=10) as writer:
+            for row in rows:
+                writer.write(row)
+
+    assert writer.compression is None
+    with open_compressed(str(path)) as f:
+        assert f.read() == expected.read_bytes()
+
+
+def test_csv_batch_writer_moves_the_file_into_place_on_close(tmp_path):
+    path = tmp_path / "out.csv"
+
+    with CSVBatchWriter(str(path), ["a"], batch_size=1) as writer:
+        writer.write({"a": "1"})
+        assert os.listdir(tmp_path) == ["out.csv.tmp"]
+
+    assert os.listdir(tmp_path) == ["out.csv"]
+
+
+def test_csv_batch_writer_discards_the_file_on_error(tmp_path):
+    with pytest.raises(RuntimeError):
+        with CSVBatchWriter(str(tmp_path / "out.csv"), ["a"], batch_size=1) as writer:
+            writer.write({"a": "1"})
+            raise RuntimeError("parse error")
+
+    assert os.listdir(tmp_path) == []
@@ -1,3 +1,4 @@
+import gzip
 import pytest
 from deta.xml_handler.xml_handler import XMLHandler
 import zipfile
@@ -169,3 +170,379 @@ def test_convert_to_csv(tmp_path):
     assert row["FinInstrmGnlAttrbts.CmmdtyDerivInd"] == 0
     assert row["FinInstrmGnlAttrbts.NtnlCcy"] == "USD"
     assert row["Issr"] == "Issuer123"
+
+
+def test_convert_zip_to_csv_matches_extracted_conversion(tmp_path):
+    zip_path = tmp_path / "sample.zip"
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr("sample.xml", CSV_XML)
+
+    handler = XMLHandler("dummy.xml")
+    streamed_csv = handler.convert_zip_to_csv(
+        str(zip_path), str(tmp_path / "streamed.csv")
+    )
+
+    extracted_xml = handler.extract_from_zip(str(zip_path), str(tmp_path / "xml"))
+    extracted_csv = XMLHandler(extracted_xml).convert_to_csv(
+        str(tmp_path / "extracted.csv")
+    )
+
+    with open(streamed_csv) as streamed, open(extracted_csv) as extracted:
+        assert streamed.read() == extracted.read()
+
+
+def test_convert_zip_to_csv_with_member(tmp_path):
+    zip_path = tmp_path / "sample.zip"
+    with zipfile.ZipFile(zip_path, "w") as zipf:
+        zipf.writestr("other.xml", "<root/>")
+        zipf.writestr("sample.xml", CSV_XML)
+
+    handler = XMLHandler("dummy.xml")
+    csv_path = handler.convert_zip_to_csv(
+        str(zip_path), str(tmp_path / "out.csv"), member="sample.xml"
+    )
+
+    df = pd.read_csv(csv_path)
+    assert df["FinInstrmGnlAttrbts.Id"].tolist() == ["ABC123"]
+
+
+def test_convert_zip_to_csv_missing_member(tmp_path):
+    zip_path = create_test_zip(tmp_path)
+    handler = XMLHandler("dummy.xml")
+
+    with pytest.raises(ValueError, match="missing.xml not found"):
+        handler.convert_zip_to_csv(
+            str(zip_path), str(tmp_path / "out.csv"), member="missing.xml"
+        )
+
+
+def test_convert_zip_to_csv_file_not_found(tmp_path):
+    handler = XMLHandler("dummy.xml")
+
+    with pytest.raises(FileNotFoundError):
+        handler.convert_zip_to_csv(
+            str(tmp_path / "missing.zip"), str(tmp_path / "out.csv")
+        )
+
+
+def test_convert_to_csv_in_small_batches(tmp_path):
+    records = "".join(
+        f"""
+        <FinInstrm>
+          <NewRcrd>
+            <FinInstrmGnlAttrbts>
+              <Id>ID{i}</Id>
+              <FullNm>Name {i}</FullNm>
+            </FinInstrmGnlAttrbts>
+            <Issr>ISSUER{i}</Issr>
+          </NewRcrd>
+        </FinInstrm>"""
+        for i in range(5)
+    )
+    xml_path = tmp_path / "many.xml"
+    xml_path.write_text(
+        CSV_XML.replace(
+            "<FinInstrmRptgRefDataDltaRpt>",
+            f"<FinInstrmRptgRefDataDltaRpt>{records}",
+        ),
+        encoding="utf-8",
+    )
+
+    handler = XMLHandler(str(xml_path))
+    batched = handler.convert_to_csv(str(tmp_path / "batched.csv"), batch_size=2)
+    single = handler.convert_to_csv(str(tmp_path / "single.csv"), batch_size=100)
+
+    df = pd.read_csv(batched)
+    assert df["FinInstrmGnlAttrbts.Id"].tolist() == [
+        "ID0",
+        "ID1",
+        "ID2",
+        "ID3",
+        "ID4",
+        "ABC123",
+    ]
+    with open(batched) as a, open(single) as b:
+        assert a.read() == b.read()
+
+
+def write_many_records_xml(path, count):
+    records = "".join(
+        f"""
+        <FinInstrm>
+          <ModfdRcrd>
+            <FinInstrmGnlAttrbts>
+              <Id>ID{i:05d}</Id>
+              <FullNm>Name, {i}</FullNm>
+              <ClssfctnTp>ESVUFR</ClssfctnTp>
+              <CmmdtyDerivInd>false</CmmdtyDerivInd>
+              <NtnlCcy>EUR</NtnlCcy>
+            </FinInstrmGnlAttrbts>
+            <Issr>ISSUER{i % 7}</Issr>
+          </ModfdRcrd>
+        </FinInstrm>"""
+        for i in range(count)
+    )
+    path.write_text(
+        CSV_XML.replace(
+            "<FinInstrmRptgRefDataDltaRpt>",
+            f"<FinInstrmRptgRefDataDltaRpt><RptHdr><RptgNtty>X</RptgNtty></RptHdr>"
+            f"{records}",
+        ),
+        encoding="utf-8",
+    )
+
+
+def test_convert_to_csv_parallel_matches_serial(tmp_path):
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 500)
+
+    handler = XMLHandler(str(xml_path))
+    serial = handler.convert_to_csv(str(tmp_path / "serial.csv"))
+    parallel = handler.convert_to_csv(
+        str(tmp_path / "parallel.csv"), batch_size=50, workers=3
+    )
+
+    with open(serial) as a, open(parallel) as b:
+        assert a.read() == b.read()
+    assert len(pd.read_csv(parallel)) == 501
+    assert sorted(os.listdir(tmp_path)) == ["many.xml", "parallel.csv", "serial.csv"]
+
+
+def test_convert_to_compressed_csv_parallel_matches_serial(tmp_path):
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 300)
+
+    handler = XMLHandler(str(xml_path))
+    serial = handler.convert_to_csv(str(tmp_path / "serial.csv"))
+    parallel = handler.convert_to_csv(
+        str(tmp_path / "parallel.csv.gz"), batch_size=50, workers=3
+    )
+
+    with open(serial, "rb") as a, gzip.open(parallel, "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_split_fin_instrm_ranges_cover_every_record(tmp_path):
+    from deta.xml_handler.parallel import split_fin_instrm_ranges
+
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 50)
+    content = xml_path.read_bytes()
+
+    header, ranges = split_fin_instrm_ranges(str(xml_path), 8)
+
+    assert len(ranges) == 8
+    assert header == content[: ranges[0][0]]
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert all(content[start:].startswith(b"<FinInstrm>") for start, _ in ranges)
+    assert content[: ranges[-1][1]].endswith(b"</FinInstrm>")
+
+
+def test_convert_to_csv_parallel_without_records(tmp_path):
+    xml_path = tmp_path / "empty.xml"
+    xml_path.write_text("<root><Other/></root>", encoding="utf-8")
+
+    handler = XMLHandler(str(xml_path))
+    csv_path = handler.convert_to_csv(str(tmp_path / "out.csv"), workers=2)
+
+    df = pd.read_csv(csv_path)
+    assert df.empty
+    assert "Issr" in df.columns
+
+
+def test_convert_to_csv_backends_match(tmp_path):
+    pytest.importorskip("lxml")
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 20)
+
+    stdlib_csv = XMLHandler(str(xml_path), backend="stdlib").convert_to_csv(
+        str(tmp_path / "stdlib.csv")
+    )
+    lxml_csv = XMLHandler(str(xml_path), backend="lxml").convert_to_csv(
+        str(tmp_path / "lxml.csv")
+    )
+
+    with open(stdlib_csv) as a, open(lxml_csv) as b:
+        assert a.read() == b.read()
+
+
+def test_convert_to_parquet_matches_csv(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 30)
+
+    handler = XMLHandler(str(xml_path))
+    parquet_path = handler.convert_to_parquet(
+        str(tmp_path / "out.parquet"), row_group_size=10
+    )
+    csv_path = handler.convert_to_csv(str(tmp_path / "out.csv"))
+
+    assert pq.ParquetFile(parquet_path).metadata.num_row_groups == 4
+    from_parquet = pd.read_parquet(parquet_path)
+    from_csv = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    assert from_parquet.astype(object).equals(from_csv.astype(object))
+
+
+def test_convert_zip_to_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    zip_path = tmp_path / "sample.zip"
+    with zipfile.ZipFile(zip_path, "w") as zipf:
+        zipf.writestr("sample.xml", CSV_XML)
+
+    handler = XMLHandler("dummy.xml")
+    parquet_path = handler.convert_zip_to_parquet(
+        str(zip_path), str(tmp_path / "out.parquet"), compression="none"
+    )
+
+    df = pd.read_parquet(parquet_path)
+    assert df["FinInstrmGnlAttrbts.CmmdtyDerivInd"].tolist() == ["0"]
+    assert df["Issr"].tolist() == ["Issuer123"]
+
+
+SCHEMA = {
+    "id": "FinInstrmGnlAttrbts/Id",
+    "derivative": {"path": "FinInstrmGnlAttrbts/CmmdtyDerivInd", "type": "bool"},
+    "Issr": "Issr",
+}
+
+
+def test_convert_to_csv_with_schema(tmp_path):
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 40)
+
+    handler = XMLHandler(str(xml_path), schema=SCHEMA)
+    serial = handler.convert_to_csv(str(tmp_path / "serial.csv"))
+    parallel = handler.convert_to_csv(str(tmp_path / "parallel.csv"), workers=2)
+
+    df = pd.read_csv(serial)
+    assert list(df.columns) == ["id", "derivative", "Issr"]
+    assert df["derivative"].tolist()[-40:] == [False] * 40
+    with open(serial) as a, open(parallel) as b:
+        assert a.read() == b.read()
+
+
+def test_convert_to_parquet_with_schema_types(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 10)
+
+    handler = XMLHandler(str(xml_path), schema=SCHEMA)
+    parquet_path = handler.convert_to_parquet(str(tmp_path / "out.parquet"))
+
+    schema = pq.read_schema(parquet_path)
+    assert str(schema.field("derivative").type) == "bool"
+    assert str(schema.field("id").type) == "string"
+    assert pd.read_parquet(parquet_path)["Issr"].tolist()[0] == "ISSUER0"
+
+
+def test_invalid_schema_fails_early():
+    with pytest.raises(ValueError, match="Unsupported type"):
+        XMLHandler("dummy.xml", schema={"id": {"path": "Id", "type": "uuid"}})
+
+
+FILTERS = [
+    {"path": "Issr", "op": "in", "values": ["ISSUER1", "ISSUER3"]},
+    {"path": "FinInstrmGnlAttrbts/ClssfctnTp", "op": "startswith", "value": "ESV"},
+]
+
+
+def test_convert_to_csv_with_filters(tmp_path):
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 70)
+
+    handler = XMLHandler(str(xml_path), filters=FILTERS)
+    serial = handler.convert_to_csv(str(tmp_path / "serial.csv"))
+    assert handler.stats == {"scanned": 71, "kept": 20}
+
+    handler.stats = {}
+    parallel = handler.convert_to_csv(str(tmp_path / "parallel.csv"), workers=2)
+    assert handler.stats == {"scanned": 71, "kept": 20}
+
+    df = pd.read_csv(serial)
+    assert len(df) == 20
+    assert set(df["Issr"]) == {"ISSUER1", "ISSUER3"}
+    with open(serial) as a, open(parallel) as b:
+        assert a.read() == b.read()
+
+
+def test_convert_to_csv_without_filters_keeps_every_record(tmp_path):
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 5)
+
+    handler = XMLHandler(str(xml_path))
+    handler.convert_to_csv(str(tmp_path / "out.csv"))
+
+    assert handler.stats == {"scanned": 6, "kept": 6}
+
+
+def test_conversion_records_metrics(tmp_path):
+    from deta.metrics.metrics import Metrics
+
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 9)
+    zip_path = tmp_path / "many.zip"
+    with zipfile.ZipFile(zip_path, "w") as zipf:
+        zipf.write(xml_path, "many.xml")
+    metrics = Metrics()
+
+    handler = XMLHandler(str(xml_path), filters=FILTERS, metrics=metrics)
+    handler.extract_from_zip(str(zip_path), str(tmp_path / "extracted"))
+    csv_path = handler.convert_to_csv(str(tmp_path / "out.csv"))
+
+    stages = metrics.to_dict()["stages"]
+    assert stages["extract"]["counters"]["bytes_out"] == os.path.getsize(xml_path)
+    assert stages["parse"]["counters"] == {
+        "records_scanned": 10,
+        "rows": 3,
+        "bytes_in": os.path.getsize(xml_path),
+        "bytes_out": os.path.getsize(csv_path),
+    }
+
+
+def test_convert_to_csv_fails_when_the_writer_fails(tmp_path, monkeypatch):
+    from deta.writers.writers import CSVBatchWriter
+
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 50)
+    flush = CSVBatchWriter.flush
+    calls = []
+
+    def failing_flush(self):
+        calls.append(len(self._batch))
+        if len(calls) == 2:
+            raise OSError("No space left on device")
+        flush(self)
+
+    monkeypatch.setattr(CSVBatchWriter, "flush", failing_flush)
+    handler = XMLHandler(str(xml_path))
+
+    with pytest.raises(OSError, match="No space left"):
+        handler.convert_to_csv(str(tmp_path / "out.csv"), batch_size=25)
+    assert handler.stats == {"scanned": 0, "kept": 0}
+    assert os.listdir(tmp_path) == ["many.xml"]
+
+
+@pytest.mark.parametrize("output", ["csv", "csv-parallel", "parquet"])
+def test_convert_malformed_xml_leaves_no_output(tmp_path, output):
+    if output == "parquet":
+        pytest.importorskip("pyarrow")
+    xml_path = tmp_path / "many.xml"
+    write_many_records_xml(xml_path, 100)
+    # A mismatched tag near the end, once whole batches were written.
+    content = xml_path.read_text(encoding="utf-8")
+    xml_path.write_text(
+        content.replace("<Issr>ISSUER6</Issr>", "<Issr>ISSUER6</Isr>").replace(
+            "<Issr>ISSUER6</Isr>", "<Issr>ISSUER6</Issr>", 13
+        ),
+        encoding="utf-8",
+    )
+    handler = XMLHandler(str(xml_path))
+    output_path = str(tmp_path / "out")
+
+    with pytest.raises(Exception):
+        if output == "parquet":
+            handler.convert_to_parquet(output_path, row_group_size=10)
+        else:
+            workers = 2 if output == "csv-parallel" else 1
+            handler.convert_to_csv(output_path, batch_size=10, workers=workers)
+    assert os.listdir(tmp_path) == ["many.xml"]
@@ -0,0 +1,105 @@
+import io
+import zipfile
+
+import pytest
+
+from deta.xml_handler import zipstream
+from deta.xml_handler.zipstream import iter_zip_member
+
+XML = b"<Document>" + b"<FinInstrm>x</FinInstrm>" * 5000 + b"</Document>"
+
+
+class Unseekable(io.RawIOBase):
+    """
+    Write-only stream, making zipfile write data descriptors after each member.
+    """
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+def make_zip(members, seekable=True, zip64=False, compression=zipfile.ZIP_DEFLATED):
+    out = io.BytesIO() if seekable else Unseekable()
+    with zipfile.ZipFile(out, "w", compression=compression) as zipf:
+        for name, data in members:
+            with zipf.open(name, "w", force_zip64=zip64) as f:
+                f.write(data)
+    return (out if seekable else out.buffer).getvalue()
+
+
+def chunked(data, size=1000):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("seekable", [True, False])
+@pytest.mark.parametrize("zip64", [False, True])
+def test_inflates_first_xml_member(seekable, zip64):
+    data = make_zip(
+        [("README.txt", b"not this one" * 100), ("DLTINS.xml", XML)],
+        seekable=seekable,
+        zip64=zip64,
+    )
+
+    assert b"".join(iter_zip_member(chunked(data))) == XML
+
+
+def test_inflates_named_stored_member():
+    data = make_zip(
+        [("a.xml", b"<a/>"), ("b.xml", XML)], compression=zipfile.ZIP_STORED
+    )
+
+    assert b"".join(iter_zip_member(chunked(data, 7), member="b.xml")) == XML
+
+
+def test_output_is_bounded(monkeypatch):
+    monkeypatch.setattr(zipstream, "OUTPUT_SIZE", 4096)
+    data = make_zip([("DLTINS.xml", XML)])
+
+    parts = list(iter_zip_member([data]))
+
+    assert b"".join(parts) == XML
+    assert max(len(part) for part in parts) <= 4096
+
+
+def test_consumes_the_whole_archive():
+    data = make_zip([("DLTINS.xml", XML), ("other.xml", b"<b/>")])
+    consumed = []
+
+    def chunks():
+        for chunk in chunked(data):
+            consumed.append(chunk)
+            yield chunk
+
+    list(iter_zip_member(chunks()))
+
+    assert b"".join(consumed) == data
+
+
+def test_missing_member():
+    data = make_zip([("DLTINS.xml", XML)])
+
+    with pytest.raises(ValueError, match="other.xml not found"):
+        list(iter_zip_member(chunked(data), member="other.xml"))
+    with pytest.raises(ValueError, match="No XML files found"):
+        list(iter_zip_member(chunked(make_zip([("a.txt", b"a")]))))
+
+
+def test_corrupted_member():
+    data = bytearray(make_zip([("DLTINS.xml", XML)], compression=zipfile.ZIP_STORED))
+    data[data.index(b"<FinInstrm>")] = ord("#")
+
+    with pytest.raises(zipfile.BadZipFile, match="Bad CRC-32"):
+        list(iter_zip_member(chunked(bytes(data))))
+
+
+def test_truncated_member():
+    data = make_zip([("DLTINS.xml", XML)])
+
+    with pytest.raises(zipfile.BadZipFile, match="Truncated"):
+        list(iter_zip_member(chunked(data[:60])))